@@ -1,50 +1,136 @@
 #!/usr/bin/env python
 """
-     This script combines pre-generated IP-Glasma events into a hdf5 database.
+     This script combines pre-generated 3D MC-Glauber events into a hdf5
+     database.
+
+     In the default layout every strings_event_*.dat is its own dataset.
+     The contiguous layout concatenates the strings of all the events into
+     one chunked (N_total, 21) dataset "strings"; the strings of the event
+     event_ids[i] are the rows offsets[i]:offsets[i+1] and its header is
+     headers[i]. The events are stored sorted by the event id, so that a
+     block of consecutive events is one contiguous read.
 """
 
-import sys
+import re
+import argparse
 import h5py
 from os import path
 from glob import glob
 
 import numpy as np
 
-def print_help():
-    print("{0} results_folder".format(sys.argv[0]))
-
-try:
-    results_folder = str(sys.argv[1])
-except IndexError:
-    print_help()
-    exit(1)
-
-results_name = results_folder.split("/")[-1]
-if results_name == "":
-    results_name = results_folder.split("/")[-2]
-results_path = path.abspath(path.join(".", results_folder))
-
-hf = h5py.File("{0}.h5".format(results_name), "w")
-
-# save events summary
-event_summary = np.loadtxt(path.join(results_path, "events_summary.dat"))
-dset          = hf.create_dataset("events_summary.dat", data = event_summary,
-                                  compression="gzip", compression_opts=9)
-# save input file
-inputfile = np.genfromtxt(path.join(results_path, "input"), dtype='str')
-for para_name, para_val in inputfile:
-    hf.attrs.create(para_name, np.string_(para_val))
-
-event_list = glob(path.join(results_path, "string*"))
-nev = len(event_list)
-for ievent, event_path in enumerate(event_list):
-    print("processing {0:d}/{1:d} {2} ... ".format(ievent+1, nev,
-                                                   results_path))
-    file_name = event_path.split("/")[-1]
-    dtemp     = np.loadtxt(event_path)
-    dset      = hf.create_dataset("{0}".format(file_name), data = dtemp,
-                                  compression="gzip", compression_opts=9)
-    f = open(event_path)
-    header = f.readline().strip('\n')
-    dset.attrs.create("header", np.string_(header))
-hf.close()
+N_STRING_COLUMNS = 21
+EVENT_FILE_PATTERN = re.compile(r"strings_event_(\d+)\.dat$")
+
+
+def write_contiguous_events(hf, events, chunk_rows=1024,
+                            compression_level=9):
+    """
+        This function writes the events, an iterable of (event_id, data,
+        header) sorted by the event id, in the contiguous layout. The
+        strings are appended in blocks of whole chunks, so that only one
+        block is kept in memory.
+    """
+    strings = hf.create_dataset(
+        "strings", shape=(0, N_STRING_COLUMNS),
+        maxshape=(None, N_STRING_COLUMNS), chunks=(chunk_rows,
+                                                    N_STRING_COLUMNS),
+        dtype=np.float64, compression="gzip",
+        compression_opts=compression_level)
+    offsets = [0]
+    event_ids = []
+    headers = []
+    buffer = []
+    n_buffered = 0
+    for event_id, data, header in events:
+        data = np.asarray(data, dtype=np.float64).reshape(-1,
+                                                          N_STRING_COLUMNS)
+        event_ids.append(event_id)
+        headers.append(header.encode('UTF-8'))
+        offsets.append(offsets[-1] + data.shape[0])
+        buffer.append(data)
+        n_buffered += data.shape[0]
+        if n_buffered >= chunk_rows:
+            append_rows(strings, np.concatenate(buffer))
+            buffer = []
+            n_buffered = 0
+    if buffer:
+        append_rows(strings, np.concatenate(buffer))
+    hf.create_dataset("offsets", data=np.array(offsets, dtype=np.int64))
+    hf.create_dataset("event_ids", data=np.array(event_ids, dtype=np.int64))
+    hf.create_dataset("headers", data=np.array(headers, dtype="S"),
+                      compression="gzip", compression_opts=compression_level)
+    hf.attrs.create("layout", np.bytes_("contiguous"))
+    return len(event_ids)
+
+
+def append_rows(dset, data):
+    """This function appends rows to a resizable dataset"""
+    n_rows = dset.shape[0]
+    dset.resize(n_rows + data.shape[0], axis=0)
+    dset[n_rows:] = data
+
+
+def read_event_files(event_list):
+    """This function yields (event_id, data, header) of every event file"""
+    nev = len(event_list)
+    for ievent, (event_id, event_path) in enumerate(event_list):
+        print("processing {0:d}/{1:d} {2} ... ".format(ievent+1, nev,
+                                                       event_path))
+        with open(event_path) as f:
+            header = f.readline().strip('\n')
+        yield event_id, np.loadtxt(event_path), header
+
+
+def get_event_files(results_path):
+    """This function returns the (event_id, path) of the event files"""
+    event_list = []
+    for event_path in glob(path.join(results_path, "strings_event_*.dat")):
+        match = EVENT_FILE_PATTERN.search(event_path)
+        if match:
+            event_list.append((int(match.group(1)), event_path))
+    return sorted(event_list)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description='Combine 3D MC-Glauber events into a hdf5 database',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('results_folder', type=str,
+                        help='folder with the 3D MC-Glauber events')
+    parser.add_argument('-l', '--layout', type=str, default='datasets',
+                        choices=['datasets', 'contiguous'],
+                        help='one dataset per event or contiguous strings')
+    parser.add_argument('-c', '--chunk_rows', type=int, default=1024,
+                        help='rows per chunk in the contiguous layout')
+    args = parser.parse_args()
+
+    results_folder = args.results_folder
+    results_name = results_folder.split("/")[-1]
+    if results_name == "":
+        results_name = results_folder.split("/")[-2]
+    results_path = path.abspath(path.join(".", results_folder))
+
+    hf = h5py.File("{0}.h5".format(results_name), "w")
+
+    # save events summary
+    event_summary = np.loadtxt(path.join(results_path, "events_summary.dat"))
+    dset          = hf.create_dataset("events_summary.dat",
+                                      data = event_summary,
+                                      compression="gzip", compression_opts=9)
+    # save input file
+    inputfile = np.genfromtxt(path.join(results_path, "input"), dtype='str')
+    for para_name, para_val in inputfile:
+        hf.attrs.create(para_name, np.string_(para_val))
+
+    event_list = get_event_files(results_path)
+    if args.layout == "contiguous":
+        write_contiguous_events(hf, read_event_files(event_list),
+                                args.chunk_rows)
+    else:
+        for event_id, dtemp, header in read_event_files(event_list):
+            dset = hf.create_dataset(
+                "strings_event_{0:d}.dat".format(event_id), data = dtemp,
+                compression="gzip", compression_opts=9)
+            dset.attrs.create("header", np.string_(header))
+    hf.close()
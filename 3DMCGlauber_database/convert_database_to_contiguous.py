@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+     This script converts a 3D MC-Glauber hdf5 database with one dataset
+     per event into the contiguous layout of combine_events_into_hdf5.py.
+     The attributes and events_summary.dat are copied as they are.
+"""
+
+import argparse
+import h5py
+
+from combine_events_into_hdf5 import (write_contiguous_events,
+                                      EVENT_FILE_PATTERN)
+
+
+def read_database_events(hf):
+    """
+        This function yields (event_id, data, header) of every event
+        dataset sorted by the event id
+    """
+    event_list = []
+    for dataset_name in hf.keys():
+        match = EVENT_FILE_PATTERN.match(dataset_name)
+        if match:
+            event_list.append((int(match.group(1)), dataset_name))
+    for event_id, dataset_name in sorted(event_list):
+        dset = hf[dataset_name]
+        yield event_id, dset[()], dset.attrs["header"].decode('UTF-8')
+
+
+def convert_database(input_file, output_file, chunk_rows=1024,
+                     compression_level=9):
+    """This function converts the database and returns the event number"""
+    with h5py.File(input_file, "r") as hf_in:
+        if "offsets" in hf_in:
+            raise ValueError(
+                "{} is in the contiguous layout already".format(input_file))
+        with h5py.File(output_file, "w") as hf_out:
+            for attr_name, attr_value in hf_in.attrs.items():
+                hf_out.attrs.create(attr_name, attr_value)
+            if "events_summary.dat" in hf_in:
+                hf_in.copy("events_summary.dat", hf_out)
+            return write_contiguous_events(
+                hf_out, read_database_events(hf_in), chunk_rows,
+                compression_level)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description=('Convert a 3D MC-Glauber database to the '
+                         + 'contiguous layout'),
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('input_file', type=str,
+                        help='database with one dataset per event')
+    parser.add_argument('output_file', type=str,
+                        help='database in the contiguous layout')
+    parser.add_argument('-c', '--chunk_rows', type=int, default=1024,
+                        help='rows per chunk of the strings dataset')
+    parser.add_argument('-z', '--compression_level', type=int, default=9,
+                        help='gzip compression level')
+    args = parser.parse_args()
+
+    n_events = convert_database(args.input_file, args.output_file,
+                                args.chunk_rows, args.compression_level)
+    print("Converted {0:d} events from {1} to {2}".format(
+        n_events, args.input_file, args.output_file))
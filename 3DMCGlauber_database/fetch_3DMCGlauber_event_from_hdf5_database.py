@@ -9,26 +9,154 @@ import numpy as np
 import h5py
 
 def print_help():
-    print("{0} database_filename event_id".format(argv[0]))
+    print("{0} database_filename event_id [event_id ...]".format(argv[0]))
+
+
+class MCGlauberDatabaseReader:
+    """
+        This class keeps one open handle to a 3D MC-Glauber hdf5 database
+        and caches the event datasets and their headers once looked up,
+        so that fetching many events only opens the database once.
+
+        Databases in the contiguous layout of combine_events_into_hdf5.py
+        are detected by their offsets index. Their events are read as row
+        slices of the strings dataset, and fetch_many reads every block of
+        consecutive events in one read.
+    """
+    # maximum number of string rows read at once by fetch_many
+    max_block_rows = 1 << 20
+
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.hf            = h5py.File(database_path, "r")
+        self.event_cache   = {}
+        self.contiguous    = "offsets" in self.hf
+        if self.contiguous:
+            self.offsets     = self.hf["offsets"][()]
+            event_ids        = self.hf["event_ids"][()].tolist()
+            self.event_index = {event_id: idx
+                                for idx, event_id in enumerate(event_ids)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """This function closes the database file"""
+        if self.hf is not None:
+            self.hf.close()
+            self.hf = None
+        self.event_cache = {}
+
+    def get_event_position(self, event_idx):
+        """
+            This function returns the position of the event in the
+            contiguous layout
+        """
+        try:
+            return self.event_index[event_idx]
+        except KeyError:
+            raise KeyError("event {} is not in {}".format(
+                event_idx, self.database_path)) from None
+
+    def get_header(self, position):
+        """This function returns the header of the event at position"""
+        return self.hf["headers"][position].decode('UTF-8').replace('#','')
+
+    def get_event(self, event_idx):
+        """
+            This function returns the output file name, the dataset (the
+            strings array in the contiguous layout), and the header of the
+            event
+        """
+        file_name = "strings_event_{0:d}.dat".format(event_idx)
+        if self.contiguous:
+            position = self.get_event_position(event_idx)
+            return (file_name,
+                    self.hf["strings"][self.offsets[position]:
+                                       self.offsets[position + 1]],
+                    self.get_header(position))
+        if event_idx not in self.event_cache:
+            temp_data   = self.hf.get(file_name)
+            data_header = (
+                temp_data.attrs["header"].decode('UTF-8').replace('#',''))
+            self.event_cache[event_idx] = (file_name, temp_data, data_header)
+        return self.event_cache[event_idx]
+
+    def write_event(self, event_idx, file_name, temp_data, data_header):
+        """This function writes the strings of one event to file_name"""
+        print(("fectching an 3DMCGlauber event with "
+               + "event id: {} from {}".format(event_idx, self.database_path))
+        )
+        temp_data = np.array(temp_data).reshape(-1, 21)
+        np.savetxt(file_name, temp_data, fmt='%.6e', header=data_header)
+        return(file_name)
+
+    def fetch(self, event_idx):
+        """This function fetches one event and returns the file name"""
+        return self.write_event(event_idx, *self.get_event(event_idx))
+
+    def get_event_blocks(self, event_idx_list):
+        """
+            This function groups the events into blocks of consecutive
+            positions in the contiguous layout. It returns a list of
+            (first position, last position + 1, [(list index, position)]).
+        """
+        positions = sorted(
+            (self.get_event_position(event_idx), ilist)
+            for ilist, event_idx in enumerate(event_idx_list))
+        blocks = []
+        for position, ilist in positions:
+            if blocks:
+                first, end, members = blocks[-1]
+                if (position <= end and self.offsets[position + 1]
+                        - self.offsets[first] <= self.max_block_rows):
+                    blocks[-1] = (first, max(end, position + 1),
+                                  members + [(ilist, position)])
+                    continue
+            blocks.append((position, position + 1, [(ilist, position)]))
+        return blocks
+
+    def fetch_many(self, event_idx_list):
+        """
+            This function fetches a list of events in one pass over the
+            database and returns the list of file names
+        """
+        if not self.contiguous:
+            return [self.fetch(event_idx) for event_idx in event_idx_list]
+
+        event_idx_list = list(event_idx_list)
+        file_list = [None]*len(event_idx_list)
+        for first, end, members in self.get_event_blocks(event_idx_list):
+            row_start = self.offsets[first]
+            block = self.hf["strings"][row_start:self.offsets[end]]
+            headers = self.hf["headers"][first:end]
+            for ilist, position in members:
+                event_idx = event_idx_list[ilist]
+                file_list[ilist] = self.write_event(
+                    event_idx, "strings_event_{0:d}.dat".format(event_idx),
+                    block[self.offsets[position] - row_start:
+                          self.offsets[position + 1] - row_start],
+                    headers[position - first].decode('UTF-8').replace(
+                        '#',''))
+        return file_list
+
 
 def fecth_an_3DMCGlauber_event(database_path, event_idx):
-    print(("fectching an 3DMCGlauber event with "
-           + "event id: {} from {}".format(event_idx, database_path))
-    )
-    hf          = h5py.File(database_path, "r")
-    file_name   = "strings_event_{0:d}.dat".format(event_idx)
-    temp_data   = hf.get(file_name)
-    data_header = temp_data.attrs["header"].decode('UTF-8').replace('#','')
-    temp_data   = np.array(temp_data).reshape(-1, 21)
-    np.savetxt(file_name, temp_data, fmt='%.6e', header=data_header)
+    with MCGlauberDatabaseReader(database_path) as reader:
+        file_name = reader.fetch(event_idx)
     return(file_name)
 
 if __name__ == "__main__":
     try:
         database_filename = str(argv[1])
-        event_id          = int(argv[2])
+        event_id_list     = [int(argv[2])] + [int(event_id)
+                                               for event_id in argv[3:]]
     except IndexError:
         print_help()
         exit(1)
-    
-    fecth_an_3DMCGlauber_event(database_filename, event_id)
+
+    with MCGlauberDatabaseReader(database_filename) as reader:
+        reader.fetch_many(event_id_list)
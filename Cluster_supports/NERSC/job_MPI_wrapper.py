@@ -1,24 +1,147 @@
 #!/usr/bin/env python
+"""
+    This script runs the event folders of a working folder with a
+    manager/worker MPI scheduler.
 
-from mpi4py import MPI
+    Rank 0 hands out the event folders to the other ranks on demand, so
+    that a rank with a short event picks up the next one. A folder is only
+    handed out if it is expected to finish within the walltime budget; the
+    expected run time is the longest run time of the finished folders (or
+    the initial estimate before the first one finishes). The status of all
+    the folders is kept in job_manifest.json, so that the next allocation
+    continues with the pending folders.
+"""
+
+import argparse
+import json
+import time
 from subprocess import call
-import sys
-from os import chdir
-
-def print_Usage():
-    print("Usage: {} n_threads job_id0 ".format(sys.argv[0]))
-
-try:
-    n_threads = int(sys.argv[1])
-    job_id    = int(sys.argv[2])
-except IndexError:
-    print_Usage()
-    exit(0)
-
-comm = MPI.COMM_WORLD
-size = comm.Get_size()
-rank = comm.Get_rank()
-
-event_id = rank + n_threads*(job_id - 1)
-chdir("event_{}".format(event_id))
-call("bash submit_job.pbs", shell=True)
+from os import path, listdir, replace
+
+from mpi4py import MPI
+
+MANIFEST_FILE_NAME = "job_manifest.json"
+TAG_WORK = 1
+TAG_STOP = 2
+
+
+def parse_walltime(walltime):
+    """This function converts a walltime in [[HH:]MM:]SS to seconds"""
+    seconds = 0
+    for ifield in walltime.split(":"):
+        seconds = 60*seconds + int(ifield)
+    return seconds
+
+
+def get_event_folders(working_folder):
+    """This function returns the event folders sorted by the event id"""
+    event_folders = [
+        ifolder for ifolder in listdir(working_folder)
+        if (ifolder.startswith("event_") and ifolder[6:].isdigit()
+            and path.isdir(path.join(working_folder, ifolder)))]
+    return sorted(event_folders, key=lambda ifolder: int(ifolder[6:]))
+
+
+def read_manifest(manifest_file):
+    """This function reads the manifest of the previous allocations"""
+    if not path.isfile(manifest_file):
+        return {'completed': {}, 'failed': {}, 'pending': []}
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(manifest_file, manifest):
+    """This function writes the manifest atomically"""
+    with open(manifest_file + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    replace(manifest_file + ".tmp", manifest_file)
+
+
+def run_manager(comm, working_folder, walltime_budget, event_time):
+    """
+        This function hands out the event folders to the workers until
+        no folder is left or the next one can not finish in time
+    """
+    start_time = time.time()
+    manifest_file = path.join(working_folder, MANIFEST_FILE_NAME)
+    manifest = read_manifest(manifest_file)
+    pending = [ifolder for ifolder in get_event_folders(working_folder)
+               if ifolder not in manifest['completed']]
+    running = {}
+    n_workers = comm.Get_size() - 1
+    print("Manager: {0:d} pending event folders, {1:d} workers".format(
+        len(pending), n_workers), flush=True)
+
+    status = MPI.Status()
+    while n_workers > 0:
+        result = comm.recv(source=MPI.ANY_SOURCE, tag=TAG_WORK, status=status)
+        worker = status.Get_source()
+        if result is not None:
+            event_folder, return_code, run_time = result
+            running.pop(worker)
+            if return_code == 0:
+                manifest['completed'][event_folder] = run_time
+                manifest['failed'].pop(event_folder, None)
+            else:
+                manifest['failed'][event_folder] = return_code
+        remaining_time = walltime_budget - (time.time() - start_time)
+        if manifest['completed']:
+            event_time = max(manifest['completed'].values())
+        if pending and event_time < remaining_time:
+            event_folder = pending.pop(0)
+            running[worker] = event_folder
+            comm.send(event_folder, dest=worker, tag=TAG_WORK)
+        else:
+            comm.send(None, dest=worker, tag=TAG_STOP)
+            n_workers -= 1
+        manifest['pending'] = (
+            sorted(running.values(), key=lambda ifolder: int(ifolder[6:]))
+            + pending)
+        write_manifest(manifest_file, manifest)
+
+    print("Manager: {0:d} completed, {1:d} failed, {2:d} pending".format(
+        len(manifest['completed']), len(manifest['failed']),
+        len(manifest['pending'])), flush=True)
+
+
+def run_worker(comm, working_folder):
+    """This function runs the event folders sent by the manager"""
+    comm.send(None, dest=0, tag=TAG_WORK)
+    status = MPI.Status()
+    while True:
+        event_folder = comm.recv(source=0, tag=MPI.ANY_TAG, status=status)
+        if status.Get_tag() == TAG_STOP:
+            break
+        start_time = time.time()
+        return_code = call("bash submit_job.pbs", shell=True,
+                           cwd=path.join(working_folder, event_folder))
+        comm.send((event_folder, return_code, time.time() - start_time),
+                  dest=0, tag=TAG_WORK)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description='Run the event folders with a MPI work queue',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('walltime', type=str,
+                        help='walltime of the allocation ([[HH:]MM:]SS)')
+    parser.add_argument('-m', '--safety_margin', type=int, default=300,
+                        help='time kept free at the end of the allocation [s]')
+    parser.add_argument('-e', '--event_time', type=str, default="0",
+                        help=('expected run time of one event folder before '
+                              + 'the first one finishes ([[HH:]MM:]SS)'))
+    parser.add_argument('-w', '--working_folder', type=str, default='.',
+                        help='folder with the event folders')
+    args = parser.parse_args()
+
+    COMM = MPI.COMM_WORLD
+    if COMM.Get_size() < 2:
+        print("Usage: srun -n <n_workers + 1> python {} walltime".format(
+            parser.prog))
+        exit(1)
+    if COMM.Get_rank() == 0:
+        run_manager(COMM, path.abspath(args.working_folder),
+                    parse_walltime(args.walltime) - args.safety_margin,
+                    parse_walltime(args.event_time))
+    else:
+        run_worker(COMM, path.abspath(args.working_folder))
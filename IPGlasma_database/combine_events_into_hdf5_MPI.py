@@ -1,20 +1,23 @@
 #!/usr/bin/env python
 """
      This script combines pre-generated IP-Glasma events into a hdf5 database.
+
+     Every MPI rank collects its share of the events into its own hdf5 file.
+     In the link mode, rank 0 then writes the database as external links to
+     the event groups in the rank files, so that no event data is copied;
+     the rank files have to stay in the folder of the database. In the copy
+     mode, the rank files are merged into one self-contained database.
 """
 
-import sys
-from os import path, system
+import argparse
+import heapq
+from os import path, remove, replace, scandir
 from glob import glob
 import h5py
 from mpi4py import MPI
 
 import numpy as np
 
-def print_help():
-    """This function prints out help message"""
-    print("{0} results_folder".format(sys.argv[0]))
-
 def collect_one_IPGlasma_event(results_path, event_path, hf):
     """This function collects one IPGlasma event"""
     event_id = event_path.split("/")[-1].split("Parameters")[-1].split(".")[0]
@@ -84,8 +87,80 @@ def collect_one_IPGlasma_event(results_path, event_path, hf):
         dset.attrs.create("nx", nx)
         dset.attrs.create("ny", ny)
 
-def collect_IPGlasma_events(results_folder):
-    """This function collects IPGlasma events in results_folder"""
+def get_event_sizes(results_path, event_list):
+    """
+        This function returns the total size of the epsilon-u-Hydro files
+        for every event in event_list
+    """
+    size_dict = {}
+    for entry in scandir(results_path):
+        if entry.name.startswith("epsilon-u-Hydro-t"):
+            event_id = entry.name.split("-")[-1].split(".")[0]
+            size_dict[event_id] = (size_dict.get(event_id, 0)
+                                   + entry.stat().st_size)
+    return [
+        size_dict.get(
+            event_path.split("/")[-1].split("Parameters")[-1].split(".")[0], 0)
+        for event_path in event_list]
+
+
+def assign_events_to_ranks(results_path, event_list, mpi_size):
+    """
+        This function distributes the events over the MPI ranks, largest
+        event first to the least loaded rank. It falls back to the static
+        round-robin assignment if the event sizes are not available.
+    """
+    try:
+        event_sizes = get_event_sizes(results_path, event_list)
+    except OSError:
+        event_sizes = [0]*len(event_list)
+    if sum(event_sizes) == 0:
+        print("No event sizes available, use round-robin assignment")
+        return [ievent % mpi_size for ievent in range(len(event_list))]
+    rank_loads = [(0, irank) for irank in range(mpi_size)]
+    assignment = [0]*len(event_list)
+    for ievent in sorted(range(len(event_list)),
+                         key=lambda i: event_sizes[i], reverse=True):
+        load, irank = heapq.heappop(rank_loads)
+        assignment[ievent] = irank
+        heapq.heappush(rank_loads, (load + event_sizes[ievent], irank))
+    return assignment
+
+
+def merge_hdf5_files(target_filename, source_filename):
+    """This function moves all the groups in source into the target file"""
+    with h5py.File(target_filename, "a") as hf:
+        with h5py.File(source_filename, "r") as hftemp:
+            for gtemp in hftemp.keys():
+                hftemp.copy(hftemp[gtemp], hf, name=gtemp)
+    remove(source_filename)
+
+
+def link_hdf5_files(target_filename, source_filenames):
+    """
+        This function writes the target file with an external link to every
+        group of the source files. Only the links are written, the source
+        files are found relative to the folder of the target file.
+    """
+    with h5py.File(target_filename, "w") as hf:
+        for source_filename in source_filenames:
+            with h5py.File(source_filename, "r") as hftemp:
+                group_names = list(hftemp.keys())
+            for gtemp in group_names:
+                hf[gtemp] = h5py.ExternalLink(path.basename(source_filename),
+                                              gtemp)
+
+
+def collect_IPGlasma_events(results_folder, merge_mode="link"):
+    """
+        This function collects IPGlasma events in results_folder
+
+        In the copy mode, the rank files are merged with a pairwise tree
+        reduction in log2(mpi_size) steps. This removes the h5copy fork
+        per group, but rank 0 still copies about (1 - 1/mpi_size) of all
+        the data in its merges, so the critical path is not shorter than a
+        serial merge. The link mode avoids the copies.
+    """
     mpi_comm = MPI.COMM_WORLD
     mpi_rank = mpi_comm.Get_rank()
     mpi_size = mpi_comm.Get_size()
@@ -100,40 +175,72 @@ def collect_IPGlasma_events(results_folder):
     event_list = glob(path.join(results_path, "usedParameters*.dat"))
     nev = len(event_list)
 
+    # make sure all ranks see the same event list and assignment
+    assignment = None
+    if mpi_rank == 0:
+        assignment = assign_events_to_ranks(results_path, event_list,
+                                            mpi_size)
+    event_list, assignment = mpi_comm.bcast((event_list, assignment), root=0)
+
+    time_start = MPI.Wtime()
     h5filename = "{0}_rank{1}.h5".format(results_name, mpi_rank)
     print("MPI rank {0}: collect {1} to {2} ... ".format(
         mpi_rank, results_folder, h5filename))
     hf = h5py.File(h5filename, "w")
     mpi_comm.Barrier()
     for ievent in range(nev):
-        if mpi_rank == ievent%mpi_size:
+        if mpi_rank == assignment[ievent]:
             event_path = event_list[ievent]
             print("MPI rank {0:d} processing {1:d}/{2:d} ... ".format(
                 mpi_rank, ievent, nev))
             collect_one_IPGlasma_event(results_path, event_path, hf)
     hf.close()
+    parse_time = MPI.Wtime() - time_start
     mpi_comm.Barrier()
 
-
-    # now combine all the hdf5 files into one using rank 0
+    time_start = MPI.Wtime()
+    step = 1 if merge_mode == "copy" else mpi_size
+    if merge_mode == "link" and mpi_rank == 0:
+        link_hdf5_files("{}.h5".format(results_name),
+                        ["{0}_rank{1}.h5".format(results_name, irank)
+                         for irank in range(mpi_size)])
+    # combine all the hdf5 files with a pairwise tree reduction, which
+    # takes log2(mpi_size) merge steps
+    while step < mpi_size:
+        if mpi_rank % (2*step) == 0 and mpi_rank + step < mpi_size:
+            source_filename = "{0}_rank{1}.h5".format(results_name,
+                                                      mpi_rank + step)
+            print("MPI rank {0}: merging {1} ... ".format(mpi_rank,
+                                                         source_filename))
+            merge_hdf5_files(h5filename, source_filename)
+        mpi_comm.Barrier()
+        step *= 2
+    merge_time = MPI.Wtime() - time_start
+
+    if merge_mode == "copy" and mpi_rank == 0:
+        replace(h5filename, "{}.h5".format(results_name))
+
+    timing = mpi_comm.gather((assignment.count(mpi_rank), parse_time,
+                              merge_time), root=0)
     if mpi_rank == 0:
-        print("combining to one hdf5 file {}.h5 ...".format(results_name))
-        h5_filelist = glob("./{}_rank*.h5".format(results_name))
-        for filename in h5_filelist:
-            print("processing {0} ... ".format(filename))
-            hftemp = h5py.File(filename, "r")
-            glist = list(hftemp.keys())
-            hftemp.close()
-            for gtemp in glist:
-                system('h5copy -i {0} -o {1}.h5 -s {2} -d {2}'.format(
-                    filename, results_name, gtemp))
-            system('rm -fr {0}'.format(filename))
+        print("combined to one hdf5 file {}.h5".format(results_name))
+        print("{:>6s} {:>8s} {:>12s} {:>12s}".format(
+            "rank", "events", "parse (s)", "merge (s)"))
+        for irank, (n_events, t_parse, t_merge) in enumerate(timing):
+            print("{:>6d} {:>8d} {:>12.2f} {:>12.2f}".format(
+                irank, n_events, t_parse, t_merge))
 
 
 if __name__ == "__main__":
-    try:
-        RESULTS_FOLDER = str(sys.argv[1])
-        collect_IPGlasma_events(RESULTS_FOLDER)
-    except IndexError:
-        print_help()
-        exit(1)
+    parser = argparse.ArgumentParser(
+            description='Combine IP-Glasma events into a hdf5 database',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('results_folder', type=str,
+                        help='folder with the IP-Glasma events')
+    parser.add_argument('-m', '--merge_mode', type=str, default='link',
+                        choices=['link', 'copy'],
+                        help=('link: the database links to the rank files, '
+                              + 'copy: merge the rank files into the '
+                              + 'database'))
+    args = parser.parse_args()
+    collect_IPGlasma_events(args.results_folder, args.merge_mode)
@@ -4,53 +4,149 @@
      It outputs the input file for MUSIC fluid dynamic simulation.
 """
 
-from sys import argv, exit
+import argparse
 import numpy as np
 import h5py
 
-def print_help():
-    print("{0} database_filename event_id".format(argv[0]))
+# binary initial file layout (little endian):
+#   8 bytes magic, int64 n_rows, int64 n_columns, int64 bytes per value,
+#   int64 header length, the header text (utf-8), then the data row by row
+BINARY_MAGIC = b"MUSICIC1"
+BINARY_FORMATS = {"binary64": np.dtype("<f8"), "binary32": np.dtype("<f4")}
+
+
+def write_binary_initial_file(file_name, data, header, output_format):
+    """This function writes the MUSIC initial file in the binary format"""
+    dtype = BINARY_FORMATS[output_format]
+    header_bytes = header.encode('UTF-8')
+    size_info = np.array([data.shape[0], data.shape[1], dtype.itemsize,
+                          len(header_bytes)], dtype="<i8")
+    with open(file_name, "wb") as f:
+        f.write(BINARY_MAGIC)
+        f.write(size_info.tobytes())
+        f.write(header_bytes)
+        f.write(np.ascontiguousarray(data, dtype=dtype).tobytes())
+
+
+def read_binary_initial_file(file_name):
+    """
+        This function reads the binary MUSIC initial file
+        and returns the data array and the header
+    """
+    with open(file_name, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(
+                "{} is not a binary initial file".format(file_name))
+        n_rows, n_cols, itemsize, header_len = np.frombuffer(
+            f.read(32), dtype="<i8")
+        header = f.read(header_len).decode('UTF-8')
+        dtype = np.dtype("<f{}".format(itemsize))
+        data = np.frombuffer(f.read(), dtype=dtype).reshape(n_rows, n_cols)
+    return(data, header)
+
+
+class IPGlasmaDatabaseReader:
+    """
+        This class keeps one open handle to an IP-Glasma hdf5 database and
+        caches the event datasets and their attributes once looked up,
+        so that fetching many events only opens the database once.
+    """
+    def __init__(self, database_path, time_stamp="0.4",
+                 output_format="text"):
+        if output_format != "text" and output_format not in BINARY_FORMATS:
+            raise ValueError(
+                "unknown output format: {}".format(output_format))
+        self.database_path = database_path
+        self.time_stamp    = time_stamp
+        self.output_format = output_format
+        self.hf            = h5py.File(database_path, "r")
+        self.event_cache   = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """This function closes the database file"""
+        if self.hf is not None:
+            self.hf.close()
+            self.hf = None
+        self.event_cache = {}
+
+    def get_event(self, event_idx):
+        """
+            This function returns the output file name, the dataset, and
+            the attributes of the event
+        """
+        if event_idx not in self.event_cache:
+            event_name  = "event-{0:d}".format(event_idx)
+            event_group = self.hf.get(event_name)
+            file_name   = "epsilon-u-Hydro-t{0:s}-{1:d}.dat".format(
+                                                self.time_stamp, event_idx)
+            temp_data   = event_group.get(file_name)
+            attrs       = dict(temp_data.attrs)
+            self.event_cache[event_idx] = (file_name, temp_data, attrs)
+        return self.event_cache[event_idx]
+
+    def fetch(self, event_idx):
+        """This function fetches one event and returns the file name"""
+        print(("fectching an IP-Glasma event with "
+               + "event id: {} at tau = {} fm from {}".format(
+                   event_idx, self.time_stamp, self.database_path))
+        )
+        file_name, temp_data, attrs = self.get_event(event_idx)
+        data_header = attrs["header"].decode('UTF-8').replace('#','')
+        x_size      = attrs["x_size"]
+        y_size      = attrs["y_size"]
+        dx          = attrs["dx"]
+        dy          = attrs["dy"]
+        nx          = attrs["nx"]
+        ny          = attrs["ny"]
+
+        output_data = np.zeros([temp_data.shape[0], 18])
+        output_data[:, 3:] = temp_data
+        # the cells are ordered with x as the outer and y as the inner index
+        x_local = -x_size/2. + np.arange(nx)*dx
+        y_local = -y_size/2. + np.arange(ny)*dy
+        output_data[:, 1] = np.repeat(x_local, ny)
+        output_data[:, 2] = np.tile(y_local, nx)
+        if self.output_format == "text":
+            np.savetxt(file_name, output_data, fmt='%.6e',
+                       header=data_header)
+        else:
+            write_binary_initial_file(file_name, output_data, data_header,
+                                      self.output_format)
+        return(file_name)
+
+    def fetch_many(self, event_idx_list):
+        """
+            This function fetches a list of events in one pass over the
+            database and returns the list of file names
+        """
+        return [self.fetch(event_idx) for event_idx in event_idx_list]
+
 
 def fecth_an_IPGlasma_event(database_path, time_stamp, event_idx):
-    print(("fectching an IP-Glasma event with "
-           + "event id: {} at tau = {} fm from {}".format(event_idx,
-                                                          time_stamp,
-                                                          database_path))
-    )
-    hf          = h5py.File(database_path, "r")
-    event_name  = "event-{0:d}".format(event_idx)
-    event_group = hf.get(event_name)
-    file_name   = "epsilon-u-Hydro-t{0:s}-{1:d}.dat".format(time_stamp,
-                                                            event_idx)
-    temp_data   = event_group.get(file_name)
-    data_header = temp_data.attrs["header"].decode('UTF-8').replace('#','')
-    x_size      = temp_data.attrs["x_size"]
-    y_size      = temp_data.attrs["y_size"]
-    dx          = temp_data.attrs["dx"]
-    dy          = temp_data.attrs["dy"]
-    nx          = temp_data.attrs["nx"]
-    ny          = temp_data.attrs["ny"]
-
-    output_data = np.zeros([len(temp_data[:, 0]), 18])
-    output_data[:, 3:] = temp_data
-    idx = 0
-    for ix in range(nx):
-        x_local = -x_size/2. + ix*dx
-        for iy in range(ny):
-            y_local = -y_size/2. + iy*dy
-            output_data[idx, 1] = x_local
-            output_data[idx, 2] = y_local
-            idx += 1
-    np.savetxt(file_name, output_data, fmt='%.6e', header=data_header)
+    with IPGlasmaDatabaseReader(database_path, time_stamp) as reader:
+        file_name = reader.fetch(event_idx)
     return(file_name)
 
 if __name__ == "__main__":
-    try:
-        database_filename = str(argv[1])
-        event_id          = int(argv[2])
-    except IndexError:
-        print_help()
-        exit(1)
+    parser = argparse.ArgumentParser(
+            description='Fetch IP-Glasma events from the hdf5 database',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('database_filename', type=str,
+                        help='IP-Glasma hdf5 database')
+    parser.add_argument('event_id', type=int, nargs='+',
+                        help='event ids to fetch')
+    parser.add_argument('-f', '--output_format', type=str, default='text',
+                        choices=['text'] + list(BINARY_FORMATS.keys()),
+                        help='format of the MUSIC initial file')
+    args = parser.parse_args()
 
     time_stamp_str = "0.4"
-    fecth_an_IPGlasma_event(database_filename, time_stamp_str, event_id)
+    with IPGlasmaDatabaseReader(args.database_filename, time_stamp_str,
+                                args.output_format) as reader:
+        reader.fetch_many(args.event_id)
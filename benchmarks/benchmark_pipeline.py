@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+"""
+    This script benchmarks the python orchestration of iEBE-MUSIC end to
+    end without the physics codes. It generates synthetic initial condition
+    databases, replaces MUSIChydro, iSS.e, urqmd.e and the hadronic
+    afterburner toolkit by the stand-ins in stand_ins.py, and times
+
+        the initial condition fetch from both databases and from the
+        contiguous layout of the 3D MC-Glauber database,
+        every stage of hydro_plus_UrQMD_driver.py,
+        combine_results_into_hdf5.py in the copy and virtual modes,
+        the iSS to SMASH converter,
+        generate_jobs.py on a copy of the repository.
+
+    The timings can be written to a json file to compare two versions.
+"""
+
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import time
+import subprocess
+from os import (path, mkdir, makedirs, chmod, environ, listdir, getcwd,
+                chdir)
+import h5py
+
+REPO_PATH = path.dirname(path.dirname(path.abspath(__file__)))
+for folder in ("", "codes", "IPGlasma_database", "3DMCGlauber_database",
+               "utilities"):
+    sys.path.insert(0, path.join(REPO_PATH, folder))
+from synthetic_databases import (generate_ipglasma_database,
+                                 generate_3dmcglauber_database)
+import stand_ins
+from fetch_IPGlasma_event_from_hdf5_database import IPGlasmaDatabaseReader
+from fetch_3DMCGlauber_event_from_hdf5_database import MCGlauberDatabaseReader
+from convert_database_to_contiguous import convert_database
+from combine_results_into_hdf5 import combine_results
+from convert_iSS_output_to_SMASH_input import convert_iSS_output_to_SMASH_input
+from summarize_event_profiles import (find_profile_files, summarize_profiles,
+                                      print_summary)
+from generate_jobs import (generate_script_hydro, count_inodes, CODE_PACKAGES,
+                           TEMPLATE_MODES)
+
+STAND_INS_PATH = path.join(REPO_PATH, "benchmarks", "stand_ins.py")
+EVENT_FOLDER_FILES = [
+    "codes/hydro_plus_UrQMD_driver.py", "codes/split_particle_list.py",
+    "codes/event_profiler.py",
+    "IPGlasma_database/fetch_IPGlasma_event_from_hdf5_database.py",
+    "3DMCGlauber_database/fetch_3DMCGlauber_event_from_hdf5_database.py",
+]
+AFTERBURNER_SCRIPT = """#!/usr/bin/env bash
+(
+cd UrQMDev_$2
+{0} {1} iSS.e hydro_event/surface.dat OSCAR.DAT
+mkdir -p UrQMD_results
+{0} {1} urqmd.e OSCAR.DAT UrQMD_results/particle_list.dat
+rm -f OSCAR.DAT
+{0} {1} convert_to_binary.e UrQMD_results/particle_list.dat
+rm -f UrQMD_results/particle_list.dat
+)
+"""
+CODE_BINARIES = [
+    "MUSIC_code/MUSIChydro", "MUSIC_code/EOS/EOS_table.dat",
+    "iSS_code/iSS.e", "iSS_code/iSS_tables/pdg.dat",
+    "urqmd_code/urqmd/urqmd.e",
+    "hadronic_afterburner_toolkit_code/hadronic_afterburner_tools.e",
+    "hadronic_afterburner_toolkit_code/EOS/EOS_table.dat",
+    "hadronic_afterburner_toolkit_code/ebe_scripts/average_event_spvn_h5.py",
+    "3dMCGlauber_code/3dMCGlb.e", "3dMCGlauber_code/eps09/eps09.dat",
+]
+
+timings = {}
+
+
+def timed(label, function, *args):
+    """This function runs function(*args) and records its wall time"""
+    time_start = time.perf_counter()
+    result = function(*args)
+    timings[label] = time.perf_counter() - time_start
+    print("\U000023F1  {0:<45s} {1:10.3f} s".format(label, timings[label]))
+    return result
+
+
+def write_stand_in(file_name, code_name):
+    """This function writes an executable which runs one stand-in"""
+    with open(file_name, "w") as f:
+        f.write('#!/bin/sh\nexec {0} {1} {2} "$@"\n'.format(
+            sys.executable, STAND_INS_PATH, code_name))
+    chmod(file_name, 0o755)
+
+
+def fetch_events(reader_class, database, n_events, work_folder, *args):
+    """This function fetches all the events of a database in work_folder"""
+    current_folder = getcwd()
+    with tempfile.TemporaryDirectory(dir=work_folder) as fetch_folder:
+        chdir(fetch_folder)
+        try:
+            with reader_class(database, *args) as reader:
+                reader.fetch_many(range(n_events))
+        finally:
+            chdir(current_folder)
+
+
+def prepare_event_folder(event_folder, n_urqmd, n_threads, split,
+                         scratch_folder=""):
+    """
+        This function builds an event folder like generate_jobs.py, with the
+        stand-ins in place of the physics codes
+    """
+    mkdir(event_folder)
+    for file_name in EVENT_FOLDER_FILES:
+        shutil.copy(path.join(REPO_PATH, file_name), event_folder)
+    with open(path.join(event_folder, "driver_parameters.dat"), "w") as f:
+        f.write("split_particle_list = {:d}\n".format(split))
+        f.write("scratch_folder = {}\n".format(scratch_folder))
+    generate_script_hydro(event_folder, n_threads)
+    with open(path.join(event_folder, "run_afterburner.sh"), "w") as f:
+        f.write(AFTERBURNER_SCRIPT.format(sys.executable, STAND_INS_PATH))
+    makedirs(path.join(event_folder, "MUSIC", "initial"))
+    with open(path.join(event_folder, "MUSIC", "music_input_mode_2"),
+              "w") as f:
+        f.write("Initial_profile  9\nEndOfData")
+    write_stand_in(path.join(event_folder, "MUSIC", "MUSIChydro"),
+                   "MUSIChydro")
+    write_stand_in(path.join(event_folder, "MUSIC", "sweeper.sh"), "sweeper")
+    toolkit_folder = path.join(event_folder, "hadronic_afterburner_toolkit")
+    mkdir(toolkit_folder)
+    write_stand_in(path.join(toolkit_folder, "hadronic_afterburner_tools.e"),
+                   "hadronic_afterburner_tools.e")
+    write_stand_in(path.join(toolkit_folder, "convert_to_binary.e"),
+                   "convert_to_binary.e")
+    write_stand_in(path.join(toolkit_folder, "concatenate_binary_files.e"),
+                   "concatenate_binary_files.e")
+    with open(path.join(toolkit_folder, "parameters.dat"), "w") as f:
+        f.write("run_mode = 0\n")
+    for iev in range(n_urqmd):
+        mkdir(path.join(event_folder, "UrQMDev_{:d}".format(iev)))
+
+
+def run_driver(event_folder, database, n_events, n_urqmd, n_threads,
+               n_threads_hydro, environment):
+    """This function runs the driver with the stand-ins"""
+    with open(path.join(event_folder, "driver.log"), "w") as log:
+        return_code = subprocess.call(
+            [sys.executable, "hydro_plus_UrQMD_driver.py", "IPGlasma",
+             database, str(n_events), "0", str(n_urqmd), str(n_threads),
+             "0.4", str(n_threads_hydro)],
+            cwd=event_folder, stdout=log, stderr=subprocess.STDOUT,
+            env=environment)
+    if return_code != 0:
+        print("\U0001F6AB  the driver failed, see {}".format(
+            path.join(event_folder, "driver.log")))
+        exit(1)
+
+
+def copy_results(results_file, combine_folder, n_copies):
+    """
+        This function copies one event result n_copies times, with the
+        group renamed to a different event id in every copy
+    """
+    mkdir(combine_folder)
+    for icopy in range(n_copies):
+        copy_name = "spvn_results_{:d}".format(icopy)
+        copy_file = path.join(combine_folder, "{}.h5".format(copy_name))
+        shutil.copy(results_file, copy_file)
+        with h5py.File(copy_file, "a") as hf:
+            hf.move(list(hf.keys())[0], copy_name)
+
+
+def prepare_repository_copy(repo_copy, n_code_files):
+    """
+        This function copies the python parts of the repository and adds
+        code packages with n_code_files small files each, so that
+        generate_jobs.py runs without the physics codes
+    """
+    ignore = shutil.ignore_patterns("__pycache__", "*.pyc")
+    mkdir(repo_copy)
+    shutil.copy(path.join(REPO_PATH, "generate_jobs.py"), repo_copy)
+    for folder in ("config", "utilities", "IPGlasma_database",
+                   "3DMCGlauber_database", "Cluster_supports"):
+        shutil.copytree(path.join(REPO_PATH, folder),
+                        path.join(repo_copy, folder), ignore=ignore)
+    mkdir(path.join(repo_copy, "codes"))
+    for file_name in listdir(path.join(REPO_PATH, "codes")):
+        if file_name.endswith(".py"):
+            shutil.copy(path.join(REPO_PATH, "codes", file_name),
+                        path.join(repo_copy, "codes"))
+    for package in CODE_PACKAGES:
+        package_folder = path.join(repo_copy, "codes", package)
+        mkdir(package_folder)
+        for ifile in range(n_code_files):
+            with open(path.join(package_folder,
+                                "file_{:d}.dat".format(ifile)), "w") as f:
+                f.write("0\n")
+    for file_name in CODE_BINARIES:
+        file_path = path.join(repo_copy, "codes", file_name)
+        makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w") as f:
+            f.write("0\n")
+    for folder in ("", "config"):
+        shutil.copy(path.join(REPO_PATH, "config",
+                              "parameters_dict_user_IPGlasma.py"),
+                    path.join(repo_copy, folder, "parameters_dict_user.py"))
+
+
+def run_generate_jobs(repo_copy, working_folder, n_jobs, n_urqmd,
+                      template_mode, n_threads_generate):
+    """This function runs generate_jobs.py in the copy of the repository"""
+    with open(path.join(repo_copy, "generate_jobs.log"), "a") as log:
+        subprocess.call(
+            [sys.executable, "generate_jobs.py", "-w", working_folder,
+             "-n", str(n_jobs), "-n_urqmd", str(n_urqmd),
+             "-n_th", str(n_urqmd), "-tm", template_mode,
+             "-n_th_gen", str(n_threads_generate),
+             "-par", "parameters_dict_user.py"],
+            cwd=repo_copy, stdout=log, stderr=subprocess.STDOUT)
+
+
+def main(args, work_folder):
+    """This function runs all the benchmarks in work_folder"""
+    ipglasma_database = path.join(work_folder, "IPGlasma_benchmark.h5")
+    mcglauber_database = path.join(work_folder, "3DMCGlauber_benchmark.h5")
+    contiguous_database = path.join(work_folder,
+                                    "3DMCGlauber_contiguous_benchmark.h5")
+    print("\U0001F375  Generating synthetic databases in {} ...".format(
+        work_folder))
+    generate_ipglasma_database(ipglasma_database, args.n_events,
+                               args.grid_size)
+    generate_3dmcglauber_database(mcglauber_database, args.n_events,
+                                  args.n_strings)
+    convert_database(mcglauber_database, contiguous_database)
+
+    timed("fetch IPGlasma ({} events, text)".format(args.n_events),
+          fetch_events, IPGlasmaDatabaseReader, ipglasma_database,
+          args.n_events, work_folder)
+    timed("fetch IPGlasma ({} events, binary64)".format(args.n_events),
+          fetch_events, IPGlasmaDatabaseReader, ipglasma_database,
+          args.n_events, work_folder, "0.4", "binary64")
+    timed("fetch 3DMCGlauber ({} events)".format(args.n_events),
+          fetch_events, MCGlauberDatabaseReader, mcglauber_database,
+          args.n_events, work_folder)
+    timed("fetch 3DMCGlauber ({} events, contiguous)".format(args.n_events),
+          fetch_events, MCGlauberDatabaseReader, contiguous_database,
+          args.n_events, work_folder)
+
+    event_folder = path.join(work_folder, "event_0")
+    prepare_event_folder(event_folder, args.n_urqmd, args.n_threads,
+                         args.split_particle_list, args.scratch_folder)
+    environment = dict(environ)
+    environment.update({
+        'STAND_IN_N_SURFACE_CELLS': str(args.n_surface_cells),
+        'STAND_IN_N_SAMPLED_EVENTS': str(args.n_sampled_events),
+        'STAND_IN_N_PARTICLES': str(args.n_particles),
+    })
+    timed("driver ({} events, {} oversamples)".format(
+              args.n_events, args.n_urqmd),
+          run_driver, event_folder, ipglasma_database, args.n_events,
+          args.n_urqmd, args.n_threads, args.n_threads_hydro, environment)
+    _, stage_summary, executable_summary = summarize_profiles(
+        find_profile_files(event_folder))
+    print_summary("driver stage", stage_summary, "s")
+    print_summary("executable", executable_summary, "s")
+    for stage, entry in stage_summary.items():
+        timings["driver stage {}".format(stage)] = entry['wall_time']
+
+    results_file = path.join(event_folder,
+                             "EVENT_RESULTS_IPGlasma_benchmark_0",
+                             "spvn_results_IPGlasma_benchmark_0.h5")
+    combine_folder = path.join(work_folder, "SPVN_RESULTS")
+    copy_results(results_file, combine_folder, args.n_combine)
+    event_list = [path.join(combine_folder, file_name)
+                  for file_name in sorted(listdir(combine_folder))]
+    for mode in ("copy", "virtual"):
+        timed("combine {} events ({})".format(args.n_combine, mode),
+              combine_results, event_list,
+              path.join(work_folder, "combined_{}.h5".format(mode)), mode)
+
+    oscar_file = path.join(work_folder, "OSCAR.DAT")
+    stand_ins.N_SAMPLED_EVENTS = args.n_oscar_events
+    stand_ins.N_PARTICLES = args.n_particles
+    stand_ins.iss([path.join(path.dirname(results_file),
+                             "hydro_results_IPGlasma_benchmark_0",
+                             "surface_eps_0.18.dat"), oscar_file])
+    smash_folder = path.join(work_folder, "SMASH_input")
+    mkdir(smash_folder)
+    timed("iSS to SMASH ({} events)".format(args.n_oscar_events),
+          convert_iSS_output_to_SMASH_input, oscar_file, smash_folder)
+
+    repo_copy = path.join(work_folder, "iEBE-MUSIC")
+    prepare_repository_copy(repo_copy, args.n_code_files)
+    for template_mode in TEMPLATE_MODES:
+        working_folder = "playground_{}".format(template_mode)
+        timed("generate_jobs ({} jobs, {} oversamples, {})".format(
+                  args.n_jobs, args.n_urqmd, template_mode),
+              run_generate_jobs, repo_copy, working_folder, args.n_jobs,
+              args.n_urqmd, template_mode, args.n_threads_generate)
+        n_inodes = count_inodes(path.join(repo_copy, working_folder))
+        timings["generate_jobs inodes {}".format(template_mode)] = n_inodes
+        print("\U0001F4C1  generate_jobs created {:d} inodes".format(
+            n_inodes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description='Benchmark the python stages with stand-in codes',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-n', '--n_events', type=int, default=2,
+                        help='number of hydro events')
+    parser.add_argument('-g', '--grid_size', type=int, default=128,
+                        help='number of IP-Glasma cells in x and y')
+    parser.add_argument('-s', '--n_strings', type=int, default=500,
+                        help='mean number of 3D MC-Glauber strings')
+    parser.add_argument('-n_urqmd', '--n_urqmd', type=int, default=2,
+                        help='number of oversampled events per hydro')
+    parser.add_argument('-n_th', '--n_threads', type=int, default=2,
+                        help='number of threads of the driver')
+    parser.add_argument('-n_th_hydro', '--n_threads_hydro', type=int,
+                        default=0, help='number of threads for hydro')
+    parser.add_argument('-split', '--split_particle_list', type=int,
+                        default=0, help='split_particle_list of the driver')
+    parser.add_argument('-scratch', '--scratch_folder', type=str,
+                        default='', help='scratch_folder of the driver')
+    parser.add_argument('-cells', '--n_surface_cells', type=int,
+                        default=20000, help='cells of the hydro surface')
+    parser.add_argument('-samples', '--n_sampled_events', type=int,
+                        default=5, help='iSS events per oversample')
+    parser.add_argument('-particles', '--n_particles', type=int,
+                        default=2000, help='hadrons per iSS event')
+    parser.add_argument('-n_combine', '--n_combine', type=int, default=100,
+                        help='number of event files to combine')
+    parser.add_argument('-oscar', '--n_oscar_events', type=int, default=100,
+                        help='number of events for the iSS converter')
+    parser.add_argument('-n_jobs', '--n_jobs', type=int, default=10,
+                        help='number of jobs for generate_jobs.py')
+    parser.add_argument('-n_th_gen', '--n_threads_generate', type=int,
+                        default=4, help='threads of generate_jobs.py')
+    parser.add_argument('-code_files', '--n_code_files', type=int,
+                        default=50, help='files in each code package')
+    parser.add_argument('-w', '--work_folder', type=str, default='',
+                        help='keep all the files in this folder')
+    parser.add_argument('-o', '--output_file', type=str, default='',
+                        help='write the timings to this json file')
+    args = parser.parse_args()
+
+    if args.work_folder != "":
+        makedirs(args.work_folder)
+        main(args, path.abspath(args.work_folder))
+    else:
+        with tempfile.TemporaryDirectory() as tmp_folder:
+            main(args, tmp_folder)
+    if args.output_file != "":
+        with open(args.output_file, "w") as f:
+            json.dump(timings, f, indent=1)
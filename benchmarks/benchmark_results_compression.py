@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+    This script benchmarks the hdf5 compression filters used to pack the
+    spvn results of one event. It reports the time per event and the size
+    of the hdf5 file for each codec.
+"""
+
+import sys
+import argparse
+import tempfile
+import time
+from os import path
+from glob import glob
+import numpy as np
+
+# the driver expects the fetch scripts next to it, as in the event folders
+REPO_PATH = path.dirname(path.dirname(path.abspath(__file__)))
+for folder in ("codes", "IPGlasma_database", "3DMCGlauber_database"):
+    sys.path.insert(0, path.join(REPO_PATH, folder))
+from hydro_plus_UrQMD_driver import (write_results_to_hdf5,
+                                     get_hdf5_compression_options)
+
+CODECS = [
+    ("none", 0, 0), ("gzip", 1, 0), ("gzip", 4, 0), ("gzip", 9, 0),
+    ("gzip", 4, 1), ("lzf", 0, 0), ("lzf", 0, 1),
+]
+
+
+def generate_synthetic_spvn_folder(folder, n_files=120, n_rows=40,
+                                   n_cols=20):
+    """This function writes synthetic result tables similar to spvn files"""
+    rng = np.random.default_rng(1)
+    for ifile in range(n_files):
+        data = np.zeros([n_rows, n_cols])
+        data[:, 0] = np.linspace(0.05, 4.0, n_rows)
+        data[:, 1:] = (np.exp(-data[:, 0:1]/0.5)
+                       * rng.normal(1.0, 0.05, [n_rows, n_cols - 1]))
+        np.savetxt(path.join(folder, "particle_{}_vndata.dat".format(ifile)),
+                   data, fmt="%.6e", header="pT dN/dypTdpT vn_real vn_imag")
+
+
+def benchmark_codecs(spvn_folder, n_repeat, n_threads):
+    """This function times the packing of spvn_folder for every codec"""
+    file_list = glob(path.join(spvn_folder, "*"))
+    print("{} files in {}".format(len(file_list), spvn_folder))
+    print("{:>6s} {:>5s} {:>7s} {:>12s} {:>12s}".format(
+        "codec", "level", "shuffle", "s/event", "size (kB)"))
+    with tempfile.TemporaryDirectory() as tmp_folder:
+        h5_filename = path.join(tmp_folder, "benchmark.h5")
+        for compression, level, shuffle in CODECS:
+            options = get_hdf5_compression_options({
+                'results_compression': compression,
+                'results_compression_level': level,
+                'results_shuffle': shuffle})
+            time_start = time.perf_counter()
+            for _ in range(n_repeat):
+                write_results_to_hdf5(file_list, h5_filename, "spvn_results",
+                                      options, n_threads)
+            time_per_event = (time.perf_counter() - time_start)/n_repeat
+            print("{:>6s} {:>5d} {:>7d} {:>12.4f} {:>12.1f}".format(
+                compression, level, shuffle, time_per_event,
+                path.getsize(h5_filename)/1024.))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description='Benchmark the compression of the spvn results',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-i', '--spvn_folder', type=str, default='',
+                        help=('spvn_results folder of one event '
+                              + '(empty: use synthetic tables)'))
+    parser.add_argument('-r', '--n_repeat', type=int, default=5,
+                        help='number of repetitions for every codec')
+    parser.add_argument('-n_th', '--n_threads', type=int, default=1,
+                        help='number of processes to parse the files')
+    args = parser.parse_args()
+
+    if args.spvn_folder != "":
+        benchmark_codecs(args.spvn_folder, args.n_repeat, args.n_threads)
+    else:
+        with tempfile.TemporaryDirectory() as synthetic_folder:
+            generate_synthetic_spvn_folder(synthetic_folder)
+            benchmark_codecs(synthetic_folder, args.n_repeat, args.n_threads)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""
+    This script provides lightweight stand-ins for the physics codes, so
+    that the python orchestration can be benchmarked without them. Each
+    stand-in reads its inputs and writes outputs of realistic size and
+    format, but does no physics.
+
+    Usage: stand_ins.py code_name [arguments]
+
+    code_name: MUSIChydro, sweeper, iSS.e, urqmd.e, convert_to_binary.e,
+               concatenate_binary_files.e, hadronic_afterburner_tools.e
+
+    The particle lists are written and read in the binary layout of the
+    hadronic afterburner toolkit, see codes/split_particle_list.py.
+"""
+
+import sys
+import gzip
+import shutil
+import argparse
+from os import path, mkdir, environ
+from glob import glob
+import numpy as np
+
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(
+    __file__))), "codes"))
+from split_particle_list import (read_binary_events, write_binary_event,
+                                 PARTICLE_RECORD)
+
+# sizes of the outputs, overwritten by the environment of the benchmark
+N_SURFACE_CELLS = int(environ.get("STAND_IN_N_SURFACE_CELLS", 20000))
+N_SAMPLED_EVENTS = int(environ.get("STAND_IN_N_SAMPLED_EVENTS", 5))
+N_PARTICLES = int(environ.get("STAND_IN_N_PARTICLES", 2000))
+N_PT_BINS = 40
+
+HYDRO_INFO_FILES = [
+    "eccentricities_evo_eta_-0.5_0.5.dat",
+    "momentum_anisotropy_eta_-0.5_0.5.dat",
+    "inverse_Reynolds_number_eta_-0.5_0.5.dat",
+    "averaged_phase_diagram_trajectory_eta_-0.5_0.5.dat",
+]
+
+# pdg code, UrQMD ityp, 2*I3, charge, mass, and relative abundance
+HADRONS = [
+    (211, 101, 2, 1, 0.13957, 30.), (-211, 101, -2, -1, 0.13957, 30.),
+    (111, 101, 0, 0, 0.13498, 30.), (321, 106, 1, 1, 0.49368, 5.),
+    (-321, -106, -1, -1, 0.49368, 5.), (2212, 1, 1, 1, 0.93827, 2.),
+    (-2212, -1, -1, -1, 0.93827, 1.5), (2112, 1, -1, 0, 0.93957, 2.),
+    (3122, 27, 0, 0, 1.11568, 1.), (-3122, -27, 0, 0, 1.11568, 0.8),
+    (3312, 49, -1, -1, 1.32171, 0.1), (-3312, -49, 1, 1, 1.32171, 0.1),
+    (3334, 55, 0, -1, 1.67245, 0.01), (-3334, -55, 0, 1, 1.67245, 0.01),
+    (333, 109, 0, 0, 1.01946, 0.5),
+]
+
+
+def read_whole_file(file_name):
+    """This function reads a file like a code reading its input"""
+    if not path.isfile(file_name):
+        return 0
+    n_bytes = 0
+    with open(file_name, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            n_bytes += len(block)
+    return n_bytes
+
+
+def sample_hadrons(rng, n_particles):
+    """This function samples the species and momenta of hadrons"""
+    abundance = np.array([ihadron[5] for ihadron in HADRONS])
+    species = rng.choice(len(HADRONS), size=n_particles,
+                         p=abundance/abundance.sum())
+    mass = np.array([ihadron[4] for ihadron in HADRONS])[species]
+    momentum = rng.exponential(0.5, [n_particles, 3])*rng.choice(
+        [-1., 1.], [n_particles, 3])
+    energy = np.sqrt(mass**2 + (momentum**2).sum(axis=1))
+    position = rng.normal(0., 5., [n_particles, 4])
+    position[:, 0] = np.abs(position[:, 0]) + 0.4
+    return species, mass, momentum, energy, position
+
+
+def music_hydro(args):
+    """
+        This function stands in for MUSIChydro: it reads the initial
+        condition and writes the freeze-out surface and the hydro evolution
+        files into the current folder
+    """
+    for initial_file in glob("initial/*"):
+        read_whole_file(initial_file)
+    rng = np.random.default_rng()
+    np.savetxt("surface_eps_0.18.dat",
+               rng.random([N_SURFACE_CELLS, 34]), fmt="%.6e")
+    for file_name in HYDRO_INFO_FILES:
+        np.savetxt(file_name, rng.random([100, 10]), fmt="%.6e",
+                   header="tau values")
+    print("[Info] MUSIC hydro Finished.")
+
+
+def sweeper(args):
+    """This function stands in for sweeper.sh: it collects hydro results"""
+    results_folder = args[0]
+    mkdir(results_folder)
+    for file_name in (["surface_eps_0.18.dat", "run.log", "run.err"]
+                      + HYDRO_INFO_FILES):
+        if path.isfile(file_name):
+            shutil.move(file_name, results_folder)
+    shutil.copy("music_input_mode_2", path.join(results_folder,
+                                                "music_input"))
+
+
+def iss(args):
+    """
+        This function stands in for iSS.e: it reads the surface and writes
+        the sampled hadrons in the OSCAR format
+        args: surface_file OSCAR_file
+    """
+    surface_file, oscar_file = args
+    read_whole_file(surface_file)
+    rng = np.random.default_rng()
+    pdg = np.array([ihadron[0] for ihadron in HADRONS])
+    with open(oscar_file, "w") as f:
+        f.write("OSC1999A\nfinal_id_p_x\n iSS stand-in\n")
+        for iev in range(N_SAMPLED_EVENTS):
+            n_particles = rng.poisson(N_PARTICLES)
+            species, mass, momentum, energy, position = sample_hadrons(
+                rng, n_particles)
+            f.write("{0:d} {1:d} 0 0\n".format(iev, n_particles))
+            data = np.column_stack((
+                np.arange(n_particles), pdg[species], momentum, energy, mass,
+                position[:, 1:], position[:, 0]))
+            np.savetxt(f, data, fmt="%d %d" + " %.6e"*9)
+
+
+def urqmd(args):
+    """
+        This function stands in for urqmd.e: it reads the OSCAR file from
+        iSS and writes the UrQMD particle list (particle_list.dat) with the
+        same number of hadrons per event
+        args: OSCAR_file particle_list_file
+    """
+    oscar_file, particle_list_file = args
+    rng = np.random.default_rng()
+    urqmd_ids = np.array([ihadron[1:4] for ihadron in HADRONS])
+    with open(oscar_file, "r") as f_in, open(particle_list_file, "w") as f_out:
+        for _ in range(3):
+            f_in.readline()
+        for line in f_in:
+            n_particles = int(line.split()[1])
+            for _ in range(n_particles):
+                f_in.readline()
+            species, mass, momentum, energy, position = sample_hadrons(
+                rng, n_particles)
+            f_out.write("{0:d}\n".format(n_particles))
+            data = np.column_stack((urqmd_ids[species], mass, position,
+                                    energy, momentum))
+            np.savetxt(f_out, data, fmt="%d %d %d" + " %.6e"*9)
+
+
+def convert_to_binary(args):
+    """
+        This function stands in for convert_to_binary.e: it converts the
+        UrQMD particle list into the zipped binary particle list next to it
+        args: particle_list_file
+    """
+    particle_list_file = args[0]
+    binary_file = "{}.gz".format(path.splitext(particle_list_file)[0])
+    with open(particle_list_file, "r") as f_in, \
+            gzip.open(binary_file, "wb", compresslevel=6) as f_out:
+        for line in f_in:
+            n_particles = int(line.split()[0])
+            particles = np.zeros(n_particles, dtype=PARTICLE_RECORD)
+            if n_particles > 0:
+                data = np.loadtxt([f_in.readline()
+                                   for _ in range(n_particles)], ndmin=2)
+                particles["info"] = data[:, :3]
+                particles["kinematics"] = data[:, 3:]
+            write_binary_event(f_out, particles)
+
+
+def concatenate_binary_files(args):
+    """
+        This function stands in for concatenate_binary_files.e: it appends
+        the second zipped binary particle list to the first one
+    """
+    with open(args[0], "ab") as f_out, open(args[1], "rb") as f_in:
+        shutil.copyfileobj(f_in, f_out)
+
+
+def hadronic_afterburner_tools(args):
+    """
+        This function stands in for hadronic_afterburner_tools.e: it reads
+        the zipped binary particle list results/particle_list.dat and
+        writes the spvn tables of one run
+    """
+    options = dict(iarg.split("=", 1) for iarg in args)
+    for _ in read_binary_events(path.join("results", "particle_list.dat")):
+        pass
+    pid = options['particle_monval']
+    rng = np.random.default_rng()
+    if options['rap_type'] == "0":
+        window = "eta_{0}_{1}".format(options['rap_min'], options['rap_max'])
+    else:
+        window = "y_{0}_{1}".format(options['rap_min'], options['rap_max'])
+    file_names = ["particle_{0}_vndata_{1}.dat".format(pid, window),
+                  "particle_{0}_vndata_diff_{1}.dat".format(pid, window),
+                  "particle_{0}_dNd{1}_pT.dat".format(pid, window)]
+    if options.get('compute_correlation', "0") == "1":
+        file_names += [
+            "particle_{0}_Symmetric_cumulant_{1}.dat".format(pid, window),
+            "particle_{0}_vn4_{1}.dat".format(pid, window),
+            "particle_{0}_Charge_dependent_correlation_{1}.dat".format(
+                pid, window)]
+    for file_name in file_names:
+        data = rng.random([N_PT_BINS, 20])
+        data[:, 0] = np.linspace(0.05, 4.0, N_PT_BINS)
+        np.savetxt(path.join("results", file_name), data, fmt="%.6e",
+                   header="pT dN/dypTdpT vn_real vn_imag")
+
+
+STAND_INS = {
+    'MUSIChydro': music_hydro,
+    'sweeper': sweeper,
+    'iSS.e': iss,
+    'urqmd.e': urqmd,
+    'convert_to_binary.e': convert_to_binary,
+    'concatenate_binary_files.e': concatenate_binary_files,
+    'hadronic_afterburner_tools.e': hadronic_afterburner_tools,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description='Stand-ins for the physics codes',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('code_name', type=str, choices=list(STAND_INS.keys()),
+                        help='name of the code to stand in for')
+    parser.add_argument('code_args', type=str, nargs=argparse.REMAINDER,
+                        help='arguments of the code')
+    args = parser.parse_args()
+    STAND_INS[args.code_name](args.code_args)
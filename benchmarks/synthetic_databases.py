@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+    This script generates synthetic IP-Glasma and 3D MC-Glauber hdf5
+    databases with the layout written by the combine_events_into_hdf5.py
+    scripts, for benchmarks without pre-generated initial conditions.
+"""
+
+import argparse
+import h5py
+import numpy as np
+
+N_IPGLASMA_COLUMNS = 15
+N_STRING_COLUMNS = 21
+
+
+def generate_ipglasma_database(file_name, n_events, grid_size=128,
+                               grid_spacing=0.08, time_stamp="0.4",
+                               compression_level=9):
+    """
+        This function writes an IP-Glasma database with n_events events
+        on a grid_size x grid_size grid
+    """
+    rng = np.random.default_rng(1)
+    x_size = grid_size*grid_spacing
+    header = ("# tau_in_fm {0:s} etamax= 1 xsize= {1:d} ysize= {1:d} "
+              "xmax= {2:g} dx= {3:g} dy= {3:g}").format(
+                  time_stamp, grid_size, x_size/2., grid_spacing)
+    with h5py.File(file_name, "w") as hf:
+        for iev in range(n_events):
+            gtemp = hf.create_group("event-{0:d}".format(iev))
+            data = np.zeros([grid_size*grid_size, N_IPGLASMA_COLUMNS])
+            xy = np.linspace(-x_size/2., x_size/2., grid_size)
+            r2 = (xy[:, None]**2 + xy[None, :]**2).ravel()
+            data[:, 0] = np.exp(-r2/20.)*rng.gamma(2., 0.5, r2.shape)
+            data[:, 1] = 1.
+            data[:, 2:4] = rng.normal(0., 0.01, [len(r2), 2])*data[:, 0:1]
+            data[:, 5:] = rng.normal(0., 0.01, [len(r2), 10])*data[:, 0:1]
+            dset = gtemp.create_dataset(
+                "epsilon-u-Hydro-t{0:s}-{1:d}.dat".format(time_stamp, iev),
+                data=data, compression="gzip",
+                compression_opts=compression_level)
+            dset.attrs.create("header", np.string_(header))
+            dset.attrs.create("x_size", x_size)
+            dset.attrs.create("y_size", x_size)
+            dset.attrs.create("dx", grid_spacing)
+            dset.attrs.create("dy", grid_spacing)
+            dset.attrs.create("nx", grid_size)
+            dset.attrs.create("ny", grid_size)
+
+
+def generate_3dmcglauber_database(file_name, n_events, n_strings=500,
+                                  compression_level=9):
+    """
+        This function writes a 3D MC-Glauber database with n_events events
+        with about n_strings strings each
+    """
+    rng = np.random.default_rng(1)
+    header = "# mass_number = 197, collision energy = 200 GeV, strings"
+    with h5py.File(file_name, "w") as hf:
+        summary = np.zeros([n_events, 6])
+        for iev in range(n_events):
+            n_strings_event = max(1, rng.poisson(n_strings))
+            data = rng.normal(0., 3., [n_strings_event, N_STRING_COLUMNS])
+            dset = hf.create_dataset(
+                "strings_event_{0:d}.dat".format(iev), data=data,
+                compression="gzip", compression_opts=compression_level)
+            dset.attrs.create("header", np.string_(header))
+            summary[iev, :] = [iev, rng.random()*15., n_strings_event,
+                               2*n_strings_event, 0., 0.]
+        hf.create_dataset("events_summary.dat", data=summary,
+                          compression="gzip",
+                          compression_opts=compression_level)
+        hf.attrs.create("mass_number", np.string_("197"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description='Generate synthetic initial condition databases',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('initial_type', type=str,
+                        choices=['IPGlasma', '3DMCGlauber'],
+                        help='type of the initial conditions')
+    parser.add_argument('output_file', type=str, help='hdf5 file to write')
+    parser.add_argument('-n', '--n_events', type=int, default=10,
+                        help='number of events')
+    parser.add_argument('-g', '--grid_size', type=int, default=128,
+                        help='number of IP-Glasma cells in x and y')
+    parser.add_argument('-s', '--n_strings', type=int, default=500,
+                        help='mean number of 3D MC-Glauber strings')
+    args = parser.parse_args()
+    if args.initial_type == "IPGlasma":
+        generate_ipglasma_database(args.output_file, args.n_events,
+                                   args.grid_size)
+    else:
+        generate_3dmcglauber_database(args.output_file, args.n_events,
+                                      args.n_strings)
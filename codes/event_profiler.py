@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""
+    This module records the wall time, CPU time, peak memory and output
+    size of the stages of one event and of every subprocess they run.
+
+    The subprocesses are reaped with wait4, so their resource usage
+    includes all the processes they waited for. The records of one event
+    are written as one JSON line into the event results folder.
+
+    run_monitored_command also follows the log of a long command while it
+    runs and kills it early if the log shows that it went wrong.
+"""
+
+import os
+import json
+import time
+import signal
+import resource
+from contextlib import contextmanager
+from subprocess import Popen
+
+PROFILE_FILE_NAME = "event_profile.jsonl"
+
+# CPU time of the calling thread only, if the platform supports it
+RUSAGE_THREAD = getattr(resource, "RUSAGE_THREAD", resource.RUSAGE_SELF)
+
+
+def get_path_size(file_path):
+    """This function returns the size of a file or folder in bytes"""
+    if os.path.islink(file_path) or not os.path.exists(file_path):
+        return 0
+    if os.path.isfile(file_path):
+        return os.path.getsize(file_path)
+    total_size = 0
+    for root, _, files in os.walk(file_path):
+        for file_name in files:
+            ifile = os.path.join(root, file_name)
+            if not os.path.islink(ifile):
+                total_size += os.path.getsize(ifile)
+    return total_size
+
+
+def get_return_code(status):
+    """This function converts a wait status to a Popen return code"""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def get_command_record(command, return_code, start_time, rusage):
+    """This function returns the resource usage record of a command"""
+    return {
+        'command': command,
+        'return_code': return_code,
+        'wall_time': time.time() - start_time,
+        'cpu_time': rusage.ru_utime + rusage.ru_stime,
+        'max_rss_mb': rusage.ru_maxrss/1024.,
+        'block_output_bytes': rusage.ru_oublock*512,
+    }
+
+
+def run_command(command, records=None):
+    """
+        This function runs a shell command and returns its return code.
+        The resource usage record of the command is appended to records
+        if it is given.
+    """
+    start_time = time.time()
+    process = Popen(command, shell=True)
+    # the peak memory of a short command is at least the memory of this
+    # process at the fork
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = get_return_code(status)
+    if records is not None:
+        records.append(get_command_record(command, process.returncode,
+                                          start_time, rusage))
+    return process.returncode
+
+
+def run_monitored_command(command, log_file, abort_pattern=None,
+                          stall_timeout=0, records=None, poll_interval=2.):
+    """
+        This function runs a shell command like run_command and reads the
+        new lines of log_file while it runs. The command and all its
+        children are killed if a line matches the compiled regular
+        expression abort_pattern, or if the log does not grow for
+        stall_timeout seconds (0: no timeout). It returns the return code
+        and the reason of the abort ("" if the command was not killed).
+    """
+    start_time = time.time()
+    process = Popen(command, shell=True, start_new_session=True)
+    abort_reason = ""
+    log = None
+    partial_line = ""
+    last_growth_time = start_time
+    while True:
+        pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+        if pid != 0:
+            break
+        if log is None and os.path.isfile(log_file):
+            log = open(log_file, "r", errors="replace")
+        if log is not None:
+            if os.fstat(log.fileno()).st_size < log.tell():
+                # the log was truncated by the command
+                log.seek(0)
+                partial_line = ""
+            new_text = log.read()
+            if new_text:
+                last_growth_time = time.time()
+                lines = (partial_line + new_text).split("\n")
+                partial_line = lines.pop()
+                for line in lines:
+                    if abort_pattern is not None and abort_pattern.search(line):
+                        abort_reason = "log: {}".format(line.strip())
+                        break
+        if (not abort_reason and stall_timeout > 0
+                and time.time() - last_growth_time > stall_timeout):
+            abort_reason = "no log output for {:d} s".format(
+                int(stall_timeout))
+        if abort_reason:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            _, status, rusage = os.wait4(process.pid, 0)
+            break
+        time.sleep(poll_interval)
+    if log is not None:
+        log.close()
+    process.returncode = get_return_code(status)
+    if records is not None:
+        records.append(get_command_record(command, process.returncode,
+                                          start_time, rusage))
+        if abort_reason:
+            records[-1]['abort_reason'] = abort_reason
+    return process.returncode, abort_reason
+
+
+class EventProfiler:
+    """
+        This class collects the stage and subprocess records of one event.
+        The stages of one event run one after the other, possibly in
+        different threads.
+    """
+    def __init__(self, event_id):
+        self.event_id = event_id
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, output_paths=()):
+        """
+            This function measures one stage. It yields the list for the
+            records of the subprocesses of the stage. The CPU time of the
+            stage is the CPU time of its subprocesses and of the calling
+            thread. The bytes written are the sizes of output_paths after
+            the stage.
+        """
+        records = []
+        start_time = time.time()
+        start_usage = resource.getrusage(RUSAGE_THREAD)
+        status = "failed"
+        try:
+            yield records
+            status = "done"
+        finally:
+            end_usage = resource.getrusage(RUSAGE_THREAD)
+            thread_cpu_time = (end_usage.ru_utime - start_usage.ru_utime
+                               + end_usage.ru_stime - start_usage.ru_stime)
+            self.stages.append({
+                'stage': name,
+                'status': status,
+                'wall_time': time.time() - start_time,
+                'cpu_time': thread_cpu_time + sum(
+                    irecord['cpu_time'] for irecord in records),
+                'max_rss_mb': max(
+                    [end_usage.ru_maxrss/1024.]
+                    + [irecord['max_rss_mb'] for irecord in records]),
+                'bytes_written': sum(get_path_size(ipath)
+                                     for ipath in output_paths),
+                'subprocesses': records,
+            })
+
+    def write(self, folder):
+        """This function appends the records as one JSON line to folder"""
+        if not self.stages:
+            return
+        with open(os.path.join(folder, PROFILE_FILE_NAME), "a") as f:
+            f.write(json.dumps({'event_id': self.event_id,
+                                'hostname': os.uname()[1],
+                                'time': time.time(),
+                                'stages': self.stages}) + "\n")
@@ -1,16 +1,40 @@
 #!/usr/bin/env python
 """This is a drive script to run hydro + hadronic cascade simulation"""
 
-from multiprocessing import Pool
-from subprocess import call
-from os import path, mkdir, remove
+from multiprocessing import Pool, cpu_count
+from threading import Thread
+from queue import Queue
+from os import (path, mkdir, makedirs, remove, listdir, symlink, replace,
+                getpid, chdir)
 from glob import glob
+import re
 import sys
+import hashlib
 import shutil
 import h5py
 import numpy as np
-from fetch_IPGlasma_event_from_hdf5_database import fecth_an_IPGlasma_event
-from fetch_3DMCGlauber_event_from_hdf5_database import fecth_an_3DMCGlauber_event
+from fetch_IPGlasma_event_from_hdf5_database import IPGlasmaDatabaseReader
+from fetch_3DMCGlauber_event_from_hdf5_database import MCGlauberDatabaseReader
+from split_particle_list import split_particle_list
+from event_profiler import EventProfiler, run_command, run_monitored_command
+
+# parameters file written by config/parameters_dict_master.py
+DRIVER_PARAMETERS_FILE = "driver_parameters.dat"
+DEFAULT_DRIVER_PARAMETERS = {
+    'results_compression': "gzip",
+    'results_compression_level': 4,
+    'results_shuffle': 0,
+    'split_particle_list': 0,
+    'hydro_abort_pattern': r"\bnan\b|unstable|instabilit",
+    'hydro_stall_timeout': 1800,
+    'surface_staging_folder': "",
+    'scratch_folder': "",
+    'afterburner': "urqmd",
+}
+
+# stages of one event, in order; each writes a completion marker into the
+# event results folder when it has finished
+EVENT_STAGES = ["hydro", "surface", "urqmd", "analysis", "zip", "cleanup"]
 
 
 def print_usage():
@@ -18,26 +42,166 @@ def print_usage():
     print("\U0001F3B6  "
           + "Usage: {} ".format(sys.argv[0]) + "initial_condition_database "
           + "initial_condition_type n_hydro_events hydro_event_id n_UrQMD "
-          + "n_threads tau0")
+          + "n_threads tau0 [n_threads_hydro]")
+
+
+def read_driver_parameters(file_name=DRIVER_PARAMETERS_FILE):
+    """
+        This function reads the driver parameters from file_name. The
+        parameters which are not in the file keep their default values.
+    """
+    parameters = dict(DEFAULT_DRIVER_PARAMETERS)
+    if not path.isfile(file_name):
+        return parameters
+    with open(file_name, "r") as parfile:
+        for line in parfile:
+            if "=" not in line:
+                continue
+            key, val = [item.strip() for item in line.split("=", 1)]
+            if key in DEFAULT_DRIVER_PARAMETERS:
+                val = type(DEFAULT_DRIVER_PARAMETERS[key])(val)
+            parameters[key] = val
+    return parameters
+
+
+def get_hdf5_compression_options(driver_parameters):
+    """
+        This function translates the driver parameters into the compression
+        keyword arguments for h5py create_dataset
+    """
+    compression = driver_parameters['results_compression']
+    options = {}
+    if compression == "gzip":
+        options['compression'] = "gzip"
+        options['compression_opts'] = int(
+            driver_parameters['results_compression_level'])
+    elif compression == "lzf":
+        options['compression'] = "lzf"
+    elif compression != "none":
+        print("\U0001F6AB  "
+              + "Do not recognize the compression filter: {}".format(
+                  compression))
+        exit(1)
+    if compression != "none" and driver_parameters['results_shuffle'] == 1:
+        options['shuffle'] = True
+    return options
+
+
+def get_event_id(database, initial_type, iev):
+    """
+        This function returns the event id of the event iev from the
+        initial condition database, which names the event results folder
+    """
+    if initial_type == "IPGlasma":
+        initial_database_name = database.split("/")[-1].split(".h5")[0]
+        return "{0}_{1:d}".format(initial_database_name, iev)
+    return "{:d}".format(iev)
+
+
+def get_stage_marker(final_results_folder, stage):
+    """This function returns the completion marker file of a stage"""
+    return path.join(final_results_folder, ".stage_{}".format(stage))
+
+
+def get_stage_status(final_results_folder, stage):
+    """
+        This function returns the status recorded in the marker of a stage,
+        or None if the stage has not finished
+    """
+    marker = get_stage_marker(final_results_folder, stage)
+    if not path.isfile(marker):
+        return None
+    with open(marker, "r") as f:
+        return f.read().strip()
+
+
+def stage_is_done(final_results_folder, stage):
+    """This function checks whether a stage has finished successfully"""
+    return get_stage_status(final_results_folder, stage) == "done"
+
+
+def mark_stage(final_results_folder, stage, status="done"):
+    """
+        This function writes the marker of a stage. The marker is written
+        to a temporary file first and renamed, so it is either complete or
+        absent if the job is killed.
+    """
+    marker = get_stage_marker(final_results_folder, stage)
+    tmp_marker = "{0}.{1:d}.tmp".format(marker, getpid())
+    with open(tmp_marker, "w") as f:
+        f.write("{}\n".format(status))
+    replace(tmp_marker, marker)
+
+
+def remove_path(file_path):
+    """This function removes a file, link or folder if it exists"""
+    if path.isdir(file_path) and not path.islink(file_path):
+        shutil.rmtree(file_path)
+    elif path.lexists(file_path):
+        remove(file_path)
+
+
+def get_stage_outputs(final_results_folder, event_id, n_urqmd):
+    """
+        This function returns the files and folders written by each stage.
+        They are removed before an unfinished stage is run again.
+    """
+    return {
+        "hydro": ["MUSIC/hydro_results",
+                  path.join(final_results_folder,
+                            "hydro_results_{}".format(event_id))],
+        "surface": ["UrQMDev_{0:d}/hydro_event".format(iev)
+                    for iev in range(n_urqmd)],
+        "urqmd": [path.join(final_results_folder,
+                            "particle_list_{}.gz".format(event_id)),
+                  path.join(final_results_folder,
+                            "smash_results_{}".format(event_id))],
+        "analysis": ["hadronic_afterburner_toolkit/results",
+                     "particle_list_species",
+                     path.join(final_results_folder,
+                               "spvn_results_{}".format(event_id))],
+        "zip": ["spvn_results_{}.h5".format(event_id),
+                path.join(final_results_folder,
+                          "spvn_results_{}.h5".format(event_id))],
+        "cleanup": [],
+    }
+
+
+def clean_unfinished_stage(final_results_folder, event_id, n_urqmd, stage):
+    """This function removes the outputs of a stage left by a killed run"""
+    for file_path in get_stage_outputs(final_results_folder, event_id,
+                                       n_urqmd)[stage]:
+        remove_path(file_path)
+
 
+def get_initial_condition(database, initial_type, event_list,
+                          time_stamp_str="0.4", records=None):
+    """
+        This funciton get initial conditions for the events in event_list
+
+        The resource usage of the subprocesses is appended to records.
 
-def get_initial_condition(database, initial_type, nev, idx0,
-                          time_stamp_str="0.4"):
-    """This funciton get initial conditions"""
+        Events from a database are fetched with one open database file, one
+        event at a time when it is requested, so that only the initial
+        condition of the next hydro event is on disk. The database is
+        closed when the generator is exhausted or closed.
+    """
     if initial_type == "IPGlasma":
-        for iev in range(idx0, idx0 + nev):
-            file_name = fecth_an_IPGlasma_event(database, time_stamp_str, iev)
-            yield file_name
+        with IPGlasmaDatabaseReader(database, time_stamp_str) as reader:
+            for iev in event_list:
+                yield reader.fetch(iev)
     elif initial_type == "3DMCGlauber":
-        for iev in range(idx0, idx0 + nev):
-            file_name = "strings_event_{}.dat".format(iev)
-            if database == "self":
-                call("(cd 3dMCGlauber; ./3dMCGlb.e 1;)", shell=True)
-                call("mv 3dMCGlauber/strings_event_0.dat {}".format(file_name),
-                     shell=True)
-            else:
-                file_name = fecth_an_3DMCGlauber_event(database, iev)
-            yield file_name
+        if database == "self":
+            for iev in event_list:
+                file_name = "strings_event_{}.dat".format(iev)
+                run_command("(cd 3dMCGlauber; ./3dMCGlb.e 1;)", records)
+                run_command("mv 3dMCGlauber/strings_event_0.dat {}".format(
+                    file_name), records)
+                yield file_name
+        else:
+            with MCGlauberDatabaseReader(database) as reader:
+                for iev in event_list:
+                    yield reader.fetch(iev)
     else:
         print("\U0001F6AB  "
               + "Do not recognize the initial condition type: {}".format(
@@ -45,89 +209,450 @@ def get_initial_condition(database, initial_type, nev, idx0,
         exit(1)
 
 
-def run_hydro_event(final_results_folder, event_id):
-    """This functions run hydro"""
+def run_hydro_event(final_results_folder, event_id, n_threads=0,
+                    records=None, driver_parameters=DEFAULT_DRIVER_PARAMETERS):
+    """
+        This functions run hydro
+
+        n_threads > 0 overwrites the number of OpenMP threads set in
+        run_hydro.sh
+
+        The MUSIC log is followed while hydro runs, and hydro is killed if
+        it matches hydro_abort_pattern or does not grow for
+        hydro_stall_timeout seconds. It returns whether hydro succeeded,
+        the hydro results folder and the reason of a failure.
+    """
     print("\U0001F3B6  Playing MUSIC ... ")
-    call("bash ./run_hydro.sh", shell=True)
+    command = "bash ./run_hydro.sh"
+    if n_threads > 0:
+        command += " {0:d}".format(n_threads)
+    abort_pattern = None
+    if driver_parameters['hydro_abort_pattern'] != "":
+        abort_pattern = re.compile(driver_parameters['hydro_abort_pattern'],
+                                   re.IGNORECASE)
+    remove_path("MUSIC/run.log")
+    _, abort_reason = run_monitored_command(
+        command, "MUSIC/run.log", abort_pattern,
+        driver_parameters['hydro_stall_timeout'], records)
+    if abort_reason:
+        print("\U000026D4  MUSIC is killed, {}".format(abort_reason))
+        return(False, "", abort_reason)
 
     # check hydro finishes properly
-    ftmp = open("MUSIC/hydro_results/run.log", 'r')
-    hydro_status = ftmp.readlines()[-1].split()[3]
-    hydro_success = False
-    if hydro_status == "Finished.":
-        hydro_success = True
+    hydro_status = ""
+    if path.isfile("MUSIC/hydro_results/run.log"):
+        with open("MUSIC/hydro_results/run.log", 'r') as ftmp:
+            log_lines = ftmp.readlines()
+        if log_lines and len(log_lines[-1].split()) > 3:
+            hydro_status = log_lines[-1].split()[3]
+    if hydro_status != "Finished.":
+        return(False, "", "MUSIC did not finish")
+
+    # collect hydro results
+    hydro_folder_name = "hydro_results_{}".format(event_id)
+    shutil.move("MUSIC/hydro_results", path.join(final_results_folder,
+                                                 hydro_folder_name))
+    return(True, hydro_folder_name, "")
+
 
-    hydro_folder_name = ""
-    if hydro_success:
-        # collect hydro results
-        hydro_folder_name = "hydro_results_{}".format(event_id)
-        shutil.move("MUSIC/hydro_results", path.join(final_results_folder,
-                                                     hydro_folder_name))
-    return(hydro_success, hydro_folder_name)
+def get_surface_file(final_results_folder, hydro_folder_name):
+    """This function returns the hydro surface file of an event"""
+    return path.abspath(glob(path.join(final_results_folder,
+                                       hydro_folder_name,
+                                       "surface*.dat"))[0])
+
+
+def get_staged_surface_file(final_results_folder, driver_parameters):
+    """
+        This function returns the path of the surface copy in node-local
+        memory shared by all the oversampled events of an event, or "" if
+        the staging folder is not available. The path is unique for the
+        event results folder, so it stays the same if the job restarts.
+    """
+    staging_folder = driver_parameters['surface_staging_folder']
+    if staging_folder == "" or not path.isdir(staging_folder):
+        return ""
+    folder_hash = hashlib.md5(
+        path.abspath(final_results_folder).encode()).hexdigest()[:16]
+    return path.join(staging_folder, "iEBE-MUSIC_surface_{}".format(
+        folder_hash), "surface.dat")
+
+
+def stage_surface_file(surface_file, staged_surface_file, n_urqmd):
+    """
+        This function copies the hydro surface once to the staging folder.
+        If there is not enough space, the staged file links to the surface
+        in the results folder instead.
+    """
+    staging_folder = path.dirname(staged_surface_file)
+    remove_path(staging_folder)
+    makedirs(staging_folder)
+    surface_size = path.getsize(surface_file)
+    if shutil.disk_usage(staging_folder).free > 2*surface_size:
+        shutil.copyfile(surface_file, staged_surface_file)
+        print("\U0001F4BE  Staged the surface ({0:.1f} MB) in {1}, shared by "
+              "{2:d} oversampled events".format(surface_size/1024.**2,
+                                                staging_folder, n_urqmd))
+    else:
+        symlink(surface_file, staged_surface_file)
+        print("\U000026A0  Not enough space to stage the surface in {}, "
+              "read it from the results folder".format(staging_folder))
+
+
+def link_surface_files(final_results_folder, hydro_folder_name, n_urqmd,
+                       staged_surface_file=""):
+    """
+        This function links the surface of every oversampled event to
+        staged_surface_file if it is given, or to the surface in the
+        results folder otherwise. Existing links are replaced, so that
+        they never point to a staged surface of a previous run.
+    """
+    surface_file = staged_surface_file
+    if surface_file == "":
+        surface_file = get_surface_file(final_results_folder,
+                                        hydro_folder_name)
+    for iev in range(n_urqmd):
+        link_name = "UrQMDev_{0:d}/hydro_event/surface.dat".format(iev)
+        remove_path(link_name)
+        symlink(surface_file, link_name)
 
 
 def prepare_surface_files_for_urqmd(final_results_folder, hydro_folder_name,
                                     n_urqmd):
     """This function prepares hydro surface for hadronic casade"""
-    surface_file = glob(path.join(final_results_folder, hydro_folder_name,
-                                  "surface*.dat"))
     for iev in range(n_urqmd):
         hydro_surface_folder = "UrQMDev_{0:d}/hydro_event".format(iev)
         mkdir(hydro_surface_folder)
-        call("ln -s {0:s} {1:s}".format(
-            path.abspath(surface_file[0]),
-            path.join(hydro_surface_folder, "surface.dat")), shell=True)
         shutil.copy(path.join(final_results_folder, hydro_folder_name,
                               "music_input"), hydro_surface_folder)
+    link_surface_files(final_results_folder, hydro_folder_name, n_urqmd)
+
 
 def run_urqmd_event(event_id):
-    """This function runs hadornic afterburner"""
-    call("bash ./run_afterburner.sh {0:d}".format(event_id), shell=True)
+    """
+        This function runs hadornic afterburner for the oversampled event
+        event_id. It returns the event id and the resource usage record.
+    """
+    records = []
+    run_command("bash ./run_afterburner.sh urqmd {0:d}".format(event_id),
+                records)
+    return event_id, records
+
+def run_urqmd_shell(n_urqmd, final_results_folder, event_id, n_threads=0,
+                    records=None):
+    """
+        This function runs urqmd events in parallel
+
+        n_threads > 0 caps the number of UrQMD events running at the same time
 
-def run_urqmd_shell(n_urqmd, final_results_folder, event_id):
-    """This function runs urqmd events in parallel"""
+        The particle lists are merged while the remaining UrQMD events run:
+        the first finished event is the base, and every other event is
+        appended to it as soon as it finishes.
+    """
     print("\U0001F5FF  Running UrQMD ... ")
-    with Pool(processes=n_urqmd) as pool1:
-        pool1.map(run_urqmd_event, range(n_urqmd))
-
-    for iev in range(1, n_urqmd):
-        call("./hadronic_afterburner_toolkit/concatenate_binary_files.e "
-             + "UrQMDev_0/UrQMD_results/particle_list.gz "
-             + "UrQMDev_{}/UrQMD_results/particle_list.gz".format(iev),
-             shell=True)
+    n_processes = n_urqmd
+    if n_threads > 0:
+        n_processes = max(1, min(n_urqmd, n_threads))
+    base_file = None
+    with Pool(processes=n_processes) as pool1:
+        for iev, iev_records in pool1.imap_unordered(run_urqmd_event,
+                                                     range(n_urqmd)):
+            if records is not None:
+                records += iev_records
+            iev_file = "UrQMDev_{}/UrQMD_results/particle_list.gz".format(iev)
+            if base_file is None:
+                base_file = iev_file
+                continue
+            run_command(
+                "./hadronic_afterburner_toolkit/concatenate_binary_files.e "
+                + "{0} {1}".format(base_file, iev_file), records)
     urqmd_results_name = "particle_list_{}.gz".format(event_id)
-    shutil.move("UrQMDev_0/UrQMD_results/particle_list.gz",
+    shutil.move(base_file,
                 path.join(final_results_folder, urqmd_results_name))
     return path.join(final_results_folder, urqmd_results_name)
 
 
-def run_spvn_analysis(pid):
-    """This function runs analysis"""
-    call("bash ./run_analysis_spvn.sh {0:s}".format(pid), shell=True)
+def run_afterburner_stage(task):
+    """
+        This function runs one stage of run_afterburner.sh for SMASH:
+        ("sample", iev) or ("smash", iev, shift_id). It returns the task
+        and the resource usage record.
+    """
+    records = []
+    run_command("bash ./run_afterburner.sh {}".format(
+        " ".join(str(iarg) for iarg in task)), records)
+    return task, records
+
+
+def get_smash_input_chunks(iev):
+    """
+        This function returns the Shift_Id of every SMASH input file of the
+        oversampled event iev, one SMASH instance runs per file
+    """
+    input_folder = "UrQMDev_{0:d}/iSS/SMASH_input".format(iev)
+    if not path.isdir(input_folder):
+        return []
+    return sorted(int(file_name[len("sampled_particles"):])
+                  for file_name in listdir(input_folder)
+                  if file_name.startswith("sampled_particles"))
+
+
+def run_smash_shell(n_urqmd, final_results_folder, event_id, n_threads=0,
+                    records=None):
+    """
+        This function runs the SMASH afterburner of all the oversampled
+        events with one core budget of n_threads cores (all the cores if
+        n_threads = 0).
+
+        The stages of all the oversampled events run from one queue: the
+        SMASH instances of an event are queued as soon as its particles
+        are sampled. The SMASH results are moved to
+        smash_results_<event_id>, they are analyzed in the analysis stage.
+    """
+    n_cores = n_threads if n_threads > 0 else cpu_count()
+    print("\U0001F5FF  Running SMASH on {0:d} cores ... ".format(n_cores))
+    finished_tasks = Queue()
+    with Pool(processes=n_cores) as pool:
+        def submit(task):
+            pool.apply_async(run_afterburner_stage, (task,),
+                             callback=finished_tasks.put,
+                             error_callback=finished_tasks.put)
+        for iev in range(n_urqmd):
+            submit(("sample", iev))
+        n_running = n_urqmd
+        while n_running > 0:
+            result = finished_tasks.get()
+            n_running -= 1
+            if isinstance(result, Exception):
+                raise result
+            task, task_records = result
+            if records is not None:
+                records += task_records
+            if task[0] == "sample":
+                chunks = get_smash_input_chunks(task[1])
+                for shift_id in chunks:
+                    submit(("smash", task[1], shift_id))
+                n_running += len(chunks)
+    smash_results_folder = path.join(final_results_folder,
+                                     "smash_results_{}".format(event_id))
+    mkdir(smash_results_folder)
+    for iev in range(n_urqmd):
+        shutil.move("UrQMDev_{0:d}/iSS/SMASH_results".format(iev),
+                    path.join(smash_results_folder,
+                              "UrQMDev_{0:d}".format(iev)))
+    return smash_results_folder
+
+
+def run_smash_analysis(smash_results_folder, final_results_folder, event_id,
+                       records=None):
+    """
+        This function analyzes the SMASH events of all the oversampled
+        events into spvn_results_<event_id>, which is packed into hdf5 in
+        the zip stage as the UrQMD results
+    """
+    print("\U0001F3CD Running SMASH analysis ... ")
+    spvn_folder = path.join(final_results_folder,
+                            "spvn_results_{0:s}".format(event_id))
+    mkdir(spvn_folder)
+    run_command("bash ./run_afterburner.sh analyze {0:s} {1:s}".format(
+        path.abspath(smash_results_folder), path.abspath(spvn_folder)),
+        records)
+
+
+# particles for the spvn analysis
+SPVN_PARTICLE_LIST = [
+    '9999', '211', '-211', '321', '-321', '2212', '-2212',
+    '3122', '-3122', '3312', '-3312', '3334', '-3334', '333']
+
+# analysis runs for charged hadrons (9999):
+# (rap_min, rap_max, compute_correlation and flag_charge_dependence)
+# the correlation runs use 0.2 < pT < 2.0 GeV
+CHARGED_HADRON_SPVN_RUNS = [
+    (-0.5, 0.5, 0), (-1.0, -0.1, 0), (0.1, 1.0, 0), (0.5, 2.0, 0),
+    (-2.0, -0.5, 0), (-1.0, 1.0, 1), (-2.0, 2.0, 1), (-1.0, 1.0, 0),
+    (-2.0, 2.0, 0),
+]
+
+# relative costs of one hadronic_afterburner_tools.e run
+CHARGED_HADRON_COST_WEIGHT = 2.
+CORRELATION_COST_WEIGHT = 4.
+
+
+def get_spvn_analysis_tasks(particle_list=SPVN_PARTICLE_LIST):
+    """
+        This function returns the spvn analysis tasks. Each task is the
+        particle id and a list of option strings for
+        hadronic_afterburner_tools.e. The runs in one task share the same
+        particle and rapidity window, so they write to the same output
+        files and must run in order. The tasks are sorted with the longest
+        expected run time first.
+    """
+    tasks = []
+    for pid in particle_list:
+        if pid == "9999":
+            # charged hadrons
+            windows = {}
+            for rap_min, rap_max, corr_flag in CHARGED_HADRON_SPVN_RUNS:
+                options = (
+                    "run_mode=0 read_in_mode=2 particle_monval={0} "
+                    "resonance_feed_down_flag=0 distinguish_isospin=0 "
+                    "rap_type=0 rap_min={1} rap_max={2} "
+                    "compute_correlation={3} flag_charge_dependence={3}"
+                ).format(pid, rap_min, rap_max, corr_flag)
+                if corr_flag == 1:
+                    options += " pT_min=0.2 pT_max=2.0"
+                cost = CHARGED_HADRON_COST_WEIGHT*(
+                    1. + CORRELATION_COST_WEIGHT*corr_flag)
+                task = windows.setdefault((rap_min, rap_max), [0., []])
+                task[0] += cost
+                task[1].append(options)
+            tasks += [(task_cost, pid, task_runs)
+                      for task_cost, task_runs in windows.values()]
+        else:
+            options = (
+                "run_mode=0 read_in_mode=2 particle_monval={0} "
+                "resonance_feed_down_flag=0 distinguish_isospin=1 "
+                "rap_type=1 rap_min=-0.5 rap_max=0.5 "
+                "compute_correlation=0 flag_charge_dependence=0"
+            ).format(pid)
+            tasks.append((1., pid, [options]))
+    tasks.sort(key=lambda itask: itask[0], reverse=True)
+    return [(pid, task_runs) for _, pid, task_runs in tasks]
+
+
+def run_spvn_analysis(task):
+    """
+        This function runs the analysis runs of one task in order in the
+        given toolkit folder. It returns the resource usage records.
+    """
+    toolkit_folder, task_runs = task
+    records = []
+    for options in task_runs:
+        run_command("(cd {0:s}; ./hadronic_afterburner_tools.e {1:s};)".format(
+            toolkit_folder, options), records)
+    return records
+
+
+def prepare_species_toolkit_folder(folder_name, particle_list_file):
+    """
+        This function creates a copy of hadronic_afterburner_toolkit with
+        symbolic links and its own results folder, which reads the particle
+        list of one particle species
+    """
+    mkdir(folder_name)
+    for entry in listdir("hadronic_afterburner_toolkit"):
+        if entry != "results":
+            symlink(path.abspath(path.join("hadronic_afterburner_toolkit",
+                                           entry)),
+                    path.join(folder_name, entry))
+    mkdir(path.join(folder_name, "results"))
+    symlink(path.abspath(particle_list_file),
+            path.join(folder_name, "results", "particle_list.dat"))
 
 def run_spvn_analysis_shell(urqmd_file_path, n_threads,
-                            final_results_folder, event_id):
-    """This function runs analysis in parallel"""
+                            final_results_folder, event_id,
+                            split_by_species=False, records=None):
+    """
+        This function runs analysis in parallel. The analysis tasks are
+        handed out from one queue, longest expected task first, to
+        n_threads workers.
+
+        If split_by_species is True, the particle list is first split into
+        one file per particle species in one pass, and the runs for each
+        species read only their own file.
+
+        The resource usage of the subprocesses is appended to records.
+    """
     spvn_folder = "hadronic_afterburner_toolkit/results"
     mkdir(spvn_folder)
-    call("ln -s {0:s} {1:s}".format(
+    run_command("ln -s {0:s} {1:s}".format(
         path.abspath(urqmd_file_path),
-        path.join(spvn_folder, "particle_list.dat")), shell=True)
+        path.join(spvn_folder, "particle_list.dat")), records)
     # finally collect results
-    particle_list = [
-        '9999', '211', '-211', '321', '-321', '2212', '-2212',
-        '3122', '-3122', '3312', '-3312', '3334', '-3334', '333']
+    task_list = get_spvn_analysis_tasks()
+    species_folder = "particle_list_species"
+    if split_by_species:
+        print("\U0001F3CD Splitting the particle list by species ... ")
+        mkdir(species_folder)
+        species_files = split_particle_list(
+            urqmd_file_path, species_folder,
+            sorted(set(pid for pid, _ in task_list)))
+        for pid, species_file in species_files.items():
+            prepare_species_toolkit_folder(
+                path.join(species_folder, "toolkit_{}".format(pid)),
+                species_file)
+        full_size = path.getsize(urqmd_file_path)
+        bytes_before = full_size*sum(len(runs) for _, runs in task_list)
+        bytes_after = full_size + sum(
+            len(runs)*path.getsize(species_files[pid])
+            for pid, runs in task_list)
+        print("\U0001F3CD Particle list bytes read: "
+              + "{0:d} without splitting, {1:d} with splitting".format(
+                  bytes_before, bytes_after))
+        task_list = [
+            (path.join(species_folder, "toolkit_{}".format(pid)), runs)
+            for pid, runs in task_list]
+    else:
+        task_list = [("hadronic_afterburner_toolkit", runs)
+                     for _, runs in task_list]
     print("\U0001F3CD Running spvn analysis ... ")
-    with Pool(processes=min(10, n_threads)) as pool:
-        pool.map(run_spvn_analysis, particle_list)
+    with Pool(processes=max(1, min(len(task_list), n_threads))) as pool:
+        for task_records in pool.imap_unordered(run_spvn_analysis, task_list,
+                                                chunksize=1):
+            if records is not None:
+                records += task_records
 
-    call("rm {}/particle_list.dat".format(spvn_folder), shell=True)
+    if split_by_species:
+        for results_file in glob(path.join(species_folder, "toolkit_*",
+                                           "results", "*")):
+            if not results_file.endswith("particle_list.dat"):
+                shutil.move(results_file, spvn_folder)
+        shutil.rmtree(species_folder)
+
+    run_command("rm {}/particle_list.dat".format(spvn_folder), records)
     shutil.move(spvn_folder,
                 path.join(final_results_folder,
                           "spvn_results_{0:s}".format(event_id)))
 
-def zip_results_into_hdf5(final_results_folder, event_id):
+def load_result_file(file_path):
+    """This function reads one result table and its header line"""
+    dtemp = np.loadtxt(file_path)
+    with open(file_path, "r") as ftemp:
+        header_text = str(ftemp.readline())
+    return(file_path.split("/")[-1], dtemp, header_text)
+
+
+def write_results_to_hdf5(file_list, h5_filename, group_name,
+                          compression_options, n_threads=1):
+    """
+        This function writes the tables in file_list into the group
+        group_name of the hdf5 file h5_filename. The files are parsed by
+        a pool of n_threads processes and written by this process only.
+    """
+    hf = h5py.File(h5_filename, "w")
+    gtemp = hf.create_group(group_name)
+    if n_threads > 1 and len(file_list) > 1:
+        pool = Pool(processes=min(n_threads, len(file_list)))
+        loaded_files = pool.imap(load_result_file, file_list)
+    else:
+        pool = None
+        loaded_files = map(load_result_file, file_list)
+    for file_name, dtemp, header_text in loaded_files:
+        h5data = gtemp.create_dataset("{0}".format(file_name), data=dtemp,
+                                      **compression_options)
+        h5data.attrs.create("header", np.string_(header_text))
+    if pool is not None:
+        pool.close()
+        pool.join()
+    hf.close()
+
+
+def zip_results_into_hdf5(final_results_folder, event_id, n_threads=1,
+                          compression_options=None):
     """This function combines all the results into hdf5"""
+    if compression_options is None:
+        compression_options = get_hdf5_compression_options(
+            DEFAULT_DRIVER_PARAMETERS)
     results_name = "spvn_results_{}".format(event_id)
     hydro_info_filepattern = ["eccentricities_evo_eta_*.dat",
                               "momentum_anisotropy_eta_*.dat",
@@ -145,19 +670,10 @@ def zip_results_into_hdf5(final_results_folder, event_id):
             if path.isfile(ihydrofile):
                 shutil.move(ihydrofile, spvnfolder)
 
-    hf = h5py.File("{0}.h5".format(results_name), "w")
-    gtemp = hf.create_group("{0}".format(results_name))
     file_list = glob(path.join(spvnfolder, "*"))
-    for file_path in file_list:
-        file_name = file_path.split("/")[-1]
-        dtemp = np.loadtxt(file_path)
-        h5data = gtemp.create_dataset("{0}".format(file_name), data=dtemp,
-                             compression="gzip", compression_opts=9)
-        ftemp = open(file_path, "r")
-        header_text = str(ftemp.readline())
-        ftemp.close()
-        h5data.attrs.create("header", np.string_(header_text))
-    hf.close()
+    write_results_to_hdf5(file_list, "{0}.h5".format(results_name),
+                          "{0}".format(results_name), compression_options,
+                          n_threads)
     shutil.move("{}.h5".format(results_name), final_results_folder)
 
 
@@ -172,66 +688,361 @@ def remove_unwanted_outputs(final_results_folder, event_id):
     if not SAVE_HYDRO_SURFACE:
         hydrofolder = path.join(final_results_folder,
                                 "hydro_results_{}".format(event_id))
-        shutil.rmtree(hydrofolder)
+        remove_path(hydrofolder)
     if not SAVE_URQMD_FILES:
         urqmd_results_name = "particle_list_{}.gz".format(event_id)
-        remove(path.join(final_results_folder, urqmd_results_name))
+        remove_path(path.join(final_results_folder, urqmd_results_name))
+        remove_path(path.join(final_results_folder,
+                              "smash_results_{}".format(event_id)))
+
+def run_afterburner_stages(final_results_folder, hydro_folder_name, event_id,
+                           n_urqmd, num_threads, driver_parameters,
+                           profiler=None):
+    """
+        This function runs all the stages after hydro for one event:
+        hadronic casade, analysis, packing the results, and clean up
+
+        The stages which have finished in a previous run of the job are
+        skipped. The outputs of an unfinished stage are removed before it
+        runs again.
+
+        The resource usage of the stages is added to the profiler of the
+        event and written to the event results folder at the end.
+    """
+    if profiler is None:
+        profiler = EventProfiler(event_id)
+    stage_outputs = get_stage_outputs(final_results_folder, event_id, n_urqmd)
+    staged_surface_file = get_staged_surface_file(final_results_folder,
+                                                  driver_parameters)
+    smash_afterburner = driver_parameters['afterburner'] == "smash"
+    urqmd_file_path = path.join(final_results_folder,
+                                "particle_list_{}.gz".format(event_id))
+    smash_results_folder = path.join(final_results_folder,
+                                     "smash_results_{}".format(event_id))
+    try:
+        for stage in EVENT_STAGES[1:]:
+            if stage_is_done(final_results_folder, stage):
+                print("\U00002705  {0} of event {1} is done, skipped.".format(
+                    stage, event_id))
+                continue
+            clean_unfinished_stage(final_results_folder, event_id, n_urqmd,
+                                   stage)
+            with profiler.stage(stage, stage_outputs[stage]) as records:
+                if stage == "surface":
+                    # if hydro finishes properly, we continue to do hadronic
+                    # transport
+                    prepare_surface_files_for_urqmd(
+                        final_results_folder, hydro_folder_name, n_urqmd)
+                elif stage == "urqmd":
+                    # then run UrQMD events in parallel, they all read the
+                    # same staged surface
+                    if staged_surface_file != "":
+                        stage_surface_file(
+                            get_surface_file(final_results_folder,
+                                             hydro_folder_name),
+                            staged_surface_file, n_urqmd)
+                    link_surface_files(final_results_folder,
+                                       hydro_folder_name, n_urqmd,
+                                       staged_surface_file)
+                    try:
+                        if smash_afterburner:
+                            smash_results_folder = run_smash_shell(
+                                n_urqmd, final_results_folder, event_id,
+                                num_threads, records)
+                        else:
+                            urqmd_file_path = run_urqmd_shell(
+                                n_urqmd, final_results_folder, event_id,
+                                num_threads, records)
+                    finally:
+                        if staged_surface_file != "":
+                            remove_path(path.dirname(staged_surface_file))
+                elif stage == "analysis" and smash_afterburner:
+                    run_smash_analysis(smash_results_folder,
+                                       final_results_folder, event_id,
+                                       records)
+                elif stage == "analysis":
+                    # finally collect results
+                    run_spvn_analysis_shell(
+                        urqmd_file_path, num_threads, final_results_folder,
+                        event_id,
+                        driver_parameters['split_particle_list'] == 1,
+                        records)
+                elif stage == "zip":
+                    # zip results into a hdf5 database
+                    zip_results_into_hdf5(
+                        final_results_folder, event_id, num_threads,
+                        get_hdf5_compression_options(driver_parameters))
+                elif stage == "cleanup":
+                    # remove the unwanted outputs
+                    remove_unwanted_outputs(final_results_folder, event_id)
+            mark_stage(final_results_folder, stage)
+    finally:
+        profiler.write(final_results_folder)
+
+
+def stage_in_event_folder(scratch_root, results_folders):
+    """
+        This function copies the event folder without its event results
+        folders to node-local scratch, together with the results folders
+        in results_folders which hold the progress of unfinished events.
+        It returns the scratch folder.
+    """
+    event_folder = path.abspath(".")
+    folder_hash = hashlib.md5(event_folder.encode()).hexdigest()[:16]
+    scratch_folder = path.join(path.expandvars(scratch_root),
+                               "iEBE-MUSIC_event_{}".format(folder_hash))
+    remove_path(scratch_folder)
+    shutil.copytree(
+        event_folder, scratch_folder, symlinks=True,
+        ignore=lambda folder, names: [
+            name for name in names
+            if folder == event_folder and name.startswith("EVENT_RESULTS_")])
+    for results_folder in results_folders:
+        if path.isdir(results_folder):
+            shutil.copytree(results_folder,
+                            path.join(scratch_folder, results_folder),
+                            symlinks=True)
+    return scratch_folder
+
+
+def stage_out_worker(stage_out_queue, target_folder, stage_out_errors):
+    """
+        This function copies the event results folders in stage_out_queue
+        from the scratch folder back to target_folder one at a time, and
+        removes them from the scratch. It stops when it receives None.
+        The copy is renamed when it is complete, so that the target folder
+        never holds a partial copy.
+    """
+    while True:
+        final_results_folder = stage_out_queue.get()
+        if final_results_folder is None:
+            break
+        try:
+            target = path.join(target_folder, final_results_folder)
+            tmp_target = "{}.stage_out".format(target)
+            remove_path(tmp_target)
+            shutil.copytree(final_results_folder, tmp_target, symlinks=True)
+            remove_path(target)
+            replace(tmp_target, target)
+            remove_path(final_results_folder)
+            print("\U0001F4E4  Staged out {}".format(final_results_folder))
+        except Exception as err:
+            print("\U0001F6AB  stage out of {} failed: {}".format(
+                final_results_folder, err))
+            stage_out_errors.append(err)
+
+
+def afterburner_worker(event_queue, n_urqmd, num_threads, driver_parameters,
+                       worker_errors, stage_out_queue=None):
+    """
+        This function consumes the hydro events in the event_queue and runs
+        the afterburner stages for them one at a time. Every event is
+        marked as taken when the worker starts on it. It stops when it
+        receives None. After a failure, the remaining events are drained
+        without running, so that the hydro stage never blocks. The results
+        folder of every event, drained or not, is handed to
+        stage_out_queue if it is given.
+    """
+    while True:
+        event = event_queue.get()
+        # the hydro stage waits until the event is taken
+        event_queue.task_done()
+        if event is None:
+            break
+        final_results_folder, hydro_folder_name, event_id, profiler = event
+        if worker_errors:
+            if stage_out_queue is not None:
+                stage_out_queue.put(final_results_folder)
+            continue
+        try:
+            run_afterburner_stages(final_results_folder, hydro_folder_name,
+                                   event_id, n_urqmd, num_threads,
+                                   driver_parameters, profiler)
+        except Exception as err:
+            print("\U0001F6AB  afterburner failed for event {}: {}".format(
+                event_id, err))
+            worker_errors.append(err)
+        finally:
+            if stage_out_queue is not None:
+                stage_out_queue.put(final_results_folder)
+
 
 def main(initial_condition, initial_type,
-         n_hydro, hydro_id0, n_urqmd, num_threads, time_stamp_str="0.4"):
-    """This is the main function"""
-    print("\U0001F3CE  Number of threads: {}".format(num_threads))
+         n_hydro, hydro_id0, n_urqmd, num_threads, time_stamp_str="0.4",
+         num_threads_hydro=0):
+    """
+        This is the main function
 
-    for ifile in get_initial_condition(initial_condition,
-                                       initial_type,
-                                       n_hydro, hydro_id0, time_stamp_str):
-        print("\U0001F680 Run simulations with {} ... ".format(ifile))
-        if initial_type == "IPGlasma":
-            initial_database_name = (
-                    initial_condition.split("/")[-1].split(".h5")[0])
-            event_id = ifile.split("/")[-1].split("-")[-1].split(".dat")[0]
-            shutil.move(ifile, "MUSIC/initial/epsilon-u-Hydro.dat")
-            event_id = initial_database_name + "_" + event_id
-        elif initial_type == "3DMCGlauber":
-            event_id = ifile.split("/")[-1].split("_")[-1].split(".dat")[0]
-            shutil.move(ifile, "MUSIC/initial/strings.dat")
+        If 0 < num_threads_hydro < num_threads, the events are processed in
+        a pipeline: hydro for the next event runs with num_threads_hydro
+        threads while the afterburner of the current event runs with the
+        remaining threads. The hydro stage is at most one event ahead of
+        the afterburner stage: a finished hydro event is handed over when
+        the afterburner takes it, and only then the next hydro event
+        starts. So at most two hydro results are on disk at once.
 
+        If the driver parameter scratch_folder is set, the event folder is
+        copied to this node-local folder and all the stages run there. The
+        results folder of every event is copied back in the background
+        while the next events run.
+    """
+    print("\U0001F3CE  Number of threads: {}".format(num_threads))
+    driver_parameters = read_driver_parameters()
+
+    # events which are not finished in a previous run of the job
+    event_list = []
+    for iev in range(hydro_id0, hydro_id0 + n_hydro):
+        event_id = get_event_id(initial_condition, initial_type, iev)
         final_results_folder = "EVENT_RESULTS_{}".format(event_id)
-        mkdir(final_results_folder)
+        if stage_is_done(final_results_folder, EVENT_STAGES[-1]):
+            print("\U00002705  Event {} is done, skipped.".format(event_id))
+        elif (get_stage_status(final_results_folder, "hydro")
+              or "").startswith("failed"):
+            print("\U000026D4  Hydro of event {} failed, skipped.".format(
+                event_id))
+        else:
+            event_list.append(iev)
 
-        # first run hydro
-        hydro_success, hydro_folder_name = run_hydro_event(
-            final_results_folder, event_id)
+    # run the stages in node-local scratch and stage the results out
+    stage_out_queue = None
+    if driver_parameters['scratch_folder'] != "" and event_list:
+        event_folder = path.abspath(".")
+        if initial_condition != "self":
+            initial_condition = path.abspath(initial_condition)
+        scratch_folder = stage_in_event_folder(
+            driver_parameters['scratch_folder'],
+            ["EVENT_RESULTS_{}".format(get_event_id(
+                initial_condition, initial_type, iev)) for iev in event_list])
+        print("\U0001F4E5  Run the events in {}".format(scratch_folder))
+        chdir(scratch_folder)
+        stage_out_queue = Queue()
+        stage_out_errors = []
+        stage_out_thread = Thread(
+            target=stage_out_worker,
+            args=(stage_out_queue, event_folder, stage_out_errors))
+        stage_out_thread.start()
 
-        if not hydro_success:
-            # if hydro didn't finish properly, just skip this event
-            print("\U000026D4  {} did not finsh properly, skipped.".format(
-                hydro_folder_name))
-            continue
+    pipelined = (0 < num_threads_hydro < num_threads and n_hydro > 1)
+    if pipelined:
+        num_threads_afterburner = num_threads - num_threads_hydro
+        print("\U0001F3CE  Pipelined mode: {} threads for hydro, ".format(
+            num_threads_hydro)
+              + "{} threads for afterburner".format(num_threads_afterburner))
+        event_queue = Queue(maxsize=1)
+        worker_errors = []
+        afterburner_thread = Thread(
+            target=afterburner_worker,
+            args=(event_queue, n_urqmd, num_threads_afterburner,
+                  driver_parameters, worker_errors, stage_out_queue))
+        afterburner_thread.start()
+    else:
+        num_threads_hydro = 0
 
-        if initial_type == "3DMCGlauber" and initial_condition == "self":
-            # save the initial condition
-            shutil.move("MUSIC/initial/strings.dat",
-                        path.join(final_results_folder, hydro_folder_name,
-                                  "strings_{}.dat".format(event_id)))
+    # the initial conditions are only fetched for the events without hydro
+    initial_condition_records = []
+    initial_conditions = get_initial_condition(
+        initial_condition, initial_type,
+        [iev for iev in event_list
+         if not stage_is_done("EVENT_RESULTS_{}".format(get_event_id(
+             initial_condition, initial_type, iev)), "hydro")],
+        time_stamp_str, initial_condition_records)
+    try:
+        for iev in event_list:
+            event_id = get_event_id(initial_condition, initial_type, iev)
+            final_results_folder = "EVENT_RESULTS_{}".format(event_id)
+            hydro_folder_name = "hydro_results_{}".format(event_id)
+            if not path.isdir(final_results_folder):
+                mkdir(final_results_folder)
+            profiler = EventProfiler(event_id)
 
-        # if hydro finishes properly, we continue to do hadronic transport
-        prepare_surface_files_for_urqmd(final_results_folder,
-                                        hydro_folder_name, n_urqmd)
+            if stage_is_done(final_results_folder, "hydro"):
+                print("\U00002705  hydro of event {} is done, "
+                      "skipped.".format(event_id))
+            else:
+                with profiler.stage("initial") as records:
+                    # fetch the initial condition of this event only
+                    ifile = next(initial_conditions)
+                    records += initial_condition_records
+                    del initial_condition_records[:]
+                print("\U0001F680 Run simulations with {} ... ".format(ifile))
+                if initial_type == "IPGlasma":
+                    shutil.move(ifile, "MUSIC/initial/epsilon-u-Hydro.dat")
+                elif initial_type == "3DMCGlauber":
+                    shutil.move(ifile, "MUSIC/initial/strings.dat")
 
-        # then run UrQMD events in parallel
-        urqmd_file_path = run_urqmd_shell(n_urqmd, final_results_folder,
-                                          event_id)
+                # first run hydro
+                clean_unfinished_stage(final_results_folder, event_id,
+                                       n_urqmd, "hydro")
+                hydro_outputs = get_stage_outputs(
+                    final_results_folder, event_id, n_urqmd)["hydro"]
+                with profiler.stage("hydro", hydro_outputs) as records:
+                    hydro_success, hydro_folder_name, failure_reason = (
+                        run_hydro_event(final_results_folder, event_id,
+                                        num_threads_hydro, records,
+                                        driver_parameters))
 
-        # finally collect results
-        run_spvn_analysis_shell(urqmd_file_path, num_threads,
-                                final_results_folder, event_id)
+                if not hydro_success:
+                    # if hydro didn't finish properly, just skip this event
+                    print("\U000026D4  hydro of event {} did not finish "
+                          "properly, skipped.".format(event_id))
+                    mark_stage(final_results_folder, "hydro",
+                               "failed: {}".format(failure_reason))
+                    profiler.write(final_results_folder)
+                    if stage_out_queue is not None:
+                        stage_out_queue.put(final_results_folder)
+                    continue
 
-        # zip results into a hdf5 database
-        zip_results_into_hdf5(final_results_folder, event_id)
+                if (initial_type == "3DMCGlauber"
+                        and initial_condition == "self"):
+                    # save the initial condition
+                    shutil.move("MUSIC/initial/strings.dat",
+                                path.join(final_results_folder,
+                                          hydro_folder_name,
+                                          "strings_{}.dat".format(event_id)))
+                mark_stage(final_results_folder, "hydro")
 
-        # remove the unwanted outputs
-        remove_unwanted_outputs(final_results_folder, event_id)
+            if pipelined:
+                if worker_errors:
+                    # keep the finished hydro of this event
+                    if stage_out_queue is not None:
+                        stage_out_queue.put(final_results_folder)
+                    break
+                # hand the event over and move on to the next hydro event
+                # once the afterburner has taken it
+                event_queue.put((final_results_folder, hydro_folder_name,
+                                 event_id, profiler))
+                event_queue.join()
+            else:
+                try:
+                    run_afterburner_stages(final_results_folder,
+                                           hydro_folder_name, event_id,
+                                           n_urqmd, num_threads,
+                                           driver_parameters, profiler)
+                finally:
+                    if stage_out_queue is not None:
+                        stage_out_queue.put(final_results_folder)
+    finally:
+        # close the initial condition database
+        initial_conditions.close()
+        if pipelined:
+            event_queue.put(None)
+            afterburner_thread.join()
+        if stage_out_queue is not None:
+            stage_out_queue.put(None)
+            stage_out_thread.join()
+            # results folders left in the scratch were not staged out
+            left_results = glob("EVENT_RESULTS_*")
+            chdir(event_folder)
+            if stage_out_errors or left_results:
+                print("\U0001F6AB  Keep {} with the results which are not "
+                      "staged out: {}".format(scratch_folder,
+                                              " ".join(left_results)))
+            else:
+                remove_path(scratch_folder)
+    if pipelined and worker_errors:
+        raise worker_errors[0]
+    if stage_out_queue is not None and stage_out_errors:
+        raise stage_out_errors[0]
 
 
 if __name__ == "__main__":
@@ -246,6 +1057,9 @@ if __name__ == "__main__":
     except IndexError:
         print_usage()
         exit(0)
+    N_THREADS_HYDRO = 0
+    if len(sys.argv) > 8:
+        N_THREADS_HYDRO = int(sys.argv[8])
 
     if INITIAL_CONDITION_TYPE not in ("IPGlasma", "3DMCGlauber"):
         print("\U0001F6AB  "
@@ -254,4 +1068,5 @@ if __name__ == "__main__":
         exit(1)
 
     main(INITIAL_CONDITION_DATABASE, INITIAL_CONDITION_TYPE,
-         N_HYDRO_EVENTS, HYDRO_EVENT_ID0, N_URQMD, N_THREADS, TIME_STAMP)
+         N_HYDRO_EVENTS, HYDRO_EVENT_ID0, N_URQMD, N_THREADS, TIME_STAMP,
+         N_THREADS_HYDRO)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+    This script splits the zipped UrQMD particle list into one file per
+    particle species (and one for all charged hadrons) in a single pass.
+    The files keep the format of the particle list, so every analysis run
+    only reads the particles it needs.
+
+    The particle list is the gzipped binary file written by
+    convert_to_binary.e and merged by concatenate_binary_files.e of the
+    hadronic afterburner toolkit. It consists of events, each starting with
+    the number of particles (int32), followed by one record per particle:
+    the UrQMD particle type, two times the isospin projection, and the
+    charge (3 int32), then mass, t, x, y, z, E, px, py, pz (9 float32).
+"""
+
+import gzip
+import argparse
+from os import path
+
+import numpy as np
+
+# UrQMD (ityp, 2*I3) of the particles in each species file
+SPECIES_URQMD_IDS = {
+    '211': [(101, 2)], '-211': [(101, -2)],
+    '321': [(106, 1)], '-321': [(-106, -1)],
+    '2212': [(1, 1)], '-2212': [(-1, -1)],
+    # Sigma^0 is kept for the weak feed down to Lambda
+    '3122': [(27, 0), (40, 0)], '-3122': [(-27, 0), (-40, 0)],
+    '3312': [(49, -1)], '-3312': [(-49, 1)],
+    '3334': [(55, 0)], '-3334': [(-55, 0)],
+    '333': [(109, 0)],
+}
+CHARGED_HADRONS = '9999'
+SPLIT_COMPRESSION_LEVEL = 1
+
+# binary layout of convert_to_binary.e
+EVENT_HEADER = np.dtype("i4")
+PARTICLE_RECORD = np.dtype([("info", "i4", 3), ("kinematics", "f4", 9)])
+
+
+def get_species_file_name(output_folder, species):
+    """This function returns the file name for one species"""
+    return path.join(output_folder, "particle_list_{}.gz".format(species))
+
+
+def read_binary_events(input_file):
+    """
+        This function yields the particle records of every event of a
+        zipped binary particle list
+    """
+    with gzip.open(input_file, "rb") as f:
+        while True:
+            header = f.read(EVENT_HEADER.itemsize)
+            if not header:
+                break
+            if len(header) < EVENT_HEADER.itemsize:
+                raise ValueError(
+                    "{} ends in an event header".format(input_file))
+            n_particles = int(np.frombuffer(header, dtype=EVENT_HEADER)[0])
+            n_bytes = n_particles*PARTICLE_RECORD.itemsize
+            data = f.read(n_bytes)
+            if n_particles < 0 or len(data) < n_bytes:
+                raise ValueError(
+                    "{} is not a binary particle list".format(input_file))
+            yield np.frombuffer(data, dtype=PARTICLE_RECORD)
+
+
+def write_binary_event(f, particles):
+    """This function writes the particle records of one event"""
+    f.write(np.array(len(particles), dtype=EVENT_HEADER).tobytes())
+    f.write(np.ascontiguousarray(particles, dtype=PARTICLE_RECORD).tobytes())
+
+
+def split_particle_list(input_file, output_folder, species_list):
+    """
+        This function splits input_file into one zipped particle list per
+        species in species_list. Every event is kept in every species file,
+        also if it has no particles of that species.
+        It returns a dictionary with the file name for each species.
+    """
+    species_ids = {species: SPECIES_URQMD_IDS.get(species, [])
+                   for species in species_list
+                   if species != CHARGED_HADRONS}
+    split_charged = CHARGED_HADRONS in species_list
+
+    file_names = {species: get_species_file_name(output_folder, species)
+                  for species in species_list}
+    output_files = {species: gzip.open(file_names[species], "wb",
+                                       compresslevel=SPLIT_COMPRESSION_LEVEL)
+                    for species in species_list}
+    try:
+        for particles in read_binary_events(input_file):
+            ityp = particles["info"][:, 0]
+            iso3 = particles["info"][:, 1]
+            for species, urqmd_ids in species_ids.items():
+                selected = np.zeros(len(particles), dtype=bool)
+                for ityp_i, iso3_i in urqmd_ids:
+                    selected |= (ityp == ityp_i) & (iso3 == iso3_i)
+                write_binary_event(output_files[species],
+                                   particles[selected])
+            if split_charged:
+                write_binary_event(output_files[CHARGED_HADRONS],
+                                   particles[particles["info"][:, 2] != 0])
+    finally:
+        for output_file in output_files.values():
+            output_file.close()
+    return file_names
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description='Split the UrQMD particle list by particle species',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-i', '--input_file', type=str,
+                        default='particle_list.gz',
+                        help='zipped binary UrQMD particle list')
+    parser.add_argument('-o', '--output_folder', type=str, default='.',
+                        help='folder for the particle lists of each species')
+    parser.add_argument('-s', '--species', type=str, nargs='+',
+                        default=[CHARGED_HADRONS] + list(
+                            SPECIES_URQMD_IDS.keys()),
+                        help='particle species (pdg codes, 9999: charged)')
+    args = parser.parse_args()
+    split_particle_list(args.input_file, args.output_folder, args.species)
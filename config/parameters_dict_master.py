@@ -3,11 +3,11 @@
     This script contains all the default parameters in the iEBE-MUSIC package.
 """
 
-from os import path
+from os import path, makedirs
 import sys
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
-import shutil
 import argparse
+import copy
 
 # initial condition
 initial_dict = {
@@ -329,18 +329,51 @@ hadronic_afterburner_toolkit_dict = {
 }
 
 
+# hydro_plus_UrQMD_driver
+driver_dict = {
+    'results_compression': "gzip",  # compression filter for the final
+                                    # results in hdf5: gzip, lzf, or none
+    'results_compression_level': 4, # gzip compression level (1-9)
+    'results_shuffle': 0,           # 1: apply the shuffle filter before
+                                    #    compression
+    'split_particle_list': 0,       # 1: split the UrQMD particle list by
+                                    #    particle species in one pass before
+                                    #    the spvn analysis
+    'hydro_abort_pattern': r"\bnan\b|unstable|instabilit",
+                                    # kill MUSIC if a line of its log matches
+                                    # this regular expression ("": never)
+    'hydro_stall_timeout': 1800,    # kill MUSIC if its log does not grow
+                                    # for this many seconds (0: never)
+    'surface_staging_folder': "",   # node-local folder with one copy of the
+                                    # hydro surface for all the oversampled
+                                    # events, e.g. /dev/shm ("": read it
+                                    # from the results)
+    'scratch_folder': "",           # node-local folder to run the events in,
+                                    # e.g. $TMPDIR; the results are copied
+                                    # back in the background ("": run in
+                                    # the event folder)
+    'afterburner': "urqmd",         # urqmd: run_afterburner.sh runs one
+                                    #    oversampled event per stage; smash:
+                                    #    the SMASH stages of all the
+                                    #    oversampled events share one core
+                                    #    budget
+}
+
+
 Parameters_list = [
     (mcglauber_dict, "input", 0),
     (music_dict, "music_input_mode_2", 2),
     (iss_dict, "iSS_parameters.dat", 1),
-    (hadronic_afterburner_toolkit_dict, "parameters.dat", 1)
+    (hadronic_afterburner_toolkit_dict, "parameters.dat", 1),
+    (driver_dict, "driver_parameters.dat", 1)
 ]
 
 path_list = [
     '../codes/3dMCGlauber/',
     '../codes/MUSIC/',
     '../codes/iSS/',
-    '../codes/hadronic_afterburner_toolkit/'
+    '../codes/hadronic_afterburner_toolkit/',
+    '../codes/'
 ]
 
 
@@ -383,6 +416,8 @@ def update_parameters_dict(par_dict_name):
     iss_dict.update(parameters_dict.iss_dict)
     hadronic_afterburner_toolkit_dict.update(
         parameters_dict.hadronic_afterburner_toolkit_dict)
+    if hasattr(parameters_dict, 'driver_dict'):
+        driver_dict.update(parameters_dict.driver_dict)
 
 
 def update_parameters_bayesian(bayes_file):
@@ -395,11 +430,120 @@ def update_parameters_bayesian(bayes_file):
             music_dict[key] = float(val)
 
 
-def output_parameters_to_files():
-    """This function outputs parameters in dictionaries to files"""
+def read_design_matrix(design_file):
+    """
+        This function reads the design points from design_file. The first
+        line has the parameter names, every following line the parameter
+        values of one design point.
+    """
+    design_points = []
+    with open(design_file, "r") as parfile:
+        parameter_names = parfile.readline().strip("#").split()
+        for line in parfile:
+            if line.strip() == "" or line.startswith("#"):
+                continue
+            design_points.append(dict(zip(parameter_names, line.split())))
+    return design_points
+
+
+def convert_design_value(key, val, default_value):
+    """
+        This function converts the design value val of the parameter key to
+        the type of its default value. Integer parameters only take
+        integral values and boolean parameters only True/False or 1/0.
+    """
+    if isinstance(default_value, bool):
+        if val.lower() in ("true", "1"):
+            return True
+        if val.lower() in ("false", "0"):
+            return False
+        raise ValueError("{0} = {1} is not a boolean value".format(key, val))
+    if isinstance(default_value, int):
+        try:
+            value = float(val)
+        except ValueError:
+            value = float("nan")
+        if not value.is_integer():
+            raise ValueError("{0} = {1} is not an integer value".format(
+                key, val))
+        return int(value)
+    if isinstance(default_value, float):
+        return float(val)
+    return val
+
+
+def update_parameters_design_point(design_point):
+    """
+        This function sets the parameters of one design point. The values
+        keep the type of the default values.
+    """
+    for key, val in design_point.items():
+        key_found = False
+        for parameters_dict, _, _ in Parameters_list:
+            if key in parameters_dict:
+                parameters_dict[key] = convert_design_value(
+                    key, val, parameters_dict[key])
+                key_found = True
+        if not key_found:
+            print("\U000026A0  Warning: unknown parameter {}".format(key))
+
+
+def output_design_points(par_dict_name, design_file, output_folder):
+    """
+        This function writes the parameter files of all the design points
+        in design_file. The files of the design point i are written to
+        output_folder/design_point_i/parameters with the layout of codes/.
+        It returns the list of the design point folders and the MUSIC
+        parameters of each design point.
+        All the design points are checked before any file is written.
+    """
+    update_parameters_dict(par_dict_name)
+    default_dicts = [copy.deepcopy(parameters_dict)
+                     for parameters_dict, _, _ in Parameters_list]
+    design_dicts = []
+    for design_point in read_design_matrix(design_file):
+        for (parameters_dict, _, _), default_dict in zip(Parameters_list,
+                                                          default_dicts):
+            parameters_dict.clear()
+            parameters_dict.update(copy.deepcopy(default_dict))
+        update_parameters_design_point(design_point)
+        design_dicts.append((design_point, [
+            copy.deepcopy(parameters_dict)
+            for parameters_dict, _, _ in Parameters_list]))
+    design_folders = []
+    for ipoint, (design_point, point_dicts) in enumerate(design_dicts):
+        for (parameters_dict, _, _), point_dict in zip(Parameters_list,
+                                                        point_dicts):
+            parameters_dict.clear()
+            parameters_dict.update(point_dict)
+        design_folder = path.join(output_folder,
+                                  "design_point_{0:d}".format(ipoint))
+        output_path_list = [
+            path.join(design_folder, "parameters",
+                      path.relpath(ipath, '../codes'))
+            for ipath in path_list]
+        for ipath in output_path_list:
+            makedirs(ipath, exist_ok=True)
+        output_parameters_to_files(output_path_list)
+        with open(path.join(design_folder, "design_point.dat"), "w") as f:
+            for key, val in design_point.items():
+                f.write("{0}  {1}\n".format(key, val))
+        design_folders.append((design_folder, copy.deepcopy(music_dict)))
+    return design_folders
+
+
+def output_parameters_to_files(output_path_list=None):
+    """
+        This function outputs parameters in dictionaries to files
+
+        The files are written to path_list, or to output_path_list if it
+        is given.
+    """
+    if output_path_list is None:
+        output_path_list = path_list
     print("\U0001F375  Output input parameter files ...")
     for idict, (parameters_dict, fname, itype) in enumerate(Parameters_list):
-        f = open(fname, "w")
+        f = open(path.join(output_path_list[idict], fname), "w")
         for key_name in parameters_dict:
             if itype in (0, 2):
                 f.write("{parameter_name}  {parameter_value}\n".format(
@@ -412,8 +556,6 @@ def output_parameters_to_files():
         if itype == 2:
             f.write("EndOfData")
         f.close()
-        shutil.move(path.join(path.abspath('.'), fname),
-                    path.join(path.abspath(path_list[idict]), fname))
 
 
 if __name__ == "__main__":
@@ -426,7 +568,18 @@ if __name__ == "__main__":
     parser.add_argument('-b', '--bayes_file', metavar='',
                         type=str, default='',
                         help='parameters from bayesian analysis')
+    parser.add_argument('-d', '--design_file', metavar='',
+                        type=str, default='',
+                        help=('table of design points, the parameter files '
+                              + 'of all points are written to output_folder'))
+    parser.add_argument('-o', '--output_folder', metavar='',
+                        type=str, default='design_points',
+                        help='output folder for the design points')
     args = parser.parse_args()
+    if args.design_file != "":
+        output_design_points(args.par_dict, args.design_file,
+                             args.output_folder)
+        exit(0)
     update_parameters_dict(args.par_dict)
     if args.bayes_file != "":
         update_parameters_bayesian(args.bayes_file)
@@ -2,7 +2,9 @@
 """This script generate all the running jobs."""
 
 import sys
-from os import path, mkdir
+import time
+from os import path, mkdir, symlink, link, readlink, walk, scandir, remove
+from multiprocessing.pool import ThreadPool
 import shutil
 import subprocess
 import argparse
@@ -15,6 +17,17 @@ centrality_list = [
     (0.8, 0.9, '80-90'), (0.9, 1.0, '90-100')
 ]
 
+# code packages which are copied or linked into every event folder
+CODE_PACKAGES = ['MUSIC', 'iSS', 'osc2u', 'urqmd',
+                 'hadronic_afterburner_toolkit', '3dMCGlauber']
+TEMPLATE_MODES = ['copy', 'hardlink']
+# parameter files written by config/parameters_dict_master.py, they are
+# always copied, so that they can be changed for single events
+TEMPLATE_PARAMETER_FILES = ['input', 'music_input_mode_2',
+                            'iSS_parameters.dat', 'parameters.dat']
+# walltime of the jobs without a cost model
+DEFAULT_WALLTIME = '100:00:00'
+
 def write_script_header(cluster, script, n_threads,
                         event_id, walltime, working_folder):
     """This function write the header of the job submission script"""
@@ -106,15 +119,10 @@ def generate_nersc_mpi_job_script(folder_name, n_nodes, n_threads,
 export OMP_PROC_BIND=true
 export OMP_PLACES=threads
 
-num_of_nodes={0:d}
-# run all the job
-for (( nodeid=1; nodeid <= $num_of_nodes; nodeid++ ))
-do
-    export OMP_NUM_THREADS={2:d}
-    srun -N 1 -n {3:d} -c {2:d} python job_MPI_wrapper.py {3:d} $nodeid &
-done
-wait
-""".format(n_nodes, walltime, n_threads, n_jobs_per_node))
+# rank 0 hands out the event folders to the other ranks
+export OMP_NUM_THREADS={2:d}
+srun -N {0:d} -n {3:d} -c {2:d} --overcommit python job_MPI_wrapper.py {1:s}
+""".format(n_nodes, walltime, n_threads, n_nodes*n_jobs_per_node + 1))
     script.close()
 
 
@@ -140,33 +148,28 @@ def generate_nerscKNL_mpi_job_script(folder_name, n_nodes, n_threads,
 export OMP_PROC_BIND=true
 export OMP_PLACES=cores
 
-num_of_nodes={0:d}
-# run all the job
-for (( nodeid=1; nodeid <= $num_of_nodes; nodeid++ ))
-do
-    export OMP_NUM_THREADS={2:d}
-    srun -N 1 -n {3:d} -c {2:d} python job_MPI_wrapper.py {3:d} $nodeid &
-done
-wait
-""".format(n_nodes, walltime, n_threads, n_jobs_per_node))
+# rank 0 hands out the event folders to the other ranks
+export OMP_NUM_THREADS={2:d}
+srun -N {0:d} -n {3:d} -c {2:d} --overcommit python job_MPI_wrapper.py {1:s}
+""".format(n_nodes, walltime, n_threads, n_nodes*n_jobs_per_node + 1))
     script.close()
 
 
 def generate_full_job_script(cluster_name, folder_name, database, initial_type,
-                             n_hydro, ev0_id, n_urqmd, n_threads, time_stamp):
+                             n_hydro, ev0_id, n_urqmd, n_threads, time_stamp,
+                             n_threads_hydro=0, walltime=DEFAULT_WALLTIME):
     """This function generates full job script"""
     working_folder = folder_name
     event_id = working_folder.split('/')[-1]
-    walltime = '100:00:00'
 
     script = open(path.join(working_folder, "submit_job.pbs"), "w")
     write_script_header(cluster_name, script, n_threads, event_id, walltime,
                         working_folder)
     script.write(
         """
-./hydro_plus_UrQMD_driver.py {0:s} {1:s} {2:d} {3:d} {4:d} {5:d} {6:s} > run.log
+./hydro_plus_UrQMD_driver.py {0:s} {1:s} {2:d} {3:d} {4:d} {5:d} {6:s} {7:d} > run.log
 """.format(initial_type, database, n_hydro, ev0_id, n_urqmd, n_threads,
-           time_stamp))
+           time_stamp, n_threads_hydro))
     script.close()
 
 
@@ -190,7 +193,7 @@ cd MUSIC
     if nthreads > 0:
         script.write(
             """
-export OMP_NUM_THREADS={0:d}
+export OMP_NUM_THREADS=${{1:-{0:d}}}
 """.format(nthreads))
 
     script.write(
@@ -204,89 +207,259 @@ export OMP_NUM_THREADS={0:d}
 
 
 def generate_script_afterburner(folder_name):
-    """This function generates script for hadronic afterburner"""
+    """
+        This function generates script for hadronic afterburner
+
+        The script runs one stage of one oversampled event, the driver
+        runs the stages of all the oversampled events with one core budget.
+        UrQMD runs an oversampled event in one stage, SMASH in the sample
+        and smash stages, and the analysis of all the SMASH events of a
+        hydro event runs in the analyze stage.
+    """
     working_folder = folder_name
 
     script = open(path.join(working_folder, "run_afterburner.sh"), "w")
     script.write(
         """#!/usr/bin/env bash
+# usage: ./run_afterburner.sh urqmd oversample_id
+#        ./run_afterburner.sh sample|smash oversample_id [shift_id]
+#        ./run_afterburner.sh analyze smash_results_folder output_folder
 SMASH_ROOT=~/smash-devel/
 UTILITIES=~/iEBE-MUSIC/utilities
-ISS_ROOT=./SMASH_0/iSS
-
-mv UrQMDev_0 SMASH_0
-# provide SMASH particle table to iSS
-${SMASH_ROOT}/build/smash -x -i ${UTILITIES}/config.yaml > ${ISS_ROOT}/iSS_tables/pdg.dat
-python ${UTILITIES}/prepare_SMASH_particles_for_iSS.py -i ${ISS_ROOT}/iSS_tables/
-
-cd ${ISS_ROOT}
-mkdir -p results
-cp ../hydro_event/surface*.dat results/surface.dat
-cp ../hydro_event/music_input results/music_input
-./iSS.e
-mkdir -p SMASH_input && rm -rf SMASH_input/*
-mkdir -p SMASH_results && rm -r SMASH_results/*
-python ${UTILITIES}/convert_iSS_output_to_SMASH_input.py -i OSCAR.DAT -o SMASH_input/
-npr=`nproc`
-for (( i=1; i<=$npr; i++ ))
-do
-    mkdir -p SMASH_results/${i}
-    ${SMASH_ROOT}/build/smash -i ${UTILITIES}/config.yaml \
-    	                  -o SMASH_results/${i} \
-    	                  -c "Modi: {List: {File_Directory: SMASH_input/}}" \
-    	                  -c "Modi: {List: {File_Prefix: sampled_particles}}" \
-    		          -c "Modi: {List: {Shift_Id: ${i}}}" > SMASH_results/${i}/out.txt &
-done
-wait
-python ~/smash-analysis/test/energy_scan/mult_and_spectra.py \
-    --input_files SMASH_results/*/particles_binary.bin \
-    --output_files yspectra.txt mtspectra.txt ptspectra.txt v2.txt meanmt0_midrapidity.txt meanpt_midrapidity.txt midrapidity_yield.txt total_multiplicity.txt
-)
+ISS_ROOT=./UrQMDev_$2/iSS
+
+case $1 in
+urqmd)
+    cd UrQMDev_$2
+    mkdir -p UrQMD_results
+    rm -fr UrQMD_results/*
+    cd iSS
+    mkdir -p results
+    # link the surface, it is read-only and shared by the oversampled events
+    ln -sf ../../hydro_event/surface.dat results/surface.dat
+    cp ../hydro_event/music_input results/music_input
+    ./iSS.e >> ../afterburner_log.txt
+    cd ../osc2u
+    ./osc2u.e < ../iSS/OSCAR.DAT >> ../afterburner_log.txt
+    rm -f ../iSS/OSCAR.DAT
+    mv fort.14 ../urqmd/OSCAR.input
+    cd ../urqmd
+    bash ./runqmd.sh >> ../afterburner_log.txt
+    rm -f OSCAR.input
+    mv particle_list.dat ../UrQMD_results/particle_list.dat
+    cd ..
+    ../hadronic_afterburner_toolkit/convert_to_binary.e UrQMD_results/particle_list.dat
+    rm -f UrQMD_results/particle_list.dat
+    ;;
+sample)
+    cd ${ISS_ROOT}
+    # provide SMASH particle table to iSS, it is generated once for every
+    # SMASH build and config
+    python ${UTILITIES}/cache_SMASH_particle_tables.py -s ${SMASH_ROOT}/build/smash -c ${UTILITIES}/config.yaml -i iSS_tables/
+
+    mkdir -p results
+    # link the surface, it is read-only and shared by the oversampled events
+    ln -sf ../../hydro_event/surface.dat results/surface.dat
+    cp ../hydro_event/music_input results/music_input
+    ./iSS.e
+    rm -rf SMASH_input SMASH_results
+    mkdir -p SMASH_input SMASH_results
+    python ${UTILITIES}/convert_iSS_output_to_SMASH_input.py -i OSCAR.DAT -o SMASH_input/ -t iSS_tables/pdg.dat
+    ;;
+smash)
+    cd ${ISS_ROOT}
+    # one SMASH instance for the input file sampled_particles$3
+    mkdir -p SMASH_results/$3
+    ${SMASH_ROOT}/build/smash -i ${UTILITIES}/config.yaml \\
+                              -o SMASH_results/$3 \\
+                              -c "Modi: {List: {File_Directory: SMASH_input/}}" \\
+                              -c "Modi: {List: {File_Prefix: sampled_particles}}" \\
+                              -c "Modi: {List: {Shift_Id: $3}}" > SMASH_results/$3/out.txt
+    ;;
+analyze)
+    # analyze the SMASH events of all the oversampled events together
+    cd $3
+    python ~/smash-analysis/test/energy_scan/mult_and_spectra.py \\
+        --input_files $2/*/*/particles_binary.bin \\
+        --output_files yspectra.txt mtspectra.txt ptspectra.txt v2.txt meanmt0_midrapidity.txt meanpt_midrapidity.txt midrapidity_yield.txt total_multiplicity.txt
+    ;;
+*)
+    echo "unknown afterburner stage: $1"
+    exit 1
+    ;;
+esac
 """)
     script.close()
 
 
-def generate_script_analyze_spvn(folder_name):
-    """This function generates script for analysis"""
-    working_folder = folder_name
+def stage_code_templates(working_folder, template_mode):
+    """
+        This function copies the code packages once into the working folder
+        as the templates of all event folders and returns the template
+        folder. In the copy mode, the event folders are copied from codes/
+        directly.
+    """
+    if template_mode == "copy":
+        return 'codes'
+    template_folder = path.join(working_folder, 'code_templates')
+    mkdir(template_folder)
+    for package in CODE_PACKAGES:
+        if path.isdir(path.join('codes', package)):
+            shutil.copytree(path.join('codes', package),
+                            path.join(template_folder, package),
+                            symlinks=True)
+    return template_folder
+
+
+def instantiate_template(template, target, template_mode, symlinks=False):
+    """
+        This function creates the folder target from the folder template.
+
+        copy: copy the whole folder
+        hardlink: create all the sub-folders, copy the parameter files and
+                  hard link all the other files to template. The hard links
+                  share the inodes of the template, so that the event
+                  folders need far fewer inodes on the parallel filesystem.
+    """
+    if template_mode == "copy":
+        shutil.copytree(template, target, symlinks=symlinks)
+        return
+    for root, folders, files in walk(template):
+        target_root = path.normpath(
+            path.join(target, path.relpath(root, template)))
+        mkdir(target_root)
+        for folder_name in list(folders):
+            if path.islink(path.join(root, folder_name)):
+                # keep symbolic links to folders, as copytree
+                folders.remove(folder_name)
+                files.append(folder_name)
+        for file_name in files:
+            source_file = path.join(root, file_name)
+            target_file = path.join(target_root, file_name)
+            if path.islink(source_file):
+                symlink(readlink(source_file), target_file)
+            elif file_name in TEMPLATE_PARAMETER_FILES:
+                shutil.copy2(source_file, target_file)
+            else:
+                link(source_file, target_file)
+
+
+def read_cost_model(cost_file):
+    """
+        This function reads the measured wall time per hydro event of every
+        centrality class, written by utilities/summarize_event_profiles.py
+        with -c. Every line holds a centrality label and the time in s.
+    """
+    cost_model = {}
+    with open(cost_file, "r") as f:
+        for line in f:
+            line = line.split("#")[0].split()
+            if len(line) == 2:
+                cost_model[line[0]] = float(line[1])
+    if not cost_model:
+        print("\U0001F6AB  No centrality class in {}".format(cost_file))
+        exit(1)
+    return cost_model
 
-    script = open(path.join(working_folder, "run_analysis_spvn.sh"), "w")
-    script.write(
-        """#!/usr/bin/env bash
 
-pid=$1
+def format_walltime(seconds):
+    """This function formats a time in seconds as HH:MM:SS"""
+    seconds = int(seconds + 0.5)
+    return "{0:02d}:{1:02d}:{2:02d}".format(
+        seconds//3600, (seconds//60) % 60, seconds % 60)
 
-(
-    cd hadronic_afterburner_toolkit
-    if [ "$pid" == "9999" ]; then
-        # charged hadrons
-        ./hadronic_afterburner_tools.e run_mode=0 read_in_mode=2 particle_monval=$pid resonance_feed_down_flag=0 distinguish_isospin=0 rap_type=0 rap_min=-0.5 rap_max=0.5 compute_correlation=0 flag_charge_dependence=0
-        ./hadronic_afterburner_tools.e run_mode=0 read_in_mode=2 particle_monval=$pid resonance_feed_down_flag=0 distinguish_isospin=0 rap_type=0 rap_min=-1.0 rap_max=-0.1 compute_correlation=0 flag_charge_dependence=0
-        ./hadronic_afterburner_tools.e run_mode=0 read_in_mode=2 particle_monval=$pid resonance_feed_down_flag=0 distinguish_isospin=0 rap_type=0 rap_min=0.1 rap_max=1.0 compute_correlation=0 flag_charge_dependence=0
-        ./hadronic_afterburner_tools.e run_mode=0 read_in_mode=2 particle_monval=$pid resonance_feed_down_flag=0 distinguish_isospin=0 rap_type=0 rap_min=0.5 rap_max=2.0 compute_correlation=0 flag_charge_dependence=0
-        ./hadronic_afterburner_tools.e run_mode=0 read_in_mode=2 particle_monval=$pid resonance_feed_down_flag=0 distinguish_isospin=0 rap_type=0 rap_min=-2.0 rap_max=-0.5 compute_correlation=0 flag_charge_dependence=0
-        ./hadronic_afterburner_tools.e run_mode=0 read_in_mode=2 particle_monval=$pid resonance_feed_down_flag=0 distinguish_isospin=0 rap_type=0 rap_min=-1.0 rap_max=1.0 compute_correlation=1 flag_charge_dependence=1 pT_min=0.2 pT_max=2.0
-        ./hadronic_afterburner_tools.e run_mode=0 read_in_mode=2 particle_monval=$pid resonance_feed_down_flag=0 distinguish_isospin=0 rap_type=0 rap_min=-2.0 rap_max=2.0 compute_correlation=1 flag_charge_dependence=1 pT_min=0.2 pT_max=2.0
-        ./hadronic_afterburner_tools.e run_mode=0 read_in_mode=2 particle_monval=$pid resonance_feed_down_flag=0 distinguish_isospin=0 rap_type=0 rap_min=-1.0 rap_max=1.0 compute_correlation=0 flag_charge_dependence=0
-        ./hadronic_afterburner_tools.e run_mode=0 read_in_mode=2 particle_monval=$pid resonance_feed_down_flag=0 distinguish_isospin=0 rap_type=0 rap_min=-2.0 rap_max=2.0 compute_correlation=0 flag_charge_dependence=0
-    else
-        #./hadronic_afterburner_tools.e run_mode=0 read_in_mode=2 particle_monval=$pid resonance_feed_down_flag=0 distinguish_isospin=1 rap_type=0 rap_min=-0.5 rap_max=0.5 compute_correlation=0 flag_charge_dependence=0
-        ./hadronic_afterburner_tools.e run_mode=0 read_in_mode=2 particle_monval=$pid resonance_feed_down_flag=0 distinguish_isospin=1 rap_type=1 rap_min=-0.5 rap_max=0.5 compute_correlation=0 flag_charge_dependence=0
-    fi
-)
-""")
-    script.close()
+
+def get_centrality_classes(n_jobs):
+    """
+        This function returns the centrality classes of the minimum bias
+        jobs with the number of jobs in every class
+    """
+    centrality_classes = []
+    for iev in range(n_jobs):
+        precent_local = float(iev)/float(n_jobs)
+        for cen_min, cen_max, cen_label in centrality_list:
+            if precent_local >= cen_min and precent_local < cen_max:
+                if centrality_classes and centrality_classes[-1][0] == cen_label:
+                    centrality_classes[-1][1] += 1
+                else:
+                    centrality_classes.append([cen_label, 1])
+                break
+    return centrality_classes
+
+
+def pack_hydro_events(n_events, event_time, job_time, walltime_factor):
+    """
+        This function packs n_events hydro events of one centrality class
+        into jobs of about job_time seconds. It returns the list of the
+        number of events and the walltime of every job.
+    """
+    n_hydro_max = max(1, int(job_time/event_time))
+    n_jobs = (n_events + n_hydro_max - 1)//n_hydro_max
+    # spread the events evenly over the jobs
+    n_hydro_list = [n_events//n_jobs + int(ijob < n_events % n_jobs)
+                    for ijob in range(n_jobs)]
+    return [(n_hydro, format_walltime(n_hydro*event_time*walltime_factor))
+            for n_hydro in n_hydro_list]
+
+
+def copy_parameter_files(parameter_folder, target):
+    """
+        This function replaces the parameter files in target by the ones
+        in parameter_folder
+    """
+    for file_name in TEMPLATE_PARAMETER_FILES:
+        parameter_file = path.join(parameter_folder, file_name)
+        if path.isfile(parameter_file):
+            target_file = path.join(target, file_name)
+            if path.lexists(target_file):
+                remove(target_file)
+            shutil.copy2(parameter_file, target_file)
+
+
+def count_inodes(folder):
+    """
+        This function counts the inodes of the files, links and folders in
+        folder. Hard links to the same file are counted once.
+    """
+    inodes = set()
+    folder_list = [folder]
+    while folder_list:
+        with scandir(folder_list.pop()) as entries:
+            for entry in entries:
+                inodes.add(entry.inode())
+                if entry.is_dir(follow_symlinks=False):
+                    folder_list.append(entry.path)
+    return len(inodes)
 
 
 def generate_event_folders(initial_condition_database,
                            initial_condition_type, working_folder,
                            cluster_name, event_id, event_id_offset,
                            n_hydro_per_job, n_urqmd_per_hydro, n_threads,
-                           time_stamp):
-    """This function creates the event folder structure"""
+                           time_stamp, n_threads_hydro=0,
+                           template_folder='codes', template_mode='copy',
+                           parameter_folder='codes',
+                           walltime=DEFAULT_WALLTIME):
+    """
+        This function creates the event folder structure
+
+        The code packages are created from template_folder, see
+        instantiate_template for the template modes. The parameter files
+        are taken from parameter_folder, which has the layout of codes/.
+    """
+    def create_package(package, target, symlinks=False):
+        instantiate_template(path.join(template_folder, package), target,
+                             template_mode, symlinks)
+        if parameter_folder != 'codes':
+            copy_parameter_files(path.join(parameter_folder, package), target)
+
     event_folder = path.join(working_folder, 'event_%d' % event_id)
     mkdir(event_folder)
     shutil.copy('codes/hydro_plus_UrQMD_driver.py', event_folder)
+    shutil.copy(path.join(parameter_folder, 'driver_parameters.dat'),
+                event_folder)
+    shutil.copy('codes/split_particle_list.py', event_folder)
+    shutil.copy('codes/event_profiler.py', event_folder)
     shutil.copy(path.join('IPGlasma_database',
                           'fetch_IPGlasma_event_from_hdf5_database.py'),
                 event_folder)
@@ -294,63 +467,49 @@ def generate_event_folders(initial_condition_database,
                           'fetch_3DMCGlauber_event_from_hdf5_database.py'),
                 event_folder)
     if initial_condition_database == "self":
-        shutil.copytree('codes/3dMCGlauber',
-                        path.join(event_folder, '3dMCGlauber'), symlinks=True)
-        subprocess.call("ln -s {0:s} {1:s}".format(
-                        path.abspath('codes/3dMCGlauber_code/3dMCGlb.e'),
-                        path.join(event_folder, "3dMCGlauber/3dMCGlb.e")),
-                        shell=True)
-        subprocess.call("ln -s {0:s} {1:s}".format(
-                        path.abspath('codes/3dMCGlauber_code/eps09'),
-                        path.join(event_folder, "3dMCGlauber/eps09")),
-                        shell=True)
+        create_package('3dMCGlauber', path.join(event_folder, '3dMCGlauber'),
+                       symlinks=True)
+        symlink(path.abspath('codes/3dMCGlauber_code/3dMCGlb.e'),
+                path.join(event_folder, "3dMCGlauber/3dMCGlb.e"))
+        symlink(path.abspath('codes/3dMCGlauber_code/eps09'),
+                path.join(event_folder, "3dMCGlauber/eps09"))
 
     generate_full_job_script(cluster_name, event_folder,
                              initial_condition_database,
                              initial_condition_type, n_hydro_per_job,
                              event_id_offset, n_urqmd_per_hydro,
-                             n_threads, time_stamp)
+                             n_threads, time_stamp, n_threads_hydro, walltime)
 
     generate_script_hydro(event_folder, n_threads)
 
-    shutil.copytree('codes/MUSIC', path.join(event_folder, 'MUSIC'),
-                    symlinks=True)
-    subprocess.call("ln -s {0:s} {1:s}".format(
-        path.abspath('codes/MUSIC_code/EOS'),
-        path.join(event_folder, "MUSIC/EOS")), shell=True)
-    subprocess.call("ln -s {0:s} {1:s}".format(
-        path.abspath('codes/MUSIC_code/MUSIChydro'),
-        path.join(event_folder, "MUSIC/MUSIChydro")), shell=True)
+    create_package('MUSIC', path.join(event_folder, 'MUSIC'), symlinks=True)
+    symlink(path.abspath('codes/MUSIC_code/EOS'),
+            path.join(event_folder, "MUSIC/EOS"))
+    symlink(path.abspath('codes/MUSIC_code/MUSIChydro'),
+            path.join(event_folder, "MUSIC/MUSIChydro"))
     generate_script_afterburner(event_folder)
-    generate_script_analyze_spvn(event_folder)
     for iev in range(n_urqmd_per_hydro):
         sub_event_folder = path.join(working_folder,
                                      'event_{0:d}'.format(event_id),
                                      'UrQMDev_{0:d}'.format(iev))
         mkdir(sub_event_folder)
-        shutil.copytree('codes/iSS', path.join(sub_event_folder, 'iSS'))
-        subprocess.call("ln -s {0:s} {1:s}".format(
-            path.abspath('codes/iSS_code/iSS_tables'),
-            path.join(sub_event_folder, "iSS/iSS_tables")), shell=True)
-        subprocess.call("ln -s {0:s} {1:s}".format(
-            path.abspath('codes/iSS_code/iSS.e'),
-            path.join(sub_event_folder, "iSS/iSS.e")), shell=True)
-        shutil.copytree('codes/osc2u', path.join(sub_event_folder, 'osc2u'))
-        shutil.copytree('codes/urqmd', path.join(sub_event_folder, 'urqmd'))
-        subprocess.call("ln -s {0:s} {1:s}".format(
-            path.abspath('codes/urqmd_code/urqmd/urqmd.e'),
-            path.join(sub_event_folder, "urqmd/urqmd.e")), shell=True)
-    shutil.copytree('codes/hadronic_afterburner_toolkit',
-                    path.join(event_folder, 'hadronic_afterburner_toolkit'))
-    subprocess.call("ln -s {0:s} {1:s}".format(
-        path.abspath(path.join('codes', 'hadronic_afterburner_toolkit_code',
-                               'hadronic_afterburner_tools.e')),
-        path.join(event_folder, "hadronic_afterburner_toolkit",
-                  "hadronic_afterburner_tools.e")), shell=True)
-    subprocess.call("ln -s {0:s} {1:s}".format(
-        path.abspath('codes/hadronic_afterburner_toolkit_code/EOS'),
-        path.join(event_folder, "hadronic_afterburner_toolkit/EOS")),
-                    shell=True)
+        create_package('iSS', path.join(sub_event_folder, 'iSS'))
+        symlink(path.abspath('codes/iSS_code/iSS_tables'),
+                path.join(sub_event_folder, "iSS/iSS_tables"))
+        symlink(path.abspath('codes/iSS_code/iSS.e'),
+                path.join(sub_event_folder, "iSS/iSS.e"))
+        create_package('osc2u', path.join(sub_event_folder, 'osc2u'))
+        create_package('urqmd', path.join(sub_event_folder, 'urqmd'))
+        symlink(path.abspath('codes/urqmd_code/urqmd/urqmd.e'),
+                path.join(sub_event_folder, "urqmd/urqmd.e"))
+    create_package('hadronic_afterburner_toolkit',
+                   path.join(event_folder, 'hadronic_afterburner_toolkit'))
+    symlink(path.abspath(path.join('codes', 'hadronic_afterburner_toolkit_code',
+                                   'hadronic_afterburner_tools.e')),
+            path.join(event_folder, "hadronic_afterburner_toolkit",
+                      "hadronic_afterburner_tools.e"))
+    symlink(path.abspath('codes/hadronic_afterburner_toolkit_code/EOS'),
+            path.join(event_folder, "hadronic_afterburner_toolkit/EOS"))
 
 
 def main():
@@ -377,12 +536,42 @@ def main():
     parser.add_argument('-n_th', '--n_threads', metavar='',
                         type=int, default=1,
                         help='number of threads used for each job')
+    parser.add_argument('-n_th_hydro', '--n_threads_hydro', metavar='',
+                        type=int, default=0,
+                        help=('number of threads for hydro when hydro and '
+                              + 'afterburner of consecutive events overlap '
+                              + '(0: run the events sequentially)'))
+    parser.add_argument('-tm', '--template_mode', metavar='', type=str,
+                        choices=TEMPLATE_MODES, default='copy',
+                        help=('copy: copy the code packages into every event '
+                              + 'folder, hardlink: hard link the files to one '
+                              + 'template in the working folder and only copy '
+                              + 'the parameter files, which saves the inodes '
+                              + 'on the parallel filesystem'))
+    parser.add_argument('-n_th_gen', '--n_threads_generate', metavar='',
+                        type=int, default=4,
+                        help='number of threads to create the event folders')
+    parser.add_argument('-cost', '--cost_model', metavar='',
+                        type=str, default='',
+                        help=('measured wall time per hydro event of every '
+                              + 'centrality class, the minimum bias events '
+                              + 'are repacked into jobs of about job_time'))
+    parser.add_argument('-job_time', '--job_time', metavar='',
+                        type=float, default=0.,
+                        help=('target run time of a job with the cost model '
+                              + '[h] (0: n_hydro_per_job events of the most '
+                              + 'expensive class)'))
     parser.add_argument('-par', '--par_dict', metavar='',
                         type=str, default='parameters_dict_user.py',
                         help='user-defined parameter dictionary file')
     parser.add_argument('-b', '--bayes_file', metavar='',
                         type=str, default='',
                         help='parameters from bayesian analysis')
+    parser.add_argument('-d', '--design_file', metavar='',
+                        type=str, default='',
+                        help=('table of design points (first line: parameter '
+                              + 'names), n_jobs jobs are generated for every '
+                              + 'design point'))
     args = parser.parse_args()
     # print out all the arguments
     print("="*40)
@@ -399,6 +588,9 @@ def main():
         n_hydro_per_job = args.n_hydro_per_job
         n_urqmd_per_hydro = args.n_urqmd_per_hydro
         n_threads = args.n_threads
+        n_threads_hydro = args.n_threads_hydro
+        template_mode = args.template_mode
+        n_threads_generate = args.n_threads_generate
     except:
         parser.print_help()
         exit(0)
@@ -410,6 +602,13 @@ def main():
         print("reset n_threads to {}".format(n_urqmd_per_hydro))
         n_threads = n_urqmd_per_hydro
 
+    if n_threads_hydro >= n_threads:
+        print("\U000026A0  "
+              + "Warning: n_threads_hydro = {} >= n_threads = {}!".format(
+                  n_threads_hydro, n_threads))
+        print("reset n_threads_hydro to 0 (no pipelining)")
+        n_threads_hydro = 0
+
     parameter_dict = __import__(args.par_dict.split('.')[0])
     initial_condition_type = (
                     parameter_dict.initial_dict['initial_state_type'])
@@ -431,7 +630,15 @@ def main():
         initial_condition_database = (
                 parameter_dict.mcglauber_dict['database_name'])
 
-    if args.bayes_file != "":
+    if args.bayes_file != "" and args.design_file != "":
+        print("\U0001F6AB  -b and -d can not be used together")
+        exit(1)
+
+    if args.design_file != "":
+        # the parameter files of the design points are written in this
+        # process after the working folder is created
+        args.design_file = path.abspath(args.design_file)
+    elif args.bayes_file != "":
         args.bayes_file = path.join(path.abspath("."), args.bayes_file)
         subprocess.call(
             "(cd config; python3 parameters_dict_master.py -par {} -b {};)".format(
@@ -442,7 +649,6 @@ def main():
                 args.par_dict.split(".")[0]), shell=True)
 
     cent_label = "XXX"
-    cent_label_pre = cent_label
     if initial_condition_database == "self":
         print("\U0001F375  Generate initial condition on the fly ... ")
     else:
@@ -454,58 +660,126 @@ def main():
     mkdir(working_folder_name)
     shutil.copy(args.par_dict, working_folder_name)
 
+    time_start = time.time()
+    if args.design_file != "":
+        # write the parameter files of all the design points in this process
+        sys.path.insert(0, path.abspath('config'))
+        import parameters_dict_master
+        try:
+            design_folders = parameters_dict_master.output_design_points(
+                args.par_dict.split(".")[0], args.design_file,
+                working_folder_name)
+        except ValueError as error:
+            print("\U0001F6AB  Invalid design point: {}".format(error))
+            shutil.rmtree(working_folder_name)
+            exit(1)
+        # the IP-Glasma snapshot is fetched at the tau_0 of every design point
+        job_folders = []
+        for design_folder, music_parameters in design_folders:
+            time_stamp = IPGlasma_time_stamp
+            if initial_condition_type == "IPGlasma":
+                time_stamp = str(music_parameters['Initial_time_tau_0'])
+            job_folders.append((design_folder,
+                                path.join(design_folder, 'parameters'),
+                                time_stamp))
+        print("\U0001F375  {0:d} design points from {1:s}".format(
+            len(job_folders), args.design_file))
+    else:
+        job_folders = [(working_folder_name, 'codes', IPGlasma_time_stamp)]
+    template_folder = stage_code_templates(working_folder_name,
+                                           template_mode)
+    minimum_bias = (initial_condition_type == 'IPGlasma'
+                    and parameter_dict.ipglasma['type'] == 'minimumbias')
+    if minimum_bias:
+        centrality_classes = get_centrality_classes(n_jobs)
+    else:
+        centrality_classes = [(cent_label, n_jobs)]
+    job_plan = []
+    if args.cost_model != "" and minimum_bias:
+        cost_model = read_cost_model(args.cost_model)
+        job_time = args.job_time*3600.
+        if job_time <= 0.:
+            job_time = n_hydro_per_job*max(
+                [cost_model.get(label, max(cost_model.values()))
+                 for label, _ in centrality_classes])
+        for label, n_jobs_class in centrality_classes:
+            if label not in cost_model:
+                print("\U000026A0  Warning: no cost for centrality {}, "
+                      "use the most expensive class".format(label))
+            event_time = cost_model.get(label, max(cost_model.values()))
+            job_plan.append((label, pack_hydro_events(
+                n_jobs_class*n_hydro_per_job, event_time, job_time,
+                walltime_factor=1.5)))
+            print("\U0001F375  {0:>6s}: {1:d} jobs with {2:d} events, "
+                  "{3:s} walltime".format(label, len(job_plan[-1][1]),
+                                          job_plan[-1][1][0][0],
+                                          job_plan[-1][1][0][1]))
+    else:
+        if args.cost_model != "":
+            print("\U000026A0  Warning: the cost model is only used for "
+                  "minimum bias IPGlasma events")
+        for label, n_jobs_class in centrality_classes:
+            job_plan.append((label, [(n_hydro_per_job, DEFAULT_WALLTIME)]
+                                    * n_jobs_class))
+
+    job_list = []
+    for job_folder, parameter_folder, time_stamp in job_folders:
+        iev = 0
+        for label, jobs in job_plan:
+            event_id_offset = 0
+            for n_hydro, walltime in jobs:
+                job_list.append((initial_condition_database.format(label),
+                                 initial_condition_type, job_folder,
+                                 cluster_name, iev, event_id_offset,
+                                 n_hydro, n_urqmd_per_hydro, n_threads,
+                                 time_stamp, n_threads_hydro,
+                                 template_folder, template_mode,
+                                 parameter_folder, walltime))
+                event_id_offset += n_hydro
+                iev += 1
+    n_jobs = len(job_list)//len(job_folders)
+
     toolbar_width = 40
     sys.stdout.write("\U0001F375  Generating {} jobs [{}]".format(
-        n_jobs, " " * toolbar_width))
+        len(job_list), " " * toolbar_width))
     sys.stdout.flush()
     sys.stdout.write("\b" * (toolbar_width+1))
-    event_id_offset = 0
-    for iev in range(n_jobs):
-        progress_i = (int(float(iev + 1)/n_jobs*toolbar_width)
-                      - int(float(iev)/n_jobs*toolbar_width))
-        for ii in range(progress_i):
-            sys.stdout.write("#")
-            sys.stdout.flush()
-        if (initial_condition_type == 'IPGlasma'
-                and parameter_dict.ipglasma['type'] == 'minimumbias'):
-            precent_local = float(iev)/float(n_jobs)
-            for cen_min, cen_max, cen_label in centrality_list:
-                if precent_local >= cen_min and precent_local < cen_max:
-                    cent_label = cen_label
-                    if cent_label != cent_label_pre:
-                        cent_label_pre = cent_label
-                        event_id_offset = 0
-                    break
-        generate_event_folders(initial_condition_database.format(cent_label),
-                               initial_condition_type, working_folder_name,
-                               cluster_name, iev, event_id_offset,
-                               n_hydro_per_job, n_urqmd_per_hydro, n_threads,
-                               IPGlasma_time_stamp)
-        event_id_offset += n_hydro_per_job
+    with ThreadPool(processes=max(1, n_threads_generate)) as pool:
+        for iev, _ in enumerate(pool.imap_unordered(
+                lambda job: generate_event_folders(*job), job_list)):
+            progress_i = (int(float(iev + 1)/len(job_list)*toolbar_width)
+                          - int(float(iev)/len(job_list)*toolbar_width))
+            for ii in range(progress_i):
+                sys.stdout.write("#")
+                sys.stdout.flush()
     sys.stdout.write("\n")
     sys.stdout.flush()
+    print("\U0001F4C1  Generated {0:d} jobs with {1:d} inodes "
+          "in {2:.1f} s ({3:s} mode)".format(
+              len(job_list), count_inodes(working_folder_name),
+              time.time() - time_start, template_mode))
     # copy script to collect final results
     pwd = path.abspath(".")
     script_path = "utilities"
-    shutil.copy(path.join(script_path, 'collect_events.sh'), pwd)
+    shutil.copy(path.join(script_path, 'collect_events.py'), pwd)
     shutil.copy(path.join(script_path, 'combine_results_into_hdf5.py'), pwd)
     script_path = "codes/hadronic_afterburner_toolkit_code/ebe_scripts"
     shutil.copy(path.join(script_path, 'average_event_spvn_h5.py'), pwd)
 
-    if cluster_name == "nersc":
-        shutil.copy('Cluster_supports/NERSC/job_MPI_wrapper.py',
-                    working_folder_name)
-        n_nodes = max(1, int(n_jobs*n_threads/64))
-        generate_nersc_mpi_job_script(working_folder_name,
-                                      n_nodes, n_threads, int(n_jobs/n_nodes))
-
-    if cluster_name == "nerscKNL":
-        shutil.copy('Cluster_supports/NERSC/job_MPI_wrapper.py',
-                    working_folder_name)
-        n_nodes = max(1, int(n_jobs*n_threads/136))
-        generate_nerscKNL_mpi_job_script(working_folder_name,
-                                         n_nodes, n_threads,
-                                         int(n_jobs/n_nodes))
+    for job_folder, _, _ in job_folders:
+        if cluster_name == "nersc":
+            shutil.copy('Cluster_supports/NERSC/job_MPI_wrapper.py',
+                        job_folder)
+            n_nodes = max(1, int(n_jobs*n_threads/64))
+            generate_nersc_mpi_job_script(job_folder, n_nodes, n_threads,
+                                          int(n_jobs/n_nodes))
+
+        if cluster_name == "nerscKNL":
+            shutil.copy('Cluster_supports/NERSC/job_MPI_wrapper.py',
+                        job_folder)
+            n_nodes = max(1, int(n_jobs*n_threads/136))
+            generate_nerscKNL_mpi_job_script(job_folder, n_nodes, n_threads,
+                                             int(n_jobs/n_nodes))
 
     if cluster_name == "wsugrid":
         shutil.copy('Cluster_supports/WSUgrid/submit_all_jobs.sh', pwd)
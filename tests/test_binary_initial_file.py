@@ -0,0 +1,91 @@
+"""
+    This test fetches the events of a small synthetic IP-Glasma database in
+    the text and the binary formats, and compares the binary initial files
+    with the text ones.
+"""
+
+import sys
+from os import path, rename
+
+import h5py
+import numpy as np
+
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(
+    __file__))), "IPGlasma_database"))
+from fetch_IPGlasma_event_from_hdf5_database import (
+    IPGlasmaDatabaseReader, read_binary_initial_file)
+
+N_EVENTS = 2
+GRID_SIZE = 4
+GRID_SPACING = 0.5
+
+
+def write_database(file_name):
+    """
+        This function writes a small IP-Glasma database. The values are
+        rounded to the precision of the text output, so that the text
+        initial file holds them exactly.
+    """
+    rng = np.random.default_rng(3)
+    x_size = GRID_SIZE*GRID_SPACING
+    header = "# tau_in_fm 0.4 xsize= {0:d} dx= {1:g}".format(GRID_SIZE,
+                                                             GRID_SPACING)
+    with h5py.File(file_name, "w") as hf:
+        for iev in range(N_EVENTS):
+            data = rng.normal(0., 3., [GRID_SIZE*GRID_SIZE, 15])
+            data = np.array([float("{:.6e}".format(value))
+                             for value in data.ravel()]).reshape(data.shape)
+            dset = hf.create_group("event-{0:d}".format(iev)).create_dataset(
+                "epsilon-u-Hydro-t0.4-{0:d}.dat".format(iev), data=data)
+            dset.attrs.create("header", np.string_(header))
+            for name, value in (("x_size", x_size), ("y_size", x_size),
+                                ("dx", GRID_SPACING), ("dy", GRID_SPACING),
+                                ("nx", GRID_SIZE), ("ny", GRID_SIZE)):
+                dset.attrs.create(name, value)
+
+
+def fetch_text_and_binary(database, output_format):
+    """
+        This function fetches all the events as text and in output_format,
+        and returns the pairs of the text and the binary file names
+    """
+    file_pairs = []
+    with IPGlasmaDatabaseReader(database) as reader:
+        for iev in range(N_EVENTS):
+            file_name = reader.fetch(iev)
+            text_file = "text_{}".format(file_name)
+            rename(file_name, text_file)
+            file_pairs.append([text_file])
+    with IPGlasmaDatabaseReader(database, "0.4", output_format) as reader:
+        for iev, binary_file in enumerate(reader.fetch_many(range(N_EVENTS))):
+            file_pairs[iev].append(binary_file)
+    return file_pairs
+
+
+def check_round_trip(tmp_path, monkeypatch, output_format, rtol):
+    """This function compares the binary files with the text files"""
+    monkeypatch.chdir(tmp_path)
+    write_database("database.h5")
+    for text_file, binary_file in fetch_text_and_binary("database.h5",
+                                                        output_format):
+        data, header = read_binary_initial_file(binary_file)
+        text_data = np.loadtxt(text_file)
+        with open(text_file, "r") as f:
+            text_header = f.readline()
+        assert data.shape == text_data.shape
+        assert header == text_header[2:].strip("\n")
+        if rtol == 0:
+            assert np.array_equal(data, text_data)
+        else:
+            np.testing.assert_allclose(data, text_data, rtol=rtol, atol=0)
+
+
+def test_binary64_round_trip(tmp_path, monkeypatch):
+    """binary64 holds exactly the values of the text output"""
+    check_round_trip(tmp_path, monkeypatch, "binary64", 0)
+
+
+def test_binary32_round_trip(tmp_path, monkeypatch):
+    """binary32 holds the values of the text output to float32 precision"""
+    check_round_trip(tmp_path, monkeypatch, "binary32",
+                     np.finfo(np.float32).eps)
@@ -0,0 +1,97 @@
+"""
+    This test splits a particle list in the binary format of
+    convert_to_binary.e, merged from two oversampled events like
+    concatenate_binary_files.e, and checks the particles of every species
+    file.
+"""
+
+import sys
+import gzip
+import struct
+from os import path
+
+import numpy as np
+
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(
+    __file__))), "codes"))
+from split_particle_list import split_particle_list, CHARGED_HADRONS
+
+# UrQMD ityp, 2*I3, charge
+URQMD_IDS = [(101, 2, 1), (101, -2, -1), (101, 0, 0), (106, 1, 1),
+             (1, 1, 1), (-1, -1, -1), (1, -1, 0), (27, 0, 0), (40, 0, 0)]
+SPECIES = ['211', '-211', '2212', '3122', CHARGED_HADRONS]
+
+
+def generate_events(rng, n_events):
+    """This function returns the particle lines of the sampled events"""
+    events = []
+    for _ in range(n_events):
+        n_particles = rng.integers(0, 20)
+        ids = rng.integers(0, len(URQMD_IDS), n_particles)
+        events.append([(URQMD_IDS[iid], rng.normal(0., 2., 9))
+                       for iid in ids])
+    return events
+
+
+def write_binary_particle_list(file_name, events):
+    """
+        This function writes the events like convert_to_binary.e: the
+        number of particles per event, then 3 ints and 9 floats per particle
+    """
+    with gzip.open(file_name, "wb") as f:
+        for particles in events:
+            f.write(struct.pack("i", len(particles)))
+            for info, kinematics in particles:
+                f.write(struct.pack("3i", *info))
+                f.write(struct.pack("9f", *kinematics))
+
+
+def read_binary_particle_list(file_name):
+    """This function reads the events of a binary particle list"""
+    events = []
+    with gzip.open(file_name, "rb") as f:
+        data = f.read()
+    position = 0
+    while position < len(data):
+        n_particles, = struct.unpack_from("i", data, position)
+        position += 4
+        particles = []
+        for _ in range(n_particles):
+            info = struct.unpack_from("3i", data, position)
+            kinematics = struct.unpack_from("9f", data, position + 12)
+            particles.append((info, kinematics))
+            position += 48
+        events.append(particles)
+    return events
+
+
+def is_in_species(info, species):
+    """This function selects the particles of one species file"""
+    return {'211': info[:2] == (101, 2), '-211': info[:2] == (101, -2),
+            '2212': info[:2] == (1, 1),
+            '3122': info[:2] in [(27, 0), (40, 0)],
+            CHARGED_HADRONS: info[2] != 0}[species]
+
+
+def test_split_binary_particle_list(tmp_path):
+    """every species file holds the particles of its species per event"""
+    rng = np.random.default_rng(11)
+    oversampled_events = [generate_events(rng, 3), generate_events(rng, 4)]
+    file_names = []
+    for iev, events in enumerate(oversampled_events):
+        file_names.append(str(tmp_path / "particle_list_{}.gz".format(iev)))
+        write_binary_particle_list(file_names[-1], events)
+    # concatenated gzip members, like concatenate_binary_files.e
+    with open(file_names[0], "ab") as f_out, open(file_names[1], "rb") as f:
+        f_out.write(f.read())
+    all_events = read_binary_particle_list(file_names[0])
+    assert len(all_events) == 7
+
+    species_files = split_particle_list(file_names[0], str(tmp_path), SPECIES)
+    for species in SPECIES:
+        species_events = read_binary_particle_list(species_files[species])
+        assert len(species_events) == len(all_events)
+        for particles, species_particles in zip(all_events, species_events):
+            assert species_particles == [
+                iparticle for iparticle in particles
+                if is_in_species(iparticle[0], species)]
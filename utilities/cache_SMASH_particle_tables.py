@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+    This script provides the SMASH particle table (pdg.dat) and the
+    particles chosen for iSS (chosen_particles.dat) from a shared cache.
+
+    The tables only depend on the SMASH build and its config.yaml, so they
+    are generated once for every SMASH build and config and linked into
+    the iSS tables folder of all the later events. The cached tables are
+    read-only.
+"""
+
+import hashlib
+import shutil
+import subprocess
+from os import path, makedirs, rename, replace, symlink, chmod, getpid, stat
+from prepare_SMASH_particles_for_iSS import choose_particles_for_iSS
+
+TABLE_FILES = ["pdg.dat", "chosen_particles.dat"]
+
+
+def get_tables_key(smash_binary, smash_config):
+    """
+        This function returns the cache key of the tables. The SMASH build
+        is identified by the path, size and modification time of the
+        binary, so that the binary is not read for every event, and the
+        config by its content.
+    """
+    binary_stat = stat(smash_binary)
+    key = hashlib.sha256("{0} {1:d} {2:d}".format(
+        path.realpath(smash_binary), binary_stat.st_size,
+        binary_stat.st_mtime_ns).encode())
+    with open(smash_config, "rb") as f:
+        key.update(f.read())
+    return key.hexdigest()[:24]
+
+
+def generate_tables(smash_binary, smash_config, tables_folder):
+    """
+        This function writes the tables into tables_folder. They are
+        written to a temporary folder which is renamed when it is complete,
+        so that concurrent events never read a partial table.
+    """
+    tmp_folder = "{0}.tmp.{1:d}".format(tables_folder, getpid())
+    makedirs(tmp_folder)
+    try:
+        with open(path.join(tmp_folder, "pdg.dat"), "w") as f:
+            subprocess.check_call([smash_binary, "-x", "-i", smash_config],
+                                  stdout=f)
+        choose_particles_for_iSS(tmp_folder)
+        for file_name in TABLE_FILES:
+            chmod(path.join(tmp_folder, file_name), 0o444)
+        try:
+            rename(tmp_folder, tables_folder)
+        except OSError:
+            if not path.isdir(tables_folder):
+                raise
+    finally:
+        # the tables are incomplete, or another event has renamed the
+        # same tables into the cache first
+        if path.isdir(tmp_folder):
+            shutil.rmtree(tmp_folder)
+
+
+def link_tables(tables_folder, iss_tables_folder):
+    """This function links the cached tables into the iSS tables folder"""
+    for file_name in TABLE_FILES:
+        link_name = path.join(iss_tables_folder, file_name)
+        tmp_link_name = "{0}.tmp.{1:d}".format(link_name, getpid())
+        symlink(path.join(tables_folder, file_name), tmp_link_name)
+        replace(tmp_link_name, link_name)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='Provide the SMASH particle tables for iSS',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-s', '--smash', type=str, required=True,
+                        help='SMASH binary')
+    parser.add_argument('-c', '--config', type=str, required=True,
+                        help='SMASH config.yaml')
+    parser.add_argument('-i', '--iss_tables_folder', type=str,
+                        default='iSS_tables',
+                        help='folder, where iSS holds tables')
+    parser.add_argument('-d', '--cache_folder', type=str,
+                        default='~/.cache/iEBE-MUSIC/SMASH_tables',
+                        help='folder with the cached tables')
+    args = parser.parse_args()
+
+    SMASH_BINARY = path.abspath(path.expanduser(args.smash))
+    SMASH_CONFIG = path.abspath(path.expanduser(args.config))
+    CACHE_FOLDER = path.abspath(path.expanduser(args.cache_folder))
+    TABLES_FOLDER = path.join(CACHE_FOLDER,
+                              get_tables_key(SMASH_BINARY, SMASH_CONFIG))
+    if path.isdir(TABLES_FOLDER):
+        print("Use the cached SMASH particle tables in {}".format(
+            TABLES_FOLDER))
+    else:
+        makedirs(CACHE_FOLDER, exist_ok=True)
+        generate_tables(SMASH_BINARY, SMASH_CONFIG, TABLES_FOLDER)
+        print("Created the SMASH particle tables in {}".format(
+            TABLES_FOLDER))
+    link_tables(TABLES_FOLDER, args.iss_tables_folder)
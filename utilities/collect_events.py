@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""
+    This script collects the results of all the finished events of a run
+    into one folder and combines the spvn results into one hdf5 file.
+
+    The event folders are scanned in parallel and the files are copied
+    with a thread pool. The size and modification time of every copied
+    file are kept in a manifest in the target folder, so that a second
+    run only copies the new or changed files.
+
+    The events of a design point campaign (design_point_*/event_*) are
+    collected into one target folder per design point.
+"""
+
+import argparse
+import json
+import shutil
+from os import path, scandir, makedirs, replace, stat
+from multiprocessing.pool import ThreadPool
+from combine_results_into_hdf5 import combine_results
+
+MANIFEST_FILE_NAME = "collect_manifest.json"
+# results of an event and the target folder they are collected into
+EVENT_ARTIFACTS = [
+    ("spvn_results_{}.h5", "SPVN_RESULTS"),
+    ("hydro_results_{}", "HYDRO_RESULTS"),
+    ("particle_list_{}.gz", "URQMD_RESULTS"),
+    ("smash_results_{}", "SMASH_RESULTS"),
+]
+
+
+def get_run_folders(from_folder):
+    """
+        This function returns the folders with the event_* job folders,
+        the run folder itself or its design point folders
+    """
+    with scandir(from_folder) as entries:
+        design_folders = sorted(
+            entry.path for entry in entries
+            if entry.is_dir() and entry.name.startswith("design_point_"))
+    return design_folders if design_folders else [from_folder]
+
+
+def scan_job_folder(job_folder):
+    """
+        This function returns the event id and results folder of every
+        finished event in a job folder
+    """
+    events = []
+    with scandir(job_folder) as entries:
+        for entry in entries:
+            if not (entry.name.startswith("EVENT_RESULTS_")
+                    and entry.is_dir()):
+                continue
+            event_id = entry.name[len("EVENT_RESULTS_"):]
+            if event_is_finished(entry.path, event_id):
+                events.append((event_id, entry.path))
+    return events
+
+
+def event_is_finished(results_folder, event_id):
+    """
+        This function checks the cleanup stage marker of an event, or the
+        spvn results for the events run before the stage markers
+    """
+    marker = path.join(results_folder, ".stage_cleanup")
+    if path.isfile(marker):
+        with open(marker, "r") as f:
+            return f.read().strip() == "done"
+    return path.isfile(path.join(results_folder,
+                                 "spvn_results_{}.h5".format(event_id)))
+
+
+def list_files(source, target):
+    """
+        This function returns the (source, target) pairs of all the files
+        in a file or folder
+    """
+    if path.isfile(source):
+        return [(source, target)]
+    files = []
+    with scandir(source) as entries:
+        for entry in entries:
+            files += list_files(entry.path, path.join(target, entry.name))
+    return files
+
+
+def get_file_state(file_name):
+    """This function returns the size and modification time of a file"""
+    file_stat = stat(file_name)
+    return [file_stat.st_size, file_stat.st_mtime_ns]
+
+
+def copy_file(source_target):
+    """This function copies one file, the copy appears complete or not"""
+    source, target = source_target
+    makedirs(path.dirname(target), exist_ok=True)
+    tmp_target = "{}.collect_tmp".format(target)
+    shutil.copy2(source, tmp_target)
+    replace(tmp_target, target)
+    return source
+
+
+def read_manifest(manifest_file):
+    """This function reads the states of the files copied before"""
+    if not path.isfile(manifest_file):
+        return {}
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(manifest_file, manifest):
+    """This function writes the manifest atomically"""
+    with open(manifest_file + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    replace(manifest_file + ".tmp", manifest_file)
+
+
+def collect_run_folder(run_folder, target_folder, artifacts, pool):
+    """
+        This function copies the new or changed results of the finished
+        events in run_folder to target_folder. It returns the number of
+        finished events and the number of copied files.
+    """
+    with scandir(run_folder) as entries:
+        job_folders = [entry.path for entry in entries
+                       if entry.name.startswith("event_") and entry.is_dir()]
+    events = [event for job_events in pool.map(scan_job_folder, job_folders)
+              for event in job_events]
+
+    manifest_file = path.join(target_folder, MANIFEST_FILE_NAME)
+    manifest = read_manifest(manifest_file)
+    copy_list = []
+    collected_events = set()
+    for event_id, results_folder in sorted(events):
+        if event_id in collected_events:
+            print("Skip {}, the event id is collected already".format(
+                results_folder))
+            continue
+        collected_events.add(event_id)
+        for name_pattern, artifact_folder in artifacts:
+            source = path.join(results_folder, name_pattern.format(event_id))
+            if not path.exists(source):
+                continue
+            copy_list += list_files(
+                source, path.join(target_folder, artifact_folder,
+                                  path.basename(source)))
+    file_states = dict(zip(
+        [source for source, _ in copy_list],
+        pool.map(get_file_state, [source for source, _ in copy_list])))
+    copy_list = [(source, target) for source, target in copy_list
+                 if (manifest.get(source) != file_states[source]
+                     or not path.isfile(target))]
+    for source in pool.imap_unordered(copy_file, copy_list):
+        manifest[source] = file_states[source]
+    if copy_list or not path.isfile(manifest_file):
+        write_manifest(manifest_file, manifest)
+    return len(collected_events), len(copy_list)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description='Collect the results of the finished events',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('from_folder', type=str,
+                        help='working folder of the run')
+    parser.add_argument('to_folder', type=str,
+                        help='folder to collect the run into')
+    parser.add_argument('-n_th', '--n_threads', type=int, default=8,
+                        help='number of threads for scanning and copying')
+    parser.add_argument('-spvn_only', '--spvn_only', action='store_true',
+                        help='only collect the spvn results')
+    parser.add_argument('-m', '--mode', type=str, default='copy',
+                        choices=['copy', 'virtual'],
+                        help='mode of combine_results_into_hdf5.py')
+    args = parser.parse_args()
+
+    FROM_FOLDER = path.abspath(args.from_folder)
+    RUN_NAME = path.basename(FROM_FOLDER)
+    ARTIFACTS = EVENT_ARTIFACTS[:1] if args.spvn_only else EVENT_ARTIFACTS
+    print("collecting events from {} to {}".format(FROM_FOLDER,
+                                                   args.to_folder))
+    with ThreadPool(processes=max(1, args.n_threads)) as POOL:
+        for run_folder in get_run_folders(FROM_FOLDER):
+            target_folder = path.join(args.to_folder, RUN_NAME,
+                                      path.relpath(run_folder, FROM_FOLDER))
+            target_folder = path.normpath(target_folder)
+            makedirs(target_folder, exist_ok=True)
+            with scandir(FROM_FOLDER) as entries:
+                for entry in entries:
+                    if (entry.name.startswith("parameters_dict_")
+                            and entry.name.endswith(".py")):
+                        shutil.copy2(entry.path, target_folder)
+            if path.isfile(path.join(run_folder, "design_point.dat")):
+                shutil.copy2(path.join(run_folder, "design_point.dat"),
+                             target_folder)
+            n_events, n_copied = collect_run_folder(run_folder, target_folder,
+                                                    ARTIFACTS, POOL)
+            print("Collected events number: {0:d}, copied {1:d} new "
+                  "files to {2}".format(n_events, n_copied, target_folder))
+
+            spvn_folder = path.join(target_folder, "SPVN_RESULTS")
+            output_file = path.join(
+                target_folder, "{}.h5".format(path.basename(target_folder)))
+            if path.isdir(spvn_folder) and (n_copied > 0
+                                            or not path.isfile(output_file)):
+                with scandir(spvn_folder) as entries:
+                    event_list = sorted(entry.path for entry in entries
+                                        if entry.name.endswith(".h5"))
+                n_groups = combine_results(event_list, output_file, args.mode)
+                print("Combined {0} groups into {1}".format(n_groups,
+                                                            output_file))
@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 """This script combine multiple hdf5 data files to one"""
 
-import sys
-from os import path, system
+import argparse
+from os import path
 from glob import glob
 import h5py
 import string
@@ -13,43 +13,77 @@ def randomString(stringLength=1):
     letters = string.ascii_lowercase
     return ''.join(random.choice(letters) for i in range(stringLength))
 
-def print_help():
-    """This function outpus help messages"""
-    print("{0} results_folder".format(sys.argv[0]))
-
-if len(sys.argv) < 2:
-    print_help()
-    exit(1)
-
-RESULTS_FOLDER = str(sys.argv[1])
-RESULTS_NAME = RESULTS_FOLDER.split("/")[-1]
-if RESULTS_NAME == "":
-    RESULTS_NAME = RESULTS_FOLDER.split("/")[-2]
-RESULTS_PATH = path.abspath(path.join(".", RESULTS_FOLDER))
-EVENT_LIST = glob(path.join(RESULTS_PATH, "*.h5"))
-
-exist_group_keys = []
-
-for ievent, event_path in enumerate(EVENT_LIST):
-    print("processing {0} ... ".format(event_path))
-    event_name = event_path.split("/")[-1]
-    hftemp = h5py.File(event_path, "r")
-    glist = list(hftemp.keys())
-    hftemp.close()
-    for igroup, gtemp in enumerate(glist):
-        gtemp2 = gtemp
-        random_string_len = 1
-        tol = 0
-        while gtemp2 in exist_group_keys:
-            randomlabel = randomString(random_string_len)
-            gtemp2 = "{0}{1}".format(gtemp, randomlabel)
-            tol += 1
-            if tol > 30:
-                random_string_len += 1
-                tol = 0
-        if gtemp2 != gtemp:
-            print("Conflict in mergeing {0}, use {1}".format(gtemp, gtemp2))
-        exist_group_keys.append(gtemp2)
-        system('h5copy -i {0} -o {1}.h5 -s {2} -d {3}'.format(
-            event_path, RESULTS_NAME, gtemp, gtemp2))
 
+def get_unique_group_name(group_name, exist_group_keys):
+    """
+        This function returns group_name, or group_name with a random
+        suffix if the name is already in the set exist_group_keys
+    """
+    gtemp2 = group_name
+    random_string_len = 1
+    tol = 0
+    while gtemp2 in exist_group_keys:
+        randomlabel = randomString(random_string_len)
+        gtemp2 = "{0}{1}".format(group_name, randomlabel)
+        tol += 1
+        if tol > 30:
+            random_string_len += 1
+            tol = 0
+    if gtemp2 != group_name:
+        print("Conflict in mergeing {0}, use {1}".format(group_name, gtemp2))
+    return gtemp2
+
+
+def combine_results(event_list, output_filename, mode="copy"):
+    """
+        This function merges the groups of all the hdf5 files in event_list
+        into output_filename.
+
+        mode = "copy": copy the groups with h5py inside this process
+        mode = "virtual": only write external links to the groups in the
+                          event files, no data is copied. The event files
+                          must stay in place.
+    """
+    exist_group_keys = set()
+    output_path = path.dirname(path.abspath(output_filename))
+    hf = h5py.File(output_filename, "w")
+    for event_path in event_list:
+        print("processing {0} ... ".format(event_path))
+        with h5py.File(event_path, "r") as hftemp:
+            for gtemp in hftemp.keys():
+                gtemp2 = get_unique_group_name(gtemp, exist_group_keys)
+                exist_group_keys.add(gtemp2)
+                if mode == "virtual":
+                    hf[gtemp2] = h5py.ExternalLink(
+                        path.relpath(event_path, output_path), gtemp)
+                else:
+                    hftemp.copy(hftemp[gtemp], hf, name=gtemp2)
+    hf.close()
+    return len(exist_group_keys)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description='Combine the hdf5 files of all events into one',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('results_folder', type=str,
+                        help='folder with the hdf5 files of the events')
+    parser.add_argument('-m', '--mode', type=str, default='copy',
+                        choices=['copy', 'virtual'],
+                        help=('copy: copy all groups into one file, '
+                              + 'virtual: write an index file with '
+                              + 'external links to the event files'))
+    args = parser.parse_args()
+
+    RESULTS_FOLDER = args.results_folder
+    RESULTS_NAME = RESULTS_FOLDER.split("/")[-1]
+    if RESULTS_NAME == "":
+        RESULTS_NAME = RESULTS_FOLDER.split("/")[-2]
+    RESULTS_PATH = path.abspath(path.join(".", RESULTS_FOLDER))
+    OUTPUT_FILENAME = "{0}.h5".format(RESULTS_NAME)
+    EVENT_LIST = [event_path
+                  for event_path in glob(path.join(RESULTS_PATH, "*.h5"))
+                  if event_path != path.abspath(OUTPUT_FILENAME)]
+
+    n_groups = combine_results(EVENT_LIST, OUTPUT_FILENAME, args.mode)
+    print("Combined {0} groups into {1}.h5".format(n_groups, RESULTS_NAME))
@@ -1,67 +1,117 @@
-def charge(pdg):
-    s = str(pdg)
-    antiparticle_sign = 1
-    if s[0] == '-':
-        s = s[1:]
-        antiparticle_sign = -1
-    # photon
-    if (s == '22'): return 0
-    # nuclei
-    if  (len(s) == 10 and s[0:2] == '10'):
-        return int(s[-7:-4]) * antiparticle_sign
-    quarks = ('000'+ s)[-4:-1]
-    # lepton
-    if quarks[0] == '0' and quarks[1] == '0':
-        return -1
-    # meson
-    if quarks[0] == '0':
-        if (int(quarks[1]) % 2 == int(quarks[2]) % 2):
-            return 0
-        else:
-            return antiparticle_sign
-    # baryon
-    Q = 0
-    for i in quarks:
-        Q += (2 if (int(i) % 2 == 0) else -1)
-    return Q / 3 * antiparticle_sign
+#!/usr/bin/env python
+"""
+    This script converts the sampled particles from iSS (OSCAR.DAT) to the
+    particle lists used as input for SMASH.
 
-def convert_iSS_output_to_SMASH_input(iSS_file, SMASH_folder):
-    print "# Reading particles from ", input_file
-    out_fname = "/sampled_particles"
-    out_file_counter = 0
-    events_per_file = 20
-    output_file = open(SMASH_folder + out_fname + str(out_file_counter), 'w')
-    output_file.write("#!OSCAR2013 particle_lists t x y z mass p0 px py pz pdg ID charge\n"
-                      "# Units: fm fm fm fm GeV GeV GeV GeV GeV none none e\n"
-                      "# SMASH\n")
+    The OSCAR file is streamed one event at a time, so the memory usage
+    does not depend on the size of the file.
+"""
+
+from itertools import islice
+import numpy as np
+from pdg_properties import PDGTable, charge_from_pdg
+
+OSCAR_HEADER_LINES = 3
+EVENTS_PER_FILE = 20
+OUTPUT_FILE_NAME = "sampled_particles"
+OUTPUT_HEADER = (
+    "#!OSCAR2013 particle_lists t x y z mass p0 px py pz pdg ID charge\n"
+    "# Units: fm fm fm fm GeV GeV GeV GeV GeV none none e\n"
+    "# SMASH\n")
+PARTICLE_FORMAT = ("%10.4f %10.4f %10.4f %10.4f %10.4f %13.8f %13.8f %13.8f "
+                   "%13.8f %d %d %d\n")
+
+# Some particles are not represented by pdg code convention
+# and need special treatment
+NONSTANDARD_PDG = np.array([2110, 2210, 12110, 12210])
+NONSTANDARD_PDG_SHIFT = 19920009
+
+
+def read_iSS_events(iSS_file):
+    """
+        This function reads the OSCAR file from iSS one event at a time.
+        It yields the event number and an array with the columns
+        n, pdg, px, py, pz, E, m, x, y, z, t
+    """
     with open(iSS_file, 'r') as f:
-        # header
-        for _ in xrange(3): f.readline()
-        line = f.readline()
+        for _ in range(OSCAR_HEADER_LINES):
+            f.readline()
         while True:
-            ev_number, npart, _, _ = [int(s) for s in line.split()]
-            output_file.write('# event %d in %d\n' % (ev_number % events_per_file, npart))
-            if (ev_number % 1000 == 0):
-                print ev_number, npart
-            for i in xrange(npart):
-                line = f.readline()
-                n, pdg, px, py, pz, E, m, x, y, z, t = [float(s) for s in line.split()]
-                ipdg = int(pdg)
-                # Some particles are not represented by pdg code convention and need special treatment
-                if (ipdg in [2110, 2210, 12110, 12210]):
-                    ipdg += 19920009
-                output_file.write('%10.4f %10.4f %10.4f %10.4f %10.4f %13.8f %13.8f %13.8f %13.8f %d %d %d\n' % \
-                                  (t, x, y, z, m, E, px, py, pz, ipdg, n, charge(ipdg)))
             line = f.readline()
-            if (line):
-                output_file.write('# event %d end 0 impact 0\n' % (ev_number % events_per_file))
-                if ((ev_number + 1) % events_per_file == 0):
-                    output_file.close()
-                    out_file_counter += 1
-                    output_file = open(SMASH_folder + out_fname + str(out_file_counter), 'w')
-            else:
+            if not line:
                 break
-    output_file.close()
+            ev_number, npart, _, _ = [int(s) for s in line.split()]
+            if npart > 0:
+                particles = np.loadtxt(islice(f, npart), ndmin=2)
+            else:
+                particles = np.zeros([0, 11])
+            yield ev_number, particles
+
+
+def convert_particles(particles, pdg_table=None):
+    """
+        This function converts an array of iSS particles to an array with
+        the SMASH columns t, x, y, z, m, E, px, py, pz, pdg, ID, charge.
+        The charges are looked up in pdg_table if it is given.
+    """
+    n, pdg, px, py, pz, E, m, x, y, z, t = particles.T
+    ipdg = pdg.astype(np.int64)
+    ipdg = np.where(np.isin(ipdg, NONSTANDARD_PDG),
+                    ipdg + NONSTANDARD_PDG_SHIFT, ipdg)
+    if pdg_table is None:
+        charge = charge_from_pdg(ipdg)
+    else:
+        charge = pdg_table.get_charge(ipdg)
+    return np.column_stack((t, x, y, z, m, E, px, py, pz, ipdg, n, charge))
+
+
+def format_event(ev_number, particles, events_per_file=EVENTS_PER_FILE,
+                 pdg_table=None):
+    """This function formats one event in the SMASH particle list format"""
+    event_text = ['# event {0:d} in {1:d}\n'.format(
+        ev_number % events_per_file, len(particles))]
+    if len(particles) > 0:
+        smash_particles = convert_particles(particles, pdg_table)
+        event_text.append(PARTICLE_FORMAT*len(smash_particles)
+                          % tuple(smash_particles.ravel().tolist()))
+    return event_text
+
+
+def convert_iSS_output_to_SMASH_input(iSS_file, SMASH_folder,
+                                      events_per_file=EVENTS_PER_FILE,
+                                      pdg_file=""):
+    """
+        This function converts the iSS output to SMASH input files with
+        events_per_file events in each file. Each output file is written
+        to disk at once when it is complete. If the SMASH pdg_file is given,
+        the charges are taken from its (cached) particle table.
+    """
+    print("# Reading particles from {}".format(iSS_file))
+    pdg_table = None
+    if pdg_file != "":
+        pdg_table = PDGTable.from_smash_pdg_file(pdg_file)
+    out_fname = SMASH_folder + "/" + OUTPUT_FILE_NAME
+    out_file_counter = 0
+    file_buffer = [OUTPUT_HEADER]
+    previous_ev_number = None
+    for ev_number, particles in read_iSS_events(iSS_file):
+        if previous_ev_number is not None:
+            # the end line is only written if another event follows
+            file_buffer.append('# event {0:d} end 0 impact 0\n'.format(
+                previous_ev_number % events_per_file))
+            if (previous_ev_number + 1) % events_per_file == 0:
+                with open(out_fname + str(out_file_counter), 'w') as f:
+                    f.write("".join(file_buffer))
+                out_file_counter += 1
+                file_buffer = []
+        if ev_number % 1000 == 0:
+            print(ev_number, len(particles))
+        file_buffer += format_event(ev_number, particles, events_per_file,
+                                    pdg_table)
+        previous_ev_number = ev_number
+    with open(out_fname + str(out_file_counter), 'w') as f:
+        f.write("".join(file_buffer))
+
 
 if __name__ == "__main__":
     import argparse
@@ -73,12 +123,16 @@ if __name__ == "__main__":
                         help='file with sampled particles from iSS')
     parser.add_argument('-o', '--output_folder', type=str,
                         default='SMASH_input', help='folder with SMASH events')
+    parser.add_argument('-t', '--pdg_table', type=str, default='',
+                        help='pdg.dat from SMASH to look up the charges')
     args = parser.parse_args()
     try:
         input_file = args.input_file
         output_folder = args.output_folder
+        pdg_file = args.pdg_table
     except:
         parser.print_help()
         exit(0)
 
-    convert_iSS_output_to_SMASH_input(input_file, output_folder)
+    convert_iSS_output_to_SMASH_input(input_file, output_folder,
+                                      pdg_file=pdg_file)
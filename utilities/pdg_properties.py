@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+"""
+    This module provides the particle properties (charge, baryon number,
+    antiparticle flag) for arrays of pdg codes.
+
+    The particle table is built once from the pdg.dat file produced by
+    `smash -x` and cached on disk next to it, keyed by the hash of pdg.dat.
+"""
+
+import hashlib
+from os import path, getpid, replace
+import numpy as np
+
+
+def charge_from_pdg(pdg):
+    """This function returns the electric charges of an array of pdg codes"""
+    pdg = np.asarray(pdg, dtype=np.int64)
+    abs_pdg = np.abs(pdg)
+    antiparticle_sign = np.where(pdg < 0, -1, 1)
+    quarks = [(abs_pdg//1000) % 10, (abs_pdg//100) % 10, (abs_pdg//10) % 10]
+    # baryon: +2/3 for even quark digits and -1/3 for odd quark digits
+    baryon_charge = sum(2 - 3*(iquark % 2) for iquark in quarks)//3
+    # meson
+    meson_charge = np.where(quarks[1] % 2 == quarks[2] % 2, 0, 1)
+    result = np.where(quarks[0] == 0, meson_charge,
+                      baryon_charge)*antiparticle_sign
+    # lepton
+    result = np.where((quarks[0] == 0) & (quarks[1] == 0), -1, result)
+    # nuclei
+    is_nucleus = (abs_pdg >= 1000000000) & (abs_pdg < 1100000000)
+    result = np.where(is_nucleus,
+                      (abs_pdg//10000) % 1000*antiparticle_sign, result)
+    # photon
+    result = np.where(abs_pdg == 22, 0, result)
+    return result
+
+
+def baryon_number_from_pdg(pdg):
+    """This function returns the baryon numbers of an array of pdg codes"""
+    pdg = np.asarray(pdg, dtype=np.int64)
+    abs_pdg = np.abs(pdg)
+    antiparticle_sign = np.where(pdg < 0, -1, 1)
+    quarks = [(abs_pdg//1000) % 10, (abs_pdg//100) % 10, (abs_pdg//10) % 10]
+    is_baryon = (quarks[0] != 0) & (quarks[1] != 0) & (quarks[2] != 0)
+    is_nucleus = (abs_pdg >= 1000000000) & (abs_pdg < 1100000000)
+    result = np.where(is_baryon, 1, 0)
+    result = np.where(is_nucleus, (abs_pdg//10) % 1000, result)
+    return result*antiparticle_sign
+
+
+def read_smash_pdg_file(pdg_file):
+    """
+        This function reads the particle entries of the pdg.dat file from
+        SMASH and returns the arrays of pdg codes and masses in file order
+    """
+    pdg_list = []
+    mass_list = []
+    with open(pdg_file, 'r') as infile:
+        while True:
+            line = infile.readline()
+            if not line or line.strip() == "":
+                break
+            line_split = line.split()
+            pdg_list.append(int(line_split[0]))
+            mass_list.append(float(line_split[2]))
+            for _ in range(int(line_split[-1])):
+                infile.readline()
+    return (np.array(pdg_list, dtype=np.int64),
+            np.array(mass_list, dtype=np.float64))
+
+
+def file_hash(file_name):
+    """This function returns the sha1 hash of a file"""
+    sha1 = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+class PDGTable:
+    """
+        This class holds the particle properties of all particles listed in
+        pdg.dat and their antiparticles. The entries are kept in file order
+        (listed particles first, then their antiparticles) together with a
+        sorted index for vectorized lookups. is_listed marks the entries
+        which appear in pdg.dat.
+    """
+    columns = ("pdg", "mass", "charge", "baryon_number", "is_antiparticle",
+               "is_listed")
+
+    def __init__(self, pdg, mass, charge, baryon_number, is_antiparticle,
+                 is_listed):
+        self.pdg = np.asarray(pdg, dtype=np.int64)
+        self.mass = np.asarray(mass, dtype=np.float64)
+        self.charge = np.asarray(charge, dtype=np.int64)
+        self.baryon_number = np.asarray(baryon_number, dtype=np.int64)
+        self.is_antiparticle = np.asarray(is_antiparticle, dtype=bool)
+        self.is_listed = np.asarray(is_listed, dtype=bool)
+        self.sort_index = np.argsort(self.pdg, kind='stable')
+        self.sorted_pdg = self.pdg[self.sort_index]
+
+    @classmethod
+    def from_smash_pdg_file(cls, pdg_file, cache_folder=None):
+        """
+            This function builds the table from pdg.dat. The table is cached
+            in cache_folder (default: the folder of pdg.dat, after resolving
+            the symbolic links) and reused as long as pdg.dat does not
+            change.
+        """
+        if cache_folder is None:
+            cache_folder = path.dirname(path.realpath(pdg_file))
+        cache_file = path.join(cache_folder, "pdg_table_{}.npz".format(
+            file_hash(pdg_file)))
+        if path.isfile(cache_file):
+            with np.load(cache_file) as cached:
+                return cls(*[cached[icol] for icol in cls.columns])
+
+        pdg, mass = read_smash_pdg_file(pdg_file)
+        all_pdg = np.concatenate((pdg, -pdg))
+        all_mass = np.concatenate((mass, mass))
+        # keep the first entry of every code, e.g. for self-conjugate mesons
+        _, first_idx = np.unique(all_pdg, return_index=True)
+        first_idx = np.sort(first_idx)
+        all_pdg = all_pdg[first_idx]
+        table = cls(all_pdg, all_mass[first_idx], charge_from_pdg(all_pdg),
+                    baryon_number_from_pdg(all_pdg), all_pdg < 0,
+                    first_idx < len(pdg))
+        try:
+            # write to a temporary file first, so that concurrent jobs never
+            # see a partially written cache
+            tmp_file = "{}.{}.tmp.npz".format(cache_file[:-4], getpid())
+            np.savez(tmp_file, **{icol: getattr(table, icol)
+                                  for icol in cls.columns})
+            replace(tmp_file, cache_file)
+        except OSError:
+            print("Warning: can not cache the pdg table in {}".format(
+                cache_folder))
+        return table
+
+    def lookup(self, pdg):
+        """
+            This function returns the table indices of an array of pdg codes
+            and a mask which is False for the codes not in the table
+        """
+        pdg = np.asarray(pdg, dtype=np.int64)
+        sorted_idx = np.searchsorted(self.sorted_pdg, pdg)
+        sorted_idx = np.minimum(sorted_idx, len(self.sorted_pdg) - 1)
+        found = self.sorted_pdg[sorted_idx] == pdg
+        return self.sort_index[sorted_idx], found
+
+    def get_charge(self, pdg):
+        """This function returns the charges of an array of pdg codes"""
+        idx, found = self.lookup(pdg)
+        if found.all():
+            return self.charge[idx]
+        return np.where(found, self.charge[idx], charge_from_pdg(pdg))
+
+    def get_baryon_number(self, pdg):
+        """This function returns the baryon numbers of an array of pdg codes"""
+        idx, found = self.lookup(pdg)
+        if found.all():
+            return self.baryon_number[idx]
+        return np.where(found, self.baryon_number[idx],
+                        baryon_number_from_pdg(pdg))
+
+    def get_is_antiparticle(self, pdg):
+        """This function returns the antiparticle flags of the pdg codes"""
+        idx, found = self.lookup(pdg)
+        return np.where(found, self.is_antiparticle[idx], np.asarray(pdg) < 0)
@@ -1,3 +1,31 @@
+#!/usr/bin/env python
+"""
+    This script selects the particles from the SMASH particle table (pdg.dat)
+    to be sampled with iSS and writes them to chosen_particles.dat.
+"""
+
+import numpy as np
+from pdg_properties import PDGTable
+
+
+def choose_particles_for_iSS(iss_tables_folder):
+    """This function writes chosen_particles.dat from pdg.dat"""
+    input_file_name = iss_tables_folder + '/pdg.dat'
+    output_file_name = iss_tables_folder + '/chosen_particles.dat'
+    table = PDGTable.from_smash_pdg_file(input_file_name)
+    # Do not sample photons, too heavy particles, and d'
+    chosen = (table.is_listed & (table.mass > 0.1) & (table.mass < 2.3)
+              & (table.pdg != 1000010021))
+    # anti-baryons (nuclei are excluded)
+    add_antiparticle = ((np.abs(table.baryon_number) == 1)
+                        & (np.abs(table.pdg) < 1000000000))
+    with open(output_file_name, 'w') as outfile:
+        for pdg, anti in zip(table.pdg[chosen], add_antiparticle[chosen]):
+            outfile.write('{}\n'.format(pdg))
+            if anti:
+                outfile.write('{}\n'.format(-pdg))
+
+
 if __name__ == "__main__":
     import argparse
 
@@ -12,26 +40,6 @@ if __name__ == "__main__":
     except:
         parser.print_help()
         exit(0)
-    
-    input_file_name = iss_tables_folder + '/pdg.dat'
-    output_file_name = iss_tables_folder + '/chosen_particles.dat'
-    infile = open(input_file_name, 'r')
-    outfile = open(output_file_name, 'w')
-    while (True):
-        line = infile.readline()
-        if (not line or line.strip() == ""): break
-        line_split = line.split()
-        pdg = line_split[0].strip()
-        ndecays = int(line_split[-1])
-        mass = float(line_split[2])
-        for _ in xrange(ndecays): infile.readline()
-        # Do not sample photons, too heavy particles, and d'
-        if (mass > 0.1 and mass < 2.3 and pdg  != '1000010021'):
-            outfile.write(pdg + '\n')
-            # anti-baryons
-            quarks = ('000'+ pdg.strip('-'))[-4:-1]
-            if '0' not in quarks:
-                outfile.write('-' + pdg + '\n')
-    infile.close()
-    outfile.close()
-    print "Created ", iss_tables_folder, " from ", iss_tables_folder
+
+    choose_particles_for_iSS(iss_tables_folder)
+    print("Created ", iss_tables_folder, " from ", iss_tables_folder)
@@ -13,18 +13,19 @@ UTILITIES=~/iEBE-MUSIC/utilities
 ISS_ROOT=./SMASH_0/iSS
 
 mv UrQMDev_0 SMASH_0
-# provide SMASH particle table to iSS
-${SMASH_ROOT}/build/smash -x -i ${UTILITIES}/config.yaml > ${ISS_ROOT}/iSS_tables/pdg.dat
-python ${UTILITIES}/prepare_SMASH_particles_for_iSS.py -i ${ISS_ROOT}/iSS_tables/
+# provide SMASH particle table to iSS, it is generated once for every
+# SMASH build and config
+python ${UTILITIES}/cache_SMASH_particle_tables.py -s ${SMASH_ROOT}/build/smash -c ${UTILITIES}/config.yaml -i ${ISS_ROOT}/iSS_tables/
 
 cd ${ISS_ROOT}
 mkdir -p results
-cp ../hydro_event/surface*.dat results/surface.dat
+# link the surface, it is read-only and shared by the oversampled events
+ln -sf ../../hydro_event/surface.dat results/surface.dat
 cp ../hydro_event/music_input results/music_input
 ./iSS.e
 mkdir -p SMASH_input && rm -rf SMASH_input/*
 mkdir -p SMASH_results && rm -r SMASH_results/*
-python ${UTILITIES}/convert_iSS_output_to_SMASH_input.py -i OSCAR.DAT -o SMASH_input/
+python ${UTILITIES}/convert_iSS_output_to_SMASH_input.py -i OSCAR.DAT -o SMASH_input/ -t iSS_tables/pdg.dat
 npr=`nproc`
 for (( i=1; i<=$npr; i++ ))
 do
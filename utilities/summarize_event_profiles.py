@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""
+    This script summarizes the event profiles (event_profile.jsonl) written
+    by hydro_plus_UrQMD_driver.py for all the events of a run. It prints
+    the wall time, CPU time, peak memory and bytes written per stage and
+    per executable.
+
+    With -c it also writes the mean wall time per hydro event of every
+    centrality class, the cost model used by generate_jobs.py -cost.
+"""
+
+import argparse
+import json
+import re
+from os import path, walk
+
+PROFILE_FILE_NAME = "event_profile.jsonl"
+EXECUTABLE_PATTERN = re.compile(r"([\w.-]+\.(?:e|sh|py))\b")
+TIME_UNITS = {'h': 3600., 's': 1.}
+# centrality label in the IPGlasma event ids, e.g. AuAu_C0-5_12
+CENTRALITY_PATTERN = re.compile(r"C([\d.]+-[\d.]+)_\d+$")
+
+
+def find_profile_files(run_folder):
+    """This function returns all the event profile files in run_folder"""
+    profile_files = []
+    for root, _, files in walk(run_folder):
+        if PROFILE_FILE_NAME in files:
+            profile_files.append(path.join(root, PROFILE_FILE_NAME))
+    return sorted(profile_files)
+
+
+def get_executable_name(command):
+    """This function returns the name of the executable of a command"""
+    match = EXECUTABLE_PATTERN.search(command)
+    if match:
+        return match.group(1)
+    return command.split()[0]
+
+
+def add_record(summary, key, record, bytes_written=0):
+    """This function adds one stage or subprocess record to the summary"""
+    entry = summary.setdefault(key, {'count': 0, 'wall_time': 0.,
+                                     'cpu_time': 0., 'max_rss_mb': 0.,
+                                     'bytes_written': 0, 'failed': 0})
+    entry['count'] += 1
+    entry['wall_time'] += record['wall_time']
+    entry['cpu_time'] += record['cpu_time']
+    entry['max_rss_mb'] = max(entry['max_rss_mb'], record['max_rss_mb'])
+    entry['bytes_written'] += bytes_written
+    if record.get('status', "done") != "done" or record.get('return_code', 0):
+        entry['failed'] += 1
+
+
+def summarize_profiles(profile_files):
+    """
+        This function reads the profile files and returns the number of
+        events and the summaries per stage and per executable
+    """
+    stage_summary = {}
+    executable_summary = {}
+    event_ids = set()
+    for profile_file in profile_files:
+        with open(profile_file, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                event_ids.add((path.dirname(profile_file), event['event_id']))
+                for stage in event['stages']:
+                    add_record(stage_summary, stage['stage'], stage,
+                               stage['bytes_written'])
+                    for record in stage['subprocesses']:
+                        add_record(executable_summary,
+                                   get_executable_name(record['command']),
+                                   record, record['block_output_bytes'])
+    return len(event_ids), stage_summary, executable_summary
+
+
+def get_event_times(profile_files):
+    """
+        This function returns the total wall time of the stages of every
+        event, summed over all the runs of the event
+    """
+    event_times = {}
+    for profile_file in profile_files:
+        with open(profile_file, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                key = (path.dirname(profile_file), event['event_id'])
+                event_times[key] = event_times.get(key, 0.) + sum(
+                    stage['wall_time'] for stage in event['stages'])
+    return event_times
+
+
+def write_cost_model(cost_file, event_times):
+    """
+        This function writes the mean wall time per event of every
+        centrality class found in the event ids
+    """
+    class_times = {}
+    for (_, event_id), event_time in event_times.items():
+        match = CENTRALITY_PATTERN.search(event_id)
+        if match:
+            class_times.setdefault(match.group(1), []).append(event_time)
+    with open(cost_file, "w") as f:
+        f.write("# centrality  wall time per hydro event [s]  n_events\n")
+        for label, times in sorted(
+                class_times.items(),
+                key=lambda item: float(item[0].split("-")[0])):
+            f.write("{0:s}  {1:.1f}  # {2:d}\n".format(
+                label, sum(times)/len(times), len(times)))
+    return len(class_times)
+
+
+def print_summary(title, summary, time_unit="h"):
+    """This function prints one summary table sorted by wall time"""
+    time_scale = TIME_UNITS[time_unit]
+    total_wall_time = max(1e-16, sum(entry['wall_time']
+                                     for entry in summary.values()))
+    print("{0:<32s} {1:>7s} {2:>12s} {3:>6s} {4:>12s} {5:>10s} {6:>12s} "
+          "{7:>6s}".format(title, "count", "wall [{}]".format(time_unit),
+                           "[%]", "CPU [{}]".format(time_unit), "RSS [MB]",
+                           "written [MB]", "failed"))
+    for key, entry in sorted(summary.items(),
+                             key=lambda item: item[1]['wall_time'],
+                             reverse=True):
+        print("{0:<32s} {1:7d} {2:12.3f} {3:6.1f} {4:12.3f} {5:10.1f} "
+              "{6:12.1f} {7:6d}".format(
+                  key, entry['count'], entry['wall_time']/time_scale,
+                  100.*entry['wall_time']/total_wall_time,
+                  entry['cpu_time']/time_scale, entry['max_rss_mb'],
+                  entry['bytes_written']/1024.**2, entry['failed']))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description='Summarize the event profiles of a run',
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('run_folder', type=str,
+                        help='folder with the event folders of a run')
+    parser.add_argument('-o', '--output_file', type=str, default='',
+                        help='write the summary to this json file')
+    parser.add_argument('-c', '--cost_file', type=str, default='',
+                        help=('write the wall time per event of every '
+                              + 'centrality class to this file'))
+    args = parser.parse_args()
+
+    PROFILE_FILES = find_profile_files(args.run_folder)
+    N_EVENTS, STAGE_SUMMARY, EXECUTABLE_SUMMARY = summarize_profiles(
+        PROFILE_FILES)
+    print("Summary of {0:d} events from {1:d} profile files".format(
+        N_EVENTS, len(PROFILE_FILES)))
+    print_summary("stage", STAGE_SUMMARY)
+    print("")
+    print_summary("executable", EXECUTABLE_SUMMARY)
+    if args.output_file != "":
+        with open(args.output_file, "w") as f:
+            json.dump({'n_events': N_EVENTS, 'stages': STAGE_SUMMARY,
+                       'executables': EXECUTABLE_SUMMARY}, f, indent=1)
+    if args.cost_file != "":
+        N_CLASSES = write_cost_model(args.cost_file,
+                                     get_event_times(PROFILE_FILES))
+        print("Wrote the cost of {0:d} centrality classes to {1:s}".format(
+            N_CLASSES, args.cost_file))